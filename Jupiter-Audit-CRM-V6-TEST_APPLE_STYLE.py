@@ -30,14 +30,44 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import io
 import os
-import base64
+import math
+import re
+import json
+import hashlib
+import tempfile
+import sqlite3
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Table, LongTable, TableStyle, Paragraph, Spacer, PageBreak, Image
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+try:
+    import yaml  # optional: YAML rule files (JSON always works)
+except ImportError:
+    yaml = None
+
+try:
+    import pyarrow as pa  # optional: Parquet export of cleaned data (CSV always works)
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Copy-on-Write: derived frames share column buffers with their parent until
+# one of them is written to (always on from pandas 3.0). Process-wide on pandas 2.x:
+# chained assignment (df[col][i] = x) no longer writes through anywhere in the process
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
 # ==================== DEMO MODE CONFIGURATION ====================
 DEMO_MODE = True  # Set to False for PRO version (unlimited data)
@@ -45,6 +75,9 @@ MAX_ROWS_DEMO = 100
 SUPPORT_EMAIL = "wbse.consult@gmail.com"
 PORTFOLIO_URL = "https://stephaniejj.github.io/#home"
 
+# ==================== SHARED CACHE CONFIGURATION ====================
+SHARED_CACHE_BUDGET_MB = 2048  # Global memory budget for datasets shared across sessions
+
 def get_upgrade_message(total_rows, file_type):
     """Generate upgrade message for DEMO mode - NO PRICING"""
     return f"""
@@ -295,6 +328,14 @@ if 'companies_df' not in st.session_state:
     st.session_state.companies_df = None
 if 'tickets_df' not in st.session_state:
     st.session_state.tickets_df = None
+if 'ticket_status_mapping' not in st.session_state:
+    st.session_state.ticket_status_mapping = {}
+if 'deals_df' not in st.session_state:
+    st.session_state.deals_df = None
+if 'engagements_df' not in st.session_state:
+    st.session_state.engagements_df = None
+if 'line_items_df' not in st.session_state:
+    st.session_state.line_items_df = None
 if 'aggregated_df' not in st.session_state:
     st.session_state.aggregated_df = None
 if 'pre_agg_scores' not in st.session_state:
@@ -303,20 +344,38 @@ if 'post_agg_score' not in st.session_state:
     st.session_state.post_agg_score = None
 if 'audit_results' not in st.session_state:
     st.session_state.audit_results = None
+if 'dataset_fingerprints' not in st.session_state:
+    st.session_state.dataset_fingerprints = {}
 
 # New V6 session state
 if 'cold_analysis' not in st.session_state:
     st.session_state.cold_analysis = None
+if 'contact_cohorts' not in st.session_state:
+    st.session_state.contact_cohorts = None
 if 'email_analysis' not in st.session_state:
     st.session_state.email_analysis = None
+if 'phone_analysis' not in st.session_state:
+    st.session_state.phone_analysis = None
 if 'orphan_analysis' not in st.session_state:
     st.session_state.orphan_analysis = None
 if 'ghost_companies' not in st.session_state:
     st.session_state.ghost_companies = None
+if 'company_links' not in st.session_state:
+    st.session_state.company_links = None
+if 'referential_integrity' not in st.session_state:
+    st.session_state.referential_integrity = None
 if 'critical_tickets' not in st.session_state:
     st.session_state.critical_tickets = None
 if 'churn_analysis' not in st.session_state:
     st.session_state.churn_analysis = None
+if 'threshold_index' not in st.session_state:
+    st.session_state.threshold_index = None
+if 'column_profiles' not in st.session_state:
+    st.session_state.column_profiles = None
+if 'row_quality' not in st.session_state:
+    st.session_state.row_quality = {}
+if 'quality_rules' not in st.session_state:
+    st.session_state.quality_rules = None
 
 if 'tickets_completeness' not in st.session_state:
     st.session_state.tickets_completeness = None
@@ -328,8 +387,18 @@ if 'quality_improvement' not in st.session_state:
     st.session_state.quality_improvement = None
 if 'tickets_performance' not in st.session_state:
     st.session_state.tickets_performance = None
+if 'ticket_trend_index' not in st.session_state:
+    st.session_state.ticket_trend_index = None
 if 'top_industries' not in st.session_state:
     st.session_state.top_industries = None
+if 'category_breakdowns' not in st.session_state:
+    st.session_state.category_breakdowns = None
+if 'pdf_report' not in st.session_state:
+    st.session_state.pdf_report = None
+if 'excel_export' not in st.session_state:
+    st.session_state.excel_export = None
+if 'cleaned_export' not in st.session_state:
+    st.session_state.cleaned_export = None
 
 
 
@@ -338,110 +407,286 @@ if 'top_industries' not in st.session_state:
 
 # ==================== UTILITY FUNCTIONS ====================
 
+def content_fingerprint(data):
+    """Stable content hash of raw file bytes"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def deferred_file_download(file):
+    """Finished export file as st.download_button data: a callable, so the file is read only when the user clicks"""
+    file.flush()
+
+    def read():
+        file.seek(0)
+        return file.read()
+    return read
+
+
+def result_fingerprint(value):
+    """Stable hash of nested analysis results (dicts, lists, frames, arrays, scalars)"""
+    digest = hashlib.blake2b(digest_size=16)
+
+    def feed(item):
+        if isinstance(item, dict):
+            digest.update(b'{')
+            for key in sorted(item, key=str):
+                digest.update(str(key).encode())
+                feed(item[key])
+            digest.update(b'}')
+        elif isinstance(item, (list, tuple)):
+            digest.update(b'[')
+            for element in item:
+                feed(element)
+            digest.update(b']')
+        elif isinstance(item, (pd.DataFrame, pd.Series)):
+            digest.update(str(list(item.columns) if isinstance(item, pd.DataFrame) else item.name).encode())
+            digest.update(pd.util.hash_pandas_object(item, index=False).to_numpy().tobytes())
+        elif isinstance(item, np.ndarray):
+            digest.update(str(item.dtype).encode())
+            digest.update(np.ascontiguousarray(item).tobytes())
+        else:
+            digest.update(repr(item).encode())
+
+    feed(value)
+    return digest.hexdigest()
+
+
+def estimate_nbytes(value):
+    """Approximate memory footprint of a cached value"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(item) for item in value.values())
+    return 64
+
+
+def share_read_only(value):
+    """Hand out a cached value without letting the caller mutate the shared copy"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        # Lazy under Copy-on-Write: buffers stay shared until the session writes to them
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(share_read_only(item) for item in value)
+    return value
+
+
+class SharedDatasetCache:
+    """Process-wide LRU cache of parsed datasets and derived results, keyed by content hash"""
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return share_read_only(entry[0])
+
+    def put(self, key, value):
+        """Store value, evicting least recently used entries to stay within budget"""
+        nbytes = estimate_nbytes(value)
+        if nbytes > self.budget_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.used_bytes -= self._entries.pop(key)[1]
+            while self._entries and self.used_bytes + nbytes > self.budget_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.used_bytes -= evicted_bytes
+                self.evictions += 1
+            self._entries[key] = (value, nbytes)
+            self.used_bytes += nbytes
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = compute()
+        if value is not None:
+            self.put(key, value)
+        return share_read_only(value)
+
+    def stats(self):
+        """Hit/miss counters and memory usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'used_mb': round(self.used_bytes / (1024 * 1024), 1),
+                'budget_mb': round(self.budget_bytes / (1024 * 1024), 1),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0
+            }
+
+
+@st.cache_resource
+def get_shared_cache():
+    """Single cache instance shared by every session of this server process"""
+    return SharedDatasetCache(SHARED_CACHE_BUDGET_MB * 1024 * 1024)
+
+
+def cached_result(name, fingerprints, compute):
+    """Compute a derived result once per combination of dataset fingerprints"""
+    if not fingerprints or any(fp is None for fp in fingerprints):
+        return compute()
+    return get_shared_cache().get_or_compute((name, *fingerprints), compute)
+
+
 def load_data(file, file_type='data'):
-    """Load data from uploaded CSV file with DEMO mode limit"""
+    """Load data from uploaded CSV file with DEMO mode limit (parsed once per distinct file)"""
     try:
-        df = pd.read_csv(file)
-        original_rows = len(df)
-        
-        # Apply DEMO mode limit
-        if DEMO_MODE and original_rows > MAX_ROWS_DEMO:
-            df = df.head(MAX_ROWS_DEMO)
-            return df, original_rows, True  # is_limited=True
-        
-        return df, original_rows, False  # is_limited=False
-        
-    except Exception as e:
-        st.error(f"❌ Error loading file: {str(e)}")
-        return None, 0, False
+        raw = file.getvalue()
+        fingerprint = content_fingerprint(raw)
 
-def calculate_health_score(df, data_type='contacts'):
-    """Calculate health score for a dataset"""
-    if df is None or df.empty:
-        return 0, []
+        def parse():
+            df = pd.read_csv(io.BytesIO(raw))
+            original_rows = len(df)
 
-    score = 100
-    issues = []
-
-    # Missing data penalty
-    missing_pct = (df.isnull().sum().sum() / (len(df) * len(df.columns))) * 100
-    if missing_pct > 0:
-        penalty = min(missing_pct * 2, 30)
-        score -= penalty
-        issues.append(f"Missing data: {missing_pct:.1f}% (-{penalty:.1f} points)")
-
-    # Duplicate penalty
-    id_cols = [col for col in df.columns if 'id' in col.lower() or 'email' in col.lower()]
-    if id_cols:
-        dup_pct = (df.duplicated(subset=[id_cols[0]]).sum() / len(df)) * 100
-        if dup_pct > 0:
-            penalty = min(dup_pct * 3, 30)
-            score -= penalty
-            issues.append(f"Duplicates: {dup_pct:.1f}% (-{penalty:.1f} points)")
-
-    # Empty fields penalty
-    empty_fields = (df == '').sum().sum()
-    if empty_fields > 0:
-        empty_pct = (empty_fields / (len(df) * len(df.columns))) * 100
-        penalty = min(empty_pct * 1.5, 20)
-        score -= penalty
-        issues.append(f"Empty fields: {empty_pct:.1f}% (-{penalty:.1f} points)")
-
-    return max(score, 0), issues
-
-def aggregate_data(contacts, companies, tickets):
-    """Aggregate the three datasets"""
-    if contacts is None or contacts.empty:
-        return None
+            # Apply DEMO mode limit
+            if DEMO_MODE and original_rows > MAX_ROWS_DEMO:
+                return df.head(MAX_ROWS_DEMO), original_rows, True  # is_limited=True
 
-    result = contacts.copy()
-
-    # Merge with companies
-    if companies is not None and not companies.empty:
-        company_id_col = next((col for col in contacts.columns if 'company' in col.lower() and 'id' in col.lower()), None)
-        if company_id_col:
-            company_main_id = next((col for col in companies.columns if 'id' in col.lower()), None)
-            if company_main_id:
-                # Convert both columns to string to avoid type mismatch
-                result[company_id_col] = result[company_id_col].astype(str)
-                companies = companies.copy()
-                companies[company_main_id] = companies[company_main_id].astype(str)
-                
-                result = result.merge(
-                    companies,
-                    left_on=company_id_col,
-                    right_on=company_main_id,
-                    how='left',
-                    suffixes=('', '_company')
-                )
+            return df, original_rows, False  # is_limited=False
 
-    # Add ticket statistics
-    if tickets is not None and not tickets.empty:
-        contact_id_col = next((col for col in contacts.columns if 'id' in col.lower()), None)
-        ticket_contact_col = next((col for col in tickets.columns if 'contact' in col.lower() and 'id' in col.lower()), None)
-
-        if contact_id_col and ticket_contact_col:
-            # Convert both columns to string to avoid type mismatch
-            result[contact_id_col] = result[contact_id_col].astype(str)
-            tickets = tickets.copy()
-            tickets[ticket_contact_col] = tickets[ticket_contact_col].astype(str)
-            
-            ticket_stats = tickets.groupby(ticket_contact_col).agg(
-                ticket_count=('id', 'count') if 'id' in tickets.columns else (ticket_contact_col, 'count')
-            ).reset_index()
-
-            result = result.merge(
-                ticket_stats,
-                left_on=contact_id_col,
-                right_on=ticket_contact_col,
-                how='left'
+        key = ('dataset', fingerprint, MAX_ROWS_DEMO if DEMO_MODE else None)
+        df, original_rows, is_limited = get_shared_cache().get_or_compute(key, parse)
+        return df, original_rows, is_limited, fingerprint
+        
+    except Exception as e:
+        st.error(f"❌ Error loading file: {str(e)}")
+        return None, 0, False, None
+
+# Row score = 100 - missing * share of empty fields - invalid * bad email - duplicate * repeated key
+ROW_QUALITY_WEIGHTS = {'missing': 60, 'invalid': 20, 'duplicate': 40}
+ROW_QUALITY_BINS = 20
+
+
+class RowQualityScores:
+    """Per-row quality score (float32, 0-100) from field fill, email validity and duplicate key membership"""
+
+    def __init__(self, df, weights=None):
+        weights = {**ROW_QUALITY_WEIGHTS, **(weights or {})}
+        # Derived columns are not part of the uploaded data
+        df = user_columns(df)
+        self.rows = len(df)
+        self.email_column = next((col for col in df.columns if 'email' in col.lower()), None)
+        # Duplicate membership: email identifies a person better than a system id
+        self.key_column = self.email_column or next((col for col in df.columns if 'id' in col.lower()), None)
+
+        # Single pass over the columns, accumulating per-row counters
+        self.missing = np.zeros(self.rows, dtype=np.uint16)
+        self.invalid = np.zeros(self.rows, dtype=bool)
+        self.duplicate = np.zeros(self.rows, dtype=bool)
+        for col in df.columns:
+            values = df[col]
+            empty = values.isna()
+            if values.dtype == object or isinstance(values.dtype, pd.StringDtype):
+                empty |= values.astype('string').str.strip().eq('').fillna(False)
+                if col == self.email_column:
+                    self.invalid = (~empty & ~values.astype('string').str.match(EMAIL_PATTERN).fillna(False)).to_numpy(dtype=bool)
+            self.missing += empty.to_numpy(dtype=bool)
+            if col == self.key_column:
+                self.duplicate = (values.duplicated() & ~empty).to_numpy(dtype=bool)
+
+        missing_share = self.missing / np.float32(max(len(df.columns), 1))
+        self.penalties = {
+            'missing': weights['missing'] * missing_share.astype(np.float32),
+            'invalid': np.float32(weights['invalid']) * self.invalid,
+            'duplicate': np.float32(weights['duplicate']) * self.duplicate
+        }
+        self.scores = np.clip(
+            np.float32(100) - sum(self.penalties.values()), 0, 100
+        ).astype(np.float32)
+        self.missing_share = missing_share
+
+    @property
+    def nbytes(self):
+        return self.scores.nbytes + self.missing.nbytes + self.invalid.nbytes + self.duplicate.nbytes
+
+    @property
+    def score(self):
+        """Dataset score: mean of the row scores"""
+        return float(self.scores.mean(dtype=np.float64)) if self.rows else 0
+
+    def issues(self):
+        """Average points lost per component, in the calculate_health_score wording"""
+        if not self.rows:
+            return []
+        labels = {
+            'missing': ('Missing data', self.missing_share.mean() * 100),
+            'invalid': ('Invalid emails', self.invalid.mean() * 100),
+            'duplicate': ('Duplicates', self.duplicate.mean() * 100)
+        }
+        issues = []
+        for name, (label, pct) in labels.items():
+            points = float(self.penalties[name].mean(dtype=np.float64))
+            if pct > 0:
+                issues.append(f"{label}: {pct:.1f}% (-{points:.1f} points)")
+        return issues
+
+    def histogram(self, bins=ROW_QUALITY_BINS):
+        """Row counts per score band (edges 0..100)"""
+        edges = np.linspace(0, 100, bins + 1)
+        bands = np.minimum((self.scores * (bins / 100)).astype(np.intp), bins - 1)
+        return edges, np.bincount(bands, minlength=bins)
+
+    def worst(self, n):
+        """Positions of the n lowest-scoring rows, worst first (partial sort)"""
+        return top_n_indices(-self.scores, n)
+
+    def worst_records(self, df, n):
+        """The n worst rows of df with their score and the reasons it was lowered"""
+        positions = self.worst(n)
+        records = df.iloc[positions]
+        reasons = [
+            ', '.join(
+                reason for reason, flag in [
+                    (f"{self.missing[pos]} empty fields", self.missing[pos] > 0),
+                    ('invalid email', self.invalid[pos]),
+                    ('duplicate', self.duplicate[pos])
+                ] if flag
             )
-            result['ticket_count'] = result['ticket_count'].fillna(0)
+            for pos in positions
+        ]
+        # Display columns go in front, renamed when the upload already has a column of that name
+        for name, values in [('issues', reasons), ('quality_score', self.scores[positions].astype(float).round(1))]:
+            records.insert(0, f'audit_{name}' if name in records.columns else name, values)
+        return records
 
-    return result
 
-def perform_audit(contacts, companies, tickets, aggregated):
-    """Perform comprehensive audit analysis"""
+def calculate_health_score(df, data_type='contacts', row_quality=None):
+    """Calculate health score for a dataset (mean of its row-level quality scores)"""
+    if df is None or df.empty:
+        return 0, []
+    if row_quality is None:
+        row_quality = RowQualityScores(df)
+    return row_quality.score, row_quality.issues()
+
+def perform_audit(contacts, companies, tickets, aggregated, rules=None):
+    """Perform comprehensive audit analysis (rules: quality rule list, default DEFAULT_QUALITY_RULES)"""
     results = {
         'total_contacts': len(contacts) if contacts is not None else 0,
         'total_companies': len(companies) if companies is not None else 0,
@@ -467,33 +712,830 @@ def perform_audit(contacts, companies, tickets, aggregated):
 
     # Analyze missing data
     if contacts is not None:
-        results['missing_data']['contacts'] = contacts.isnull().sum().sum()
+        results['missing_data']['contacts'] = user_columns(contacts).isnull().sum().sum()
     if companies is not None:
-        results['missing_data']['companies'] = companies.isnull().sum().sum()
+        results['missing_data']['companies'] = user_columns(companies).isnull().sum().sum()
     if tickets is not None:
-        results['missing_data']['tickets'] = tickets.isnull().sum().sum()
-
-    # Generate recommendations
-    if results['duplicates'].get('contacts', 0) > 0:
-        results['recommendations'].append({
-            'priority': 'HIGH',
-            'category': 'Data Cleaning',
-            'issue': f"{results['duplicates']['contacts']} duplicate contacts found",
-            'action': 'Implement automated deduplication process',
-            'impact': 'Improve data accuracy and reduce confusion'
-        })
+        results['missing_data']['tickets'] = user_columns(tickets).isnull().sum().sum()
 
-    if results['missing_data'].get('contacts', 0) > len(contacts) * 0.1 if contacts is not None else False:
-        results['recommendations'].append({
-            'priority': 'MEDIUM',
-            'category': 'Data Completeness',
-            'issue': 'Significant missing data in contacts',
-            'action': 'Implement data validation rules and mandatory fields',
-            'impact': 'Enhance contact information quality'
-        })
+    # Generate recommendations from the declarative quality rules
+    datasets = {'contacts': contacts, 'companies': companies, 'tickets': tickets, 'aggregated': aggregated}
+    results['rule_results'], results['rule_errors'] = evaluate_quality_rules(
+        datasets, DEFAULT_QUALITY_RULES if rules is None else rules
+    )
+    results['recommendations'] = rule_recommendations(results['rule_results'])
 
     return results
 
+# ==================== QUALITY RULE ENGINE ====================
+
+# Column roles a rule can target; exact names first, then a substring match
+RULE_COLUMN_ROLES = {
+    'email': (['email', 'e-mail', 'email_address', 'hs_email'], 'email'),
+    'phone': (['phone', 'phone_number', 'mobilephone', 'mobile_phone', 'hs_phone'], 'phone'),
+    'country': (['country', 'country_code', 'hs_country'], 'country'),
+    'state': (['state', 'region', 'province', 'hs_state'], 'state'),
+    'name': (['name', 'company_name', 'full_name'], 'name'),
+    'first_name': (['first_name', 'firstname'], 'first'),
+    'last_name': (['last_name', 'lastname'], 'last'),
+    'domain': (['domain', 'website', 'company_domain'], 'domain'),
+    'industry': (['industry', 'industry_type', 'sector', 'hs_industry'], 'industry'),
+    'owner': (['owner', 'hubspot_owner_id', 'assigned_to', 'ticket_owner'], 'owner'),
+    'priority': (['priority', 'ticket_priority', 'hs_ticket_priority'], 'priority'),
+    'last_activity': (['last_activity_date', 'last_activity', 'last_contacted'], 'last_activity'),
+    'created': (['createdate', 'created_date', 'created_at', 'hs_createdate'], 'creat'),
+    'company_id': (['company_id', 'companyid', 'associatedcompanyid'], 'company_id')
+}
+
+E164_PATTERN = r'^\+[1-9]\d{6,14}$'
+
+# Default checks (JSON-compatible). Messages may use {count}, {pct}, {total}, {column}, {dataset}.
+DEFAULT_QUALITY_RULES = [
+    {
+        'id': 'contacts_duplicate_email', 'dataset': 'contacts', 'role': 'email', 'check': 'duplicate',
+        'threshold': 0, 'priority': 'HIGH', 'category': 'Data Cleaning',
+        'issue': '{count:,} duplicate contacts found',
+        'action': 'Implement automated deduplication process',
+        'impact': 'Improve data accuracy and reduce confusion'
+    },
+    {
+        'id': 'contacts_incomplete', 'dataset': 'contacts', 'check': 'incomplete_row',
+        'threshold': 10, 'priority': 'MEDIUM', 'category': 'Data Completeness',
+        'issue': 'Significant missing data in contacts ({pct:.1f}% of records have empty fields)',
+        'action': 'Implement data validation rules and mandatory fields',
+        'impact': 'Enhance contact information quality'
+    },
+    {
+        'id': 'contacts_invalid_email', 'dataset': 'contacts', 'role': 'email', 'check': 'invalid_email',
+        'threshold': 5, 'priority': 'HIGH', 'category': 'Data Validity',
+        'issue': '{count:,} contacts ({pct:.1f}%) have a malformed email address',
+        'action': 'Validate emails at capture and bounce-check existing records',
+        'impact': 'Protect sender reputation and campaign reach'
+    },
+    {
+        'id': 'contacts_phone_not_e164', 'dataset': 'contacts', 'role': 'phone', 'check': 'not_e164',
+        'threshold': 20, 'priority': 'LOW', 'category': 'Data Standardization',
+        'issue': '{pct:.1f}% of phone numbers are not in international E.164 format',
+        'action': 'Normalize phone numbers to +<country code><number>',
+        'impact': 'Reliable calling, SMS and phone-based deduplication'
+    },
+    {
+        'id': 'contacts_invalid_phone', 'dataset': 'contacts', 'role': 'phone', 'check': 'invalid_phone',
+        'threshold': 10, 'priority': 'MEDIUM', 'category': 'Data Validity',
+        'issue': '{count:,} contacts ({pct:.1f}%) have an unreachable or placeholder phone number',
+        'action': 'Clear placeholder numbers and re-collect phones with country-aware validation',
+        'impact': 'Fewer failed calls and SMS, reliable phone-based deduplication'
+    },
+    {
+        'id': 'contacts_country_missing_with_state', 'dataset': 'contacts', 'role': 'country', 'check': 'missing',
+        'when': {'role': 'state', 'check': 'present'},
+        'threshold': 1, 'priority': 'LOW', 'category': 'Data Completeness',
+        'issue': '{count:,} contacts have a state/region but no country',
+        'action': 'Backfill country from state/region values',
+        'impact': 'Accurate territory routing and reporting'
+    },
+    {
+        'id': 'companies_duplicate_name', 'dataset': 'companies', 'role': 'name', 'check': 'duplicate',
+        'threshold': 0, 'priority': 'MEDIUM', 'category': 'Data Cleaning',
+        'issue': '{count:,} companies share a name with another record',
+        'action': 'Merge duplicate companies (match on domain first)',
+        'impact': 'Single account view for sales and support'
+    },
+    {
+        'id': 'companies_missing_domain', 'dataset': 'companies', 'role': 'domain', 'check': 'missing',
+        'threshold': 20, 'priority': 'MEDIUM', 'category': 'Data Completeness',
+        'issue': '{pct:.1f}% of companies have no domain',
+        'action': 'Enrich company domains to enable automatic contact association',
+        'impact': 'Fewer orphan contacts, better enrichment'
+    },
+    {
+        'id': 'tickets_missing_owner', 'dataset': 'tickets', 'role': 'owner', 'check': 'missing',
+        'threshold': 10, 'priority': 'MEDIUM', 'category': 'Support Operations',
+        'issue': '{count:,} tickets ({pct:.1f}%) have no owner',
+        'action': 'Add assignment rules to the support pipeline',
+        'impact': 'Faster first response, no forgotten tickets'
+    }
+]
+
+RULE_PRIORITIES = ['HIGH', 'MEDIUM', 'LOW']
+
+
+def load_quality_rules(raw, filename='rules.json'):
+    """Parse a JSON or YAML rule file: a list of rules, or {'rules': [...]}"""
+    text = raw.decode('utf-8') if isinstance(raw, bytes) else raw
+    if filename.lower().endswith(('.yaml', '.yml')):
+        if yaml is None:
+            raise ValueError("YAML rule files need PyYAML (pip install pyyaml); use JSON instead")
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    rules = data.get('rules') if isinstance(data, dict) else data
+    if not isinstance(rules, list) or not all(isinstance(rule, dict) for rule in rules):
+        raise ValueError("Rule file must contain a list of rules (or a 'rules' list)")
+    for rule in rules:
+        validate_quality_rule(rule)
+    return rules
+
+
+RULE_TEMPLATE_SAMPLE = {'count': 1, 'pct': 1.0, 'total': 1, 'column': 'column', 'dataset': 'contacts'}
+
+
+def validate_quality_rule(rule):
+    """Reject a rule whose threshold is not a number or whose issue/action/impact text does not format"""
+    try:
+        float(rule.get('threshold', 0))
+    except (TypeError, ValueError):
+        raise ValueError(f"rule '{rule.get('id')}': threshold must be a number, got {rule.get('threshold')!r}")
+    for field in ('issue', 'action', 'impact'):
+        if field in rule:
+            try:
+                str(rule[field]).format(**RULE_TEMPLATE_SAMPLE)
+            except (KeyError, ValueError, IndexError) as e:
+                raise ValueError(
+                    f"rule '{rule.get('id')}': invalid {field} text ({e!r}); "
+                    f"placeholders are {', '.join('{' + name + '}' for name in RULE_TEMPLATE_SAMPLE)}"
+                )
+
+
+class RuleContext:
+    """Per-dataset memo of derived column arrays, shared by every rule evaluated on that dataset"""
+
+    def __init__(self, df):
+        self.df = df
+        self._memo = {}
+
+    def _cached(self, key, compute):
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def column(self, spec):
+        """Column named by spec['column'], or resolved from spec['role'] (None when absent)"""
+        if spec.get('column'):
+            return spec['column'] if spec['column'] in self.df.columns else None
+        role = spec.get('role')
+        if role not in RULE_COLUMN_ROLES:
+            return None
+        exact, fragment = RULE_COLUMN_ROLES[role]
+        lowered = {col.lower(): col for col in self.df.columns}
+        return next((lowered[name] for name in exact if name in lowered), None) or next(
+            (col for col in self.df.columns if fragment in col.lower()), None
+        )
+
+    def missing(self, col):
+        return self._cached(('missing', col), lambda: (self.df[col].isna() | (self.text(col) == '')).to_numpy(dtype=bool))
+
+    def stripped(self, col):
+        return self._cached(('stripped', col), lambda: self.df[col].astype('string').str.strip().fillna(''))
+
+    def text(self, col):
+        return self._cached(('text', col), lambda: self.stripped(col).str.lower())
+
+    def codes(self, col):
+        """Factorized normalized values: set checks run on the uniques, then broadcast by code"""
+        return self._cached(('codes', col), lambda: pd.factorize(self.text(col)))
+
+    def member(self, col, values):
+        def compute():
+            codes, uniques = self.codes(col)
+            return pd.Index(uniques).isin([str(v).strip().lower() for v in values])[codes]
+        return self._cached(('member', col, tuple(map(str, values))), compute)
+
+    def matches(self, col, pattern):
+        """Regex match on the stripped value, case preserved (patterns decide their own case handling)"""
+        return self._cached(('match', col, pattern), lambda: self.stripped(col).str.match(pattern).to_numpy(dtype=bool))
+
+    def numbers(self, col):
+        return self._cached(('number', col), lambda: pd.to_numeric(self.df[col], errors='coerce').to_numpy(dtype=float))
+
+    def dates(self, col):
+        return self._cached(('date', col), lambda: pd.to_datetime(self.df[col], errors='coerce'))
+
+    def duplicated(self, col):
+        return self._cached(('duplicated', col), lambda: self.text(col).duplicated().to_numpy(dtype=bool) & ~self.missing(col))
+
+    def phones(self, col):
+        def compute():
+            country_col = self.column({'role': 'country'})
+            countries = self.df[country_col] if country_col else None
+            return normalize_phone_numbers(self.df[col], countries, phone_default_country(countries))
+        return self._cached(('phones', col), compute)
+
+    def incomplete_rows(self):
+        return self._cached(('incomplete',), lambda: (self.df.isna() | (self.df == '')).any(axis=1).to_numpy(dtype=bool))
+
+
+# Row predicates: (context, column, rule) -> boolean array of failing rows
+RULE_CHECKS = {
+    'missing': lambda ctx, col, rule: ctx.missing(col),
+    'present': lambda ctx, col, rule: ~ctx.missing(col),
+    'duplicate': lambda ctx, col, rule: ctx.duplicated(col),
+    'invalid_email': lambda ctx, col, rule: ~ctx.missing(col) & ~ctx.matches(col, EMAIL_PATTERN),
+    'not_e164': lambda ctx, col, rule: ~ctx.missing(col) & ~ctx.matches(col, E164_PATTERN),
+    'invalid_phone': lambda ctx, col, rule: ctx.phones(col)['phone_status'].isin(['invalid', 'placeholder']).to_numpy(dtype=bool),
+    'duplicate_phone': lambda ctx, col, rule: (
+        ctx.phones(col)['phone_e164'].duplicated() & ctx.phones(col)['phone_e164'].notna()
+    ).to_numpy(dtype=bool),
+    'matches': lambda ctx, col, rule: ctx.matches(col, rule['value']),
+    'not_matches': lambda ctx, col, rule: ~ctx.missing(col) & ~ctx.matches(col, rule['value']),
+    'in': lambda ctx, col, rule: ctx.member(col, rule['value']),
+    'not_in': lambda ctx, col, rule: ~ctx.missing(col) & ~ctx.member(col, rule['value']),
+    'less_than': lambda ctx, col, rule: ctx.numbers(col) < float(rule['value']),
+    'greater_than': lambda ctx, col, rule: ctx.numbers(col) > float(rule['value']),
+    'older_than_days': lambda ctx, col, rule: (
+        ctx.dates(col) < pd.Timestamp(datetime.now() - timedelta(days=float(rule['value'])))
+    ).to_numpy(dtype=bool)
+}
+# Checks on the whole row rather than one column
+RULE_ROW_CHECKS = {
+    'incomplete_row': lambda ctx, rule: ctx.incomplete_rows()
+}
+
+
+def compile_quality_rule(rule, ctx):
+    """Turn one declared rule into a zero-argument vectorized predicate (None: column not in this dataset)"""
+    check = rule.get('check')
+    if check in RULE_ROW_CHECKS:
+        predicate = lambda: RULE_ROW_CHECKS[check](ctx, rule)
+        column = None
+    elif check in RULE_CHECKS:
+        if check in ('matches', 'not_matches', 'in', 'not_in', 'less_than', 'greater_than', 'older_than_days') and 'value' not in rule:
+            raise ValueError(f"rule '{rule.get('id')}': check '{check}' needs a 'value'")
+        column = ctx.column(rule)
+        if column is None:
+            return None, None
+        predicate = lambda: RULE_CHECKS[check](ctx, column, rule)
+    else:
+        raise ValueError(f"rule '{rule.get('id')}': unknown check '{check}'")
+
+    if rule.get('when'):
+        condition, _ = compile_quality_rule({'id': rule.get('id'), **rule['when']}, ctx)
+        if condition is None:
+            return None, None
+        base = predicate
+        predicate = lambda: base() & condition()
+    return predicate, column
+
+
+def evaluate_quality_rules(datasets, rules):
+    """Evaluate every rule: predicates of one dataset are stacked and counted in a single reduction"""
+    results, errors = [], []
+    by_dataset = {}
+    for rule in rules:
+        by_dataset.setdefault(rule.get('dataset', 'contacts'), []).append(rule)
+
+    for name, dataset_rules in by_dataset.items():
+        df = datasets.get(name)
+        if df is None or df.empty:
+            continue
+        ctx = RuleContext(df)
+        compiled = []
+        for rule in dataset_rules:
+            try:
+                validate_quality_rule(rule)
+                predicate, column = compile_quality_rule(rule, ctx)
+            except (ValueError, KeyError, TypeError) as e:
+                errors.append(str(e))
+                continue
+            if predicate is None:
+                results.append({'rule': rule, 'column': None, 'count': 0, 'pct': 0, 'total': len(df), 'triggered': False, 'skipped': True})
+                continue
+            try:
+                compiled.append((rule, column, predicate()))
+            except Exception as e:
+                errors.append(f"rule '{rule.get('id')}': {e}")
+
+        if not compiled:
+            continue
+        counts = np.vstack([mask for _, _, mask in compiled]).sum(axis=1)
+        for (rule, column, _), count in zip(compiled, counts):
+            pct = count / len(df) * 100
+            results.append({
+                'rule': rule,
+                'column': column,
+                'count': int(count),
+                'pct': round(pct, 1),
+                'total': len(df),
+                'triggered': bool(count > 0 and pct > float(rule.get('threshold', 0))),
+                'skipped': False
+            })
+    return results, errors
+
+
+def rule_recommendations(rule_results):
+    """Recommendations (priority/category/issue/action/impact) for every triggered rule, most severe first"""
+    recommendations = []
+    for result in rule_results:
+        if not result['triggered']:
+            continue
+        rule = result['rule']
+        values = {
+            'count': result['count'], 'pct': result['pct'], 'total': result['total'],
+            'column': result['column'] or '', 'dataset': rule.get('dataset', 'contacts')
+        }
+        recommendations.append({
+            'priority': str(rule.get('priority', 'MEDIUM')).upper(),
+            'category': rule.get('category', 'Data Quality'),
+            'issue': str(rule.get('issue', '{count:,} records fail rule ' + str(rule.get('id', '')))).format(**values),
+            'action': str(rule.get('action', 'Review the affected records')).format(**values),
+            'impact': str(rule.get('impact', 'Improve data quality')).format(**values),
+            'rule_id': rule.get('id')
+        })
+    order = {priority: i for i, priority in enumerate(RULE_PRIORITIES)}
+    return sorted(recommendations, key=lambda rec: order.get(rec['priority'], len(order)))
+
+# ==================== TICKET STATUS MODEL ====================
+
+# Canonical ticket states, stored as int8 codes; new/open/waiting count as open
+TICKET_STATES = ['unknown', 'new', 'open', 'waiting', 'closed']
+TICKET_STATE_CODES = {state: code for code, state in enumerate(TICKET_STATES)}
+TICKET_OPEN_STATES = [TICKET_STATE_CODES[state] for state in ['new', 'open', 'waiting']]
+TICKET_STATE_COLUMN = '__ticket_state'  # Private name: cannot clash with an uploaded column
+DERIVED_COLUMNS = [TICKET_STATE_COLUMN]
+TICKET_STATUS_COLS = ['status', 'state', 'ticket_status', 'hs_ticket_status', 'hs_pipeline_stage']
+
+# Lowercased raw status -> canonical state. HubSpot's default support pipeline
+# exports stage IDs (1-4) rather than labels.
+DEFAULT_TICKET_STATUS_MAPPING = {
+    'new': 'new',
+    'open': 'open', 'in progress': 'open', 'reopened': 'open',
+    'pending': 'waiting', 'waiting': 'waiting', 'on hold': 'waiting',
+    'waiting on contact': 'waiting', 'waiting on us': 'waiting',
+    'closed': 'closed', 'resolved': 'closed', 'solved': 'closed', 'completed': 'closed',
+    '1': 'new', '2': 'waiting', '3': 'waiting', '4': 'closed'
+}
+
+
+class TicketStatusModel:
+    """Maps raw ticket statuses to canonical states; string work is done once per distinct status"""
+
+    def __init__(self, mapping=None):
+        overrides = {str(status).strip().lower(): state for status, state in (mapping or {}).items()}
+        self.mapping = {**DEFAULT_TICKET_STATUS_MAPPING, **overrides}
+
+    @staticmethod
+    def _distinct(statuses):
+        codes, uniques = pd.factorize(statuses)
+        keys = pd.Index(uniques).astype(str).str.strip().str.lower()
+        return codes, uniques, keys
+
+    def states(self, statuses):
+        """int8 canonical state per ticket (missing or unmapped -> unknown)"""
+        codes, _, keys = self._distinct(statuses)
+        # Trailing 'unknown' entry catches missing statuses (factorize code -1)
+        lookup = np.array(
+            [TICKET_STATE_CODES.get(self.mapping.get(key), 0) for key in keys] + [TICKET_STATE_CODES['unknown']],
+            dtype=np.int8
+        )
+        return lookup[codes]
+
+    def categories(self, statuses):
+        """Distinct raw statuses, their ticket counts and mapped state (largest first)"""
+        codes, uniques, keys = self._distinct(statuses)
+        return pd.DataFrame({
+            'status': pd.Index(uniques).astype(str),
+            'tickets': np.bincount(codes[codes >= 0], minlength=len(uniques)),
+            'state': [self.mapping.get(key, 'unknown') for key in keys]
+        }).sort_values('tickets', ascending=False, ignore_index=True)
+
+
+def ticket_status_column(tickets_df):
+    """Raw status column of a tickets frame (None when absent)"""
+    return next((col for col in TICKET_STATUS_COLS if col in tickets_df.columns), None)
+
+
+def user_columns(df):
+    """Frame without the columns this app attaches (shallow: the data itself is not copied)"""
+    return df.drop(columns=DERIVED_COLUMNS, errors='ignore')
+
+
+def with_ticket_states(tickets_df, states):
+    """Tickets frame with the canonical int8 state column attached (shallow: other columns stay shared)"""
+    return tickets_df.assign(**{TICKET_STATE_COLUMN: states})
+
+
+def ticket_states(tickets_df):
+    """Canonical int8 state per ticket: the precomputed column, else the default mapping (None without status)"""
+    if TICKET_STATE_COLUMN in tickets_df.columns and tickets_df[TICKET_STATE_COLUMN].dtype == np.int8:
+        return tickets_df[TICKET_STATE_COLUMN].to_numpy()
+    status_col = ticket_status_column(tickets_df)
+    if not status_col:
+        return None
+    return TicketStatusModel().states(tickets_df[status_col])
+
+
+# ==================== JOIN PLANNER ====================
+
+TICKET_URGENT_PRIORITIES = ['high', 'urgent', 'critical']
+TICKET_FEATURE_COLUMNS = [
+    'ticket_count', 'ticket_open_count', 'ticket_critical_count', 'ticket_urgent_open_count',
+    'ticket_recent_count', 'last_ticket_date', 'ticket_resolution_hours_mean',
+    'ticket_resolution_hours_max', 'ticket_csat_mean'
+]
+
+
+def ticket_features(tickets_df, codes, n_groups, hours_threshold=48, recent_days=30):
+    """Per-group ticket features in one pass over factorized keys (codes < 0 are ignored)"""
+    linked = codes >= 0
+    codes = codes[linked]
+    features = {}
+
+    def total(weights):
+        return np.bincount(codes, weights=weights, minlength=n_groups)
+
+    def mean(values):
+        present = ~np.isnan(values)
+        counts = np.bincount(codes[present], minlength=n_groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, np.bincount(codes[present], weights=values[present], minlength=n_groups) / counts, np.nan)
+
+    created_col = next((col for col in ['created_date', 'createdate', 'created_at', 'hs_createdate'] if col in tickets_df.columns), None)
+    closed_col = next((col for col in ['closed_date', 'closedate', 'resolved_date', 'hs_closed_date'] if col in tickets_df.columns), None)
+    states = ticket_states(tickets_df)
+    priority_col = next((col for col in ['priority', 'ticket_priority', 'hs_ticket_priority'] if col in tickets_df.columns), None)
+    csat_col = next((col for col in ['csat', 'customer_satisfaction', 'satisfaction_score', 'hs_csat'] if col in tickets_df.columns), None)
+
+    created = None
+    if created_col:
+        stamps = pd.to_datetime(tickets_df[created_col], errors='coerce')
+        if getattr(stamps.dt, 'tz', None) is not None:
+            stamps = stamps.dt.tz_convert(None)
+        created = stamps.to_numpy(dtype='datetime64[ns]')[linked]
+        now = np.datetime64(datetime.now(), 'ns')
+        features['ticket_recent_count'] = total(created >= now - np.timedelta64(recent_days, 'D'))
+        # NaT is the smallest datetime64 value, so a running maximum skips it
+        last = np.full(n_groups, np.datetime64('NaT'), dtype='datetime64[ns]').view(np.int64)
+        np.maximum.at(last, codes, created.view(np.int64))
+        features['last_ticket_date'] = last.view('datetime64[ns]')
+
+    if states is not None:
+        is_open = np.isin(states[linked], TICKET_OPEN_STATES)
+        features['ticket_open_count'] = total(is_open)
+        if created is not None:
+            stale = created < np.datetime64(datetime.now() - timedelta(hours=hours_threshold), 'ns')
+            features['ticket_critical_count'] = total(is_open & stale)
+        if priority_col:
+            urgent = tickets_df[priority_col].astype(str).str.lower().isin(TICKET_URGENT_PRIORITIES).to_numpy()[linked]
+            features['ticket_urgent_open_count'] = total(is_open & urgent)
+
+    if created is not None and closed_col:
+        closed = pd.to_datetime(tickets_df[closed_col], errors='coerce')
+        if getattr(closed.dt, 'tz', None) is not None:
+            closed = closed.dt.tz_convert(None)
+        hours = (closed.to_numpy(dtype='datetime64[ns]')[linked] - created) / np.timedelta64(1, 'h')
+        features['ticket_resolution_hours_mean'] = mean(hours)
+        longest = np.full(n_groups, np.nan)
+        np.fmax.at(longest, codes, hours)
+        features['ticket_resolution_hours_max'] = longest
+
+    if csat_col:
+        features['ticket_csat_mean'] = mean(pd.to_numeric(tickets_df[csat_col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)[linked])
+
+    return features
+
+
+# Declared CRM objects: primary key candidates, singular name (for output columns),
+# numeric measures summed when the object is pre-aggregated onto its parent and an
+# optional builder of extra per-key features
+CRM_OBJECTS = {
+    'contacts': {'singular': 'contact', 'key': ['id', 'contact_id', 'vid', 'hs_object_id'], 'measures': []},
+    'companies': {'singular': 'company', 'key': ['id', 'company_id', 'companyid', 'hs_object_id'], 'measures': []},
+    'tickets': {'singular': 'ticket', 'key': ['id', 'ticket_id', 'hs_object_id'], 'measures': [], 'features': ticket_features},
+    'deals': {'singular': 'deal', 'key': ['id', 'deal_id', 'hs_object_id'], 'measures': ['amount', 'hs_arr', 'deal_value']},
+    'engagements': {'singular': 'engagement', 'key': ['id', 'engagement_id', 'call_id', 'hs_object_id'],
+                    'measures': ['duration', 'hs_call_duration', 'duration_minutes']},
+    'line_items': {'singular': 'line_item', 'key': ['id', 'line_item_id', 'hs_object_id'], 'measures': ['amount', 'quantity', 'price']}
+}
+
+# Declared links (child, parent): each child row references at most one parent row.
+# Listed by preference: an object joins the plan through its first usable link.
+CRM_RELATIONS = [
+    ('contacts', 'companies'),
+    ('tickets', 'contacts'),
+    ('deals', 'contacts'),
+    ('engagements', 'contacts'),
+    ('deals', 'companies'),
+    ('engagements', 'companies'),
+    ('line_items', 'deals')
+]
+
+
+def reference_column(child_df, parent):
+    """Column of child_df holding the parent's ID (contact_id, associatedcompanyid, ...)"""
+    singular = CRM_OBJECTS[parent]['singular']
+    exact = [f'{singular}_id', f'{singular}id', f'associated{singular}id', f'associated_{singular}_id', f'hs_{singular}_id']
+    return (
+        next((col for col in exact if col in child_df.columns), None)
+        or next((col for col in child_df.columns if singular in col.lower() and 'id' in col.lower()), None)
+    )
+
+
+class JoinPlanner:
+    """Plans joins of any set of CRM objects onto one row per root record, pre-aggregating the many-sides first"""
+
+    def __init__(self, objects, root='contacts', relations=CRM_RELATIONS):
+        self.root = root
+        self.frames = {name: df for name, df in objects.items() if df is not None and not df.empty}
+        self.keys = {}
+        self.steps = []
+        self.warnings = []
+        self.unlinked = []
+
+        for name, df in self.frames.items():
+            key_col = next((col for col in CRM_OBJECTS[name]['key'] if col in df.columns), None)
+            if key_col:
+                self.keys[name] = key_col
+
+        # Walk out from the root: each object joins once, through its first usable link
+        depth = {root: 0}
+        frontier = [root]
+        while frontier:
+            current = frontier.pop(0)
+            for child, parent in relations:
+                if child in self.frames and parent in self.frames and current in (child, parent):
+                    other = parent if current == child else child
+                    if other in depth:
+                        continue
+                    step = self._plan_step(child, parent, 'attach' if other == parent else 'aggregate')
+                    if step:
+                        step['depth'] = depth[current] + 1
+                        depth[other] = step['depth']
+                        self.steps.append(step)
+                        frontier.append(other)
+        self.unlinked = [name for name in self.frames if name not in depth]
+
+        # Deepest objects first (they feed their parents); cheapest join first within a level
+        self.steps.sort(key=lambda step: (-step['depth'], step['estimated_rows']))
+
+    def _plan_step(self, child, parent, kind):
+        """Resolve columns and keys of one join and estimate its output size"""
+        child_df, parent_df = self.frames[child], self.frames[parent]
+        ref_col = reference_column(child_df, parent)
+        parent_key = self.keys.get(parent)
+        if not ref_col or not parent_key:
+            return None
+
+        references, parent_keys = comparable_keys(normalize_keys(child_df[ref_col]), normalize_keys(parent_df[parent_key]))
+        step = {
+            'object': parent if kind == 'attach' else child,
+            'into': child if kind == 'attach' else parent,
+            'kind': kind,
+            'column': ref_col,
+            'parent_key': parent_key,
+            'references': references,
+            'parent_keys': parent_keys
+        }
+
+        if kind == 'aggregate':
+            # Many child rows per parent: collapse to one stats row per referenced key
+            distinct = int(references.nunique())
+            per_parent = references.value_counts()
+            # Trailing 1 for unmatched parents (get_indexer -1): a left merge keeps them once
+            matched = pd.Index(per_parent.index).get_indexer(parent_keys)
+            naive_rows = int(np.append(per_parent.to_numpy(), 1)[matched].sum())
+            step.update(estimated_rows=distinct, naive_rows=naive_rows)
+        else:
+            # Parent attached to each child row: a duplicated parent key would repeat child rows
+            duplicates = parent_keys.dropna().value_counts()
+            duplicates = duplicates[duplicates > 1]
+            matched = pd.Index(duplicates.index).get_indexer(references)
+            naive_rows = len(child_df) + int(np.append(duplicates.to_numpy() - 1, 0)[matched].sum())
+            step.update(estimated_rows=len(parent_df), naive_rows=naive_rows)
+            if len(duplicates):
+                self.warnings.append(
+                    f"{parent}: {len(duplicates):,} IDs in '{parent_key}' appear more than once. "
+                    f"Joining onto {child} would turn {len(child_df):,} rows into {naive_rows:,} "
+                    f"(x{naive_rows / len(child_df):.2f}); the first {CRM_OBJECTS[parent]['singular']} row per ID is kept."
+                )
+        return step
+
+    @property
+    def nbytes(self):
+        return sum(int(step['references'].memory_usage(deep=True)) + int(step['parent_keys'].memory_usage(deep=True))
+                   for step in self.steps)
+
+    def describe(self):
+        """Plan as a table: one row per join, in execution order"""
+        return pd.DataFrame([
+            {
+                'step': i + 1,
+                'join': f"{step['object']} → {step['into']}",
+                'strategy': 'pre-aggregate per key' if step['kind'] == 'aggregate' else 'attach columns',
+                'key': f"{step['column']} = {step['parent_key']}",
+                'estimated_rows': step['estimated_rows'],
+                'naive_merge_rows': step['naive_rows']
+            }
+            for i, step in enumerate(self.steps)
+        ])
+
+    @staticmethod
+    def _aggregate(df, references, singular, measures, features=None):
+        """One stats row per referenced key: row count, sums of the measure columns and any object features"""
+        codes, uniques = pd.factorize(references)
+        linked = codes >= 0
+        stats = {f'{singular}_count': np.bincount(codes[linked], minlength=len(uniques))}
+        for col in measures:
+            values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)[linked]
+            stats[col if col.endswith(('_count', '_sum')) else f'{singular}_{col}_sum'] = np.bincount(
+                codes[linked], weights=np.nan_to_num(values), minlength=len(uniques)
+            )
+        if features:
+            stats.update(features(df, codes, len(uniques)))
+        return pd.DataFrame(stats), pd.Series(uniques)
+
+    @staticmethod
+    def _attach(left, left_keys, right, right_keys, suffix):
+        """Left-join right's columns by position: one output row per left row whatever the key dtypes"""
+        positions = pd.Index(right_keys).get_indexer(left_keys) if right_keys.is_unique else (
+            pd.Index(right_keys.drop_duplicates()).get_indexer(left_keys)
+        )
+        # A missing key links to nothing, not to a parent whose own key is missing
+        positions[np.asarray(pd.isna(left_keys))] = -1
+        if not right_keys.is_unique:
+            right = right[~right_keys.duplicated().to_numpy()]
+        right_part = right.reset_index(drop=True).reindex(positions).set_axis(left.index)
+        overlap = right_part.columns.intersection(left.columns)
+        if len(overlap):
+            right_part = right_part.rename(columns={col: f"{col}{suffix}" for col in overlap})
+        return pd.concat([left, right_part], axis=1)
+
+    def execute(self):
+        """Run the plan; returns the root frame with every linked object's columns or statistics"""
+        if self.root not in self.frames:
+            return None
+        frames = {name: df.copy(deep=False) for name, df in self.frames.items()}
+        rolled_up = {name: [] for name in frames}
+
+        for step in self.steps:
+            source, target = step['object'], step['into']
+            singular = CRM_OBJECTS[source]['singular']
+            if step['kind'] == 'aggregate':
+                measures = [col for col in CRM_OBJECTS[source]['measures'] if col in frames[source].columns]
+                stats, keys = self._aggregate(
+                    frames[source], step['references'], singular, measures + rolled_up[source],
+                    CRM_OBJECTS[source].get('features')
+                )
+                # Output names: _attach suffixes stats columns that collide with the target's own
+                attached = [f'{col}_{singular}' if col in frames[target].columns else col for col in stats.columns]
+                frames[target] = self._attach(frames[target], step['parent_keys'], stats, keys, suffix=f'_{singular}')
+                # Counts and sums are additive (0 when nothing links); dates and means stay missing
+                additive = [name for col, name in zip(stats.columns, attached) if col.endswith(('_count', '_sum'))]
+                for col in additive:
+                    frames[target][col] = frames[target][col].fillna(0)
+                rolled_up[target] += additive
+            else:
+                frames[target] = self._attach(
+                    frames[target], step['references'], frames[source], step['parent_keys'], suffix=f'_{singular}'
+                )
+                rolled_up[target] += rolled_up[source]
+
+        return frames[self.root]
+
+
+# ==================== DATA EXPLORER ====================
+
+class DataExplorerIndex:
+    """Precomputed column indexes over a frame: filtered counts and pages are served without rescanning it"""
+
+    OPERATORS = ['=', '!=', '>', '>=', '<', '<=']
+
+    def __init__(self, df, max_categories=200):
+        self.df = df
+        self.total = len(df)
+        self.categorical = {}  # column -> (codes int32, sorted uniques, counts per code)
+        self.numeric = {}      # column -> (float64 values, sorted non-null values)
+        self._sort_orders = {}
+
+        for col in df.columns:
+            values = df[col]
+            if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+                numbers = values.to_numpy(dtype='float64', na_value=np.nan)
+                self.numeric[col] = (numbers, np.sort(numbers[~np.isnan(numbers)]))
+            elif values.nunique(dropna=True) <= max_categories:
+                codes, uniques = pd.factorize(values, sort=True)
+                counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+                self.categorical[col] = (codes.astype(np.int32), uniques, counts)
+
+        # Full-text search runs over one pre-lowered string per row (names and emails)
+        search_cols = [col for col in df.columns if 'name' in col.lower() or 'email' in col.lower()]
+        if search_cols:
+            text = df[search_cols[0]].astype(str).where(df[search_cols[0]].notna(), '')
+            for col in search_cols[1:]:
+                text = text + ' ' + df[col].astype(str).where(df[col].notna(), '')
+            self.search_text = text.str.lower()
+        else:
+            self.search_text = None
+
+    @property
+    def nbytes(self):
+        size = int(self.df.memory_usage(deep=True).sum())
+        for codes, _, counts in self.categorical.values():
+            size += codes.nbytes + counts.nbytes
+        for values, sorted_values in self.numeric.values():
+            size += values.nbytes + sorted_values.nbytes
+        if self.search_text is not None:
+            size += int(self.search_text.memory_usage(deep=True))
+        return size
+
+    @property
+    def filterable_columns(self):
+        return list(self.categorical) + list(self.numeric)
+
+    def categories(self, col):
+        """Category values of a column with their row counts, most frequent first"""
+        _, uniques, counts = self.categorical[col]
+        order = np.argsort(-counts, kind='stable')
+        return [(uniques[i], int(counts[i])) for i in order]
+
+    def count(self, col, op, value):
+        """Rows matching a single filter, answered from the index alone"""
+        if col in self.categorical:
+            _, uniques, counts = self.categorical[col]
+            position = uniques.get_indexer([value])[0]
+            matches = int(counts[position]) if position >= 0 else 0
+            return matches if op == '=' else self.total - matches
+        _, sorted_values = self.numeric[col]
+        value = float(value)
+        left = np.searchsorted(sorted_values, value, side='left')
+        right = np.searchsorted(sorted_values, value, side='right')
+        return {
+            '=': right - left,
+            '!=': self.total - (right - left),
+            '>': len(sorted_values) - right,
+            '>=': len(sorted_values) - left,
+            '<': left,
+            '<=': right
+        }[op]
+
+    def filter_mask(self, filters=(), search=''):
+        """Boolean row mask for (column, operator, value) filters and a name/email search term"""
+        mask = np.ones(self.total, dtype=bool)
+        for col, op, value in filters:
+            if col in self.categorical:
+                codes, uniques, _ = self.categorical[col]
+                position = uniques.get_indexer([value])[0]
+                if position < 0:
+                    # Unknown category: nothing equals it, every row differs from it
+                    if op == '=':
+                        mask[:] = False
+                    continue
+                mask &= (codes == position) if op == '=' else (codes != position)
+            else:
+                values = self.numeric[col][0]
+                value = float(value)
+                with np.errstate(invalid='ignore'):
+                    mask &= {
+                        '=': values == value, '!=': values != value,
+                        '>': values > value, '>=': values >= value,
+                        '<': values < value, '<=': values <= value
+                    }[op]
+        if search and self.search_text is not None:
+            mask &= self.search_text.str.contains(search.lower(), regex=False).to_numpy(dtype=bool)
+        return mask
+
+    def sort_order(self, col, ascending=True):
+        """Row positions ordered by col (nulls last either way), computed once per column"""
+        if col not in self._sort_orders:
+            if col in self.numeric:
+                keys = self.numeric[col][0]
+                nulls = int(np.isnan(keys).sum())
+            elif col in self.categorical:
+                codes = self.categorical[col][0]
+                keys = np.where(codes >= 0, codes, np.iinfo(np.int32).max)
+                nulls = int((codes < 0).sum())
+            else:
+                keys, uniques = pd.factorize(self.df[col], sort=True)
+                keys = np.where(keys >= 0, keys, len(uniques))
+                nulls = int(self.df[col].isna().sum())
+            self._sort_orders[col] = (np.argsort(keys, kind='stable'), self.total - nulls)
+        order, filled = self._sort_orders[col]
+        if ascending:
+            return order
+        # Reverse the filled rows only: nulls stay at the end
+        return np.concatenate([order[:filled][::-1], order[filled:]])
+
+    def match_count(self, filters=(), search='', mask=None):
+        """Number of matching rows, from the index alone when a single filter is active, else from mask (built if not given)"""
+        if not filters and not search:
+            return self.total
+        if len(filters) == 1 and not search:
+            return self.count(*filters[0])
+        if mask is None:
+            mask = self.filter_mask(filters, search)
+        return int(mask.sum())
+
+    def page(self, mask=None, sort_col=None, ascending=True, page=0, page_size=50):
+        """One page of the rows selected by mask (a filter_mask result; every row when None)"""
+        if sort_col:
+            order = self.sort_order(sort_col, ascending)
+            rows = order[mask[order]] if mask is not None else order
+        else:
+            rows = np.flatnonzero(mask) if mask is not None else np.arange(self.total)
+
+        start = page * page_size
+        return self.df.iloc[rows[start:start + page_size]]
+
+
 # ==================== V6 ANALYSIS FUNCTIONS ====================
 
 def analyze_cold_contacts(df, days_threshold=90):
@@ -509,10 +1551,10 @@ def analyze_cold_contacts(df, days_threshold=90):
     date_col = date_cols[0]
     
     try:
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+        last_activity = pd.to_datetime(df[date_col], errors='coerce')
         threshold_date = datetime.now() - timedelta(days=days_threshold)
         
-        cold_mask = (df[date_col] < threshold_date) | (df[date_col].isna())
+        cold_mask = (last_activity < threshold_date) | (last_activity.isna())
         cold_count = cold_mask.sum()
         
         return {
@@ -525,6 +1567,98 @@ def analyze_cold_contacts(df, days_threshold=90):
         return {'cold_count': 0, 'cold_pct': 0, 'total': len(df), 'error': True}
 
 
+COHORT_MAX_MONTHS = 24
+
+
+def analyze_contact_cohorts(df, max_months=COHORT_MAX_MONTHS):
+    """Cohortes par mois de création : part des contacts encore actifs N mois après leur création"""
+    if df is None or df.empty:
+        return None
+    
+    created_col = next((col for col in ['createdate', 'created_date', 'created_at', 'hs_createdate'] if col in df.columns), None)
+    date_cols = [c for c in df.columns if 'last_activity' in c.lower() or 'last_contact' in c.lower()]
+    if not created_col or not date_cols:
+        return None
+    
+    def month_numbers(values):
+        stamps = pd.to_datetime(values, errors='coerce')
+        if getattr(stamps.dt, 'tz', None) is not None:
+            stamps = stamps.dt.tz_convert(None)
+        months = stamps.to_numpy(dtype='datetime64[ns]').astype('datetime64[M]')
+        return months.view(np.int64), np.isnat(months)
+    
+    created, created_missing = month_numbers(df[created_col])
+    activity, activity_missing = month_numbers(df[date_cols[0]])
+    # Creation dates after the current month (bad data) belong to no cohort
+    current_month = np.datetime64(datetime.now(), 'M').astype(np.int64)
+    dated = ~created_missing & (created <= current_month)
+    created = created[dated]
+    activity = activity[dated]
+    activity_missing = activity_missing[dated]
+    if len(created) == 0:
+        return None
+    
+    first_month = max(int(created.min()), int(current_month) - max_months + 1)
+    keep = created >= first_month
+    cohort = (created[keep] - first_month).astype(np.int64)
+    n_cohorts = int(current_month) - first_month + 1
+    
+    # Last month a contact was still active, as an offset from its cohort (-1: never active)
+    lifetime = np.where(activity_missing[keep], -1, activity[keep] - created[keep])
+    lifetime = np.clip(lifetime, -1, n_cohorts - 1) + 1
+    
+    # One 2D histogram (cohort x lifetime), then a reversed cumulative sum:
+    # contacts active at offset k are those whose lifetime is >= k
+    histogram = np.bincount(cohort * (n_cohorts + 1) + lifetime, minlength=n_cohorts * (n_cohorts + 1))
+    histogram = histogram.reshape(n_cohorts, n_cohorts + 1)
+    sizes = histogram.sum(axis=1)
+    active = np.cumsum(histogram[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retention = np.where(sizes[:, None] > 0, active / sizes[:, None] * 100, np.nan)
+    # Offsets that lie in the future for a cohort are unknown, not zero
+    observable = np.arange(n_cohorts)[None, :] <= (n_cohorts - 1 - np.arange(n_cohorts))[:, None]
+    retention = np.where(observable, retention, np.nan)
+    
+    cohorts = np.arange(first_month, first_month + n_cohorts).astype('datetime64[M]')
+    populated = sizes > 0
+    return {
+        'cohorts': [str(month) for month in cohorts[populated]],
+        'sizes': sizes[populated],
+        'retention': np.round(retention[populated], 1),
+        'offsets': np.arange(n_cohorts),
+        'created_column': created_col,
+        'activity_column': date_cols[0],
+        'total': int(keep.sum())
+    }
+
+
+EMAIL_PATTERN = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+
+
+def invalid_email_mask(df):
+    """Contacts whose email is filled but syntactically invalid (None when there is no email column)"""
+    email_col = next((col for col in df.columns if 'email' in col.lower()), None)
+    if not email_col:
+        return None
+    emails = df[email_col]
+    return emails.notna() & ~emails.str.match(EMAIL_PATTERN, na=False)
+
+
+def duplicate_email_clusters(df):
+    """Positions of contacts sharing an email, grouped together, with their 1-based cluster number (None when none)"""
+    email_col = next((col for col in df.columns if 'email' in col.lower()), None)
+    if not email_col:
+        return None
+    emails = df[email_col]
+    dup_mask = (emails.notna() & emails.duplicated(keep=False)).to_numpy()
+    if not dup_mask.any():
+        return None
+    cluster = pd.factorize(emails[dup_mask])[0] + 1
+    order = np.argsort(cluster, kind='stable')
+    return np.flatnonzero(dup_mask)[order], cluster[order]
+
+
 def analyze_email_validity(df):
     """Validation avancée des emails"""
     if df is None or df.empty:
@@ -536,8 +1670,7 @@ def analyze_email_validity(df):
     
     emails = df[email_col].dropna()
     
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    valid_syntax = emails.str.match(email_pattern, na=False)
+    valid_syntax = emails.str.match(EMAIL_PATTERN, na=False)
     
     b2c_domains = ['gmail.com', 'yahoo.com', 'hotmail.com', 'outlook.com', 'live.com']
     b2c_mask = emails.str.lower().str.contains('|'.join(b2c_domains), na=False)
@@ -552,18 +1685,280 @@ def analyze_email_validity(df):
     }
 
 
+# ==================== PHONE NUMBERS ====================
+
+# ISO country -> (calling code, trunk prefix, national number lengths, allowed first digits or '' for any)
+# Bundled locally: no lookup service is called
+PHONE_NUMBERING_PLANS = {
+    'US': ('1', '1', (10,), '23456789'),
+    'CA': ('1', '1', (10,), '23456789'),
+    'FR': ('33', '0', (9,), '123456789'),
+    'GB': ('44', '0', (9, 10), '123456789'),
+    'DE': ('49', '0', (6, 7, 8, 9, 10, 11, 12, 13), '123456789'),
+    'ES': ('34', '', (9,), ''),
+    'IT': ('39', '', (6, 7, 8, 9, 10, 11), ''),
+    'NL': ('31', '0', (9,), '123456789'),
+    'BE': ('32', '0', (8, 9), '123456789'),
+    'CH': ('41', '0', (9,), '123456789'),
+    'AT': ('43', '0', (7, 8, 9, 10, 11, 12, 13), '123456789'),
+    'PT': ('351', '', (9,), ''),
+    'IE': ('353', '0', (7, 8, 9), '123456789'),
+    'LU': ('352', '', (6, 7, 8, 9, 10, 11), ''),
+    'SE': ('46', '0', (7, 8, 9), '123456789'),
+    'DK': ('45', '', (8,), ''),
+    'NO': ('47', '', (8,), ''),
+    'PL': ('48', '', (9,), ''),
+    'AU': ('61', '0', (9,), '123456789'),
+    'NZ': ('64', '0', (8, 9, 10), '123456789'),
+    'IN': ('91', '0', (10,), '123456789'),
+    'BR': ('55', '0', (10, 11), '123456789'),
+    'MX': ('52', '', (10,), ''),
+    'JP': ('81', '0', (9, 10), '123456789'),
+    'CN': ('86', '0', (10, 11), '123456789'),
+    'SG': ('65', '', (8,), ''),
+    'AE': ('971', '0', (8, 9), '123456789'),
+    'ZA': ('27', '0', (9,), '123456789'),
+    'MA': ('212', '0', (9,), '123456789'),
+    'IL': ('972', '0', (8, 9), '123456789')
+}
+PHONE_COUNTRY_ALIASES = {
+    'usa': 'US', 'united states': 'US', 'united states of america': 'US', 'canada': 'CA', 'france': 'FR',
+    'uk': 'GB', 'united kingdom': 'GB', 'great britain': 'GB', 'england': 'GB', 'germany': 'DE', 'deutschland': 'DE',
+    'spain': 'ES', 'espana': 'ES', 'italy': 'IT', 'italia': 'IT', 'netherlands': 'NL', 'belgium': 'BE',
+    'belgique': 'BE', 'switzerland': 'CH', 'suisse': 'CH', 'austria': 'AT', 'portugal': 'PT', 'ireland': 'IE',
+    'luxembourg': 'LU', 'sweden': 'SE', 'denmark': 'DK', 'norway': 'NO', 'poland': 'PL', 'australia': 'AU',
+    'new zealand': 'NZ', 'india': 'IN', 'brazil': 'BR', 'brasil': 'BR', 'mexico': 'MX', 'japan': 'JP',
+    'china': 'CN', 'singapore': 'SG', 'united arab emirates': 'AE', 'uae': 'AE', 'south africa': 'ZA',
+    'morocco': 'MA', 'maroc': 'MA', 'israel': 'IL'
+}
+PHONE_DEFAULT_COUNTRY = 'US'
+# Whole-number fillers: one repeated digit, or the 123.../987... runs
+PHONE_PLACEHOLDER_PATTERN = r'^(?:0+|1+|2+|3+|4+|5+|6+|7+|8+|9+|0?1234567890?|0?987654321?0?)$'
+PHONE_STATUSES = ['missing', 'valid', 'invalid', 'placeholder']
+PHONE_COLS = ['phone', 'phone_number', 'mobilephone', 'mobile_phone', 'hs_phone', 'telephone', 'mobile']
+
+
+def lookup_values(values, mapping, default=None):
+    """Map a string Series through a dict, touching each distinct value once"""
+    codes, uniques = pd.factorize(values)
+    table = np.array([mapping.get(value, default) for value in uniques] + [default], dtype=object)
+    return table[codes]
+
+
+def phone_country_codes(countries):
+    """ISO country code for each country value (names, aliases or ISO codes), None when unknown"""
+    names = pd.Series(countries).astype('string').str.strip().str.lower()
+    mapping = {**PHONE_COUNTRY_ALIASES, **{iso.lower(): iso for iso in PHONE_NUMBERING_PLANS}}
+    return lookup_values(names, mapping)
+
+
+def normalize_phone_numbers(phones, countries=None, default_country=PHONE_DEFAULT_COUNTRY):
+    """E.164 form, status (missing/valid/invalid/placeholder) and region of each phone number
+
+    Digits are parsed once into int64; calling code, trunk prefix and length checks are then
+    integer arithmetic against per-country tables, so no Python code runs per row.
+    """
+    index = pd.Series(phones).index
+    raw = pd.Series(phones).astype('string').reset_index(drop=True)
+    n = len(raw)
+    text = raw.str.replace(r'(?i)\s*(?:ext\.?|extension|x|#)\s*\d+\s*$|\(0\)', '', regex=True)
+    plus = text.str.match(r'^\s*\+').fillna(False).to_numpy(dtype=bool)
+    double_zero = ~plus & text.str.match(r'^\s*00').fillna(False).to_numpy(dtype=bool)
+    international = plus | double_zero
+    digits = text.str.replace(r'[^0-9]+', '', regex=True).fillna('')
+    digits = digits.mask(pd.Series(double_zero), digits.str.slice(2))
+    lengths = digits.str.len().to_numpy(dtype=np.int64)
+    # Left-pad to the 15-digit E.164 maximum and read the bytes as one int64 per number
+    pow10 = 10 ** np.arange(19, dtype=np.int64)
+    padded = digits.str.slice(0, 15).str.pad(15, side='left', fillchar='0').to_numpy(dtype='S15')
+    values = (np.frombuffer(padded.tobytes(), dtype=np.uint8).reshape(n, 15) - ord('0')).astype(np.int64) @ pow10[14::-1]
+    lengths_capped = np.minimum(lengths, 15)
+
+    regions = list(PHONE_NUMBERING_PLANS)
+    code_values = np.array([int(plan[0]) for plan in PHONE_NUMBERING_PLANS.values()], dtype=np.int64)
+    code_lengths = np.array([len(plan[0]) for plan in PHONE_NUMBERING_PLANS.values()], dtype=np.int64)
+    trunk_digits = np.array([int(plan[1]) if plan[1] else -1 for plan in PHONE_NUMBERING_PLANS.values()], dtype=np.int64)
+    length_masks = np.array([sum(1 << k for k in plan[2]) for plan in PHONE_NUMBERING_PLANS.values()], dtype=np.int64)
+    leading_masks = np.array([
+        sum(1 << int(d) for d in plan[3] or '0123456789') for plan in PHONE_NUMBERING_PLANS.values()
+    ], dtype=np.int64)
+    # Calling code -> first region using it (e.g. +1 -> US); codes never start with 0, so widths cannot collide
+    code_table = np.full(1000, -1, dtype=np.int64)
+    for position in range(len(regions) - 1, -1, -1):
+        code_table[code_values[position]] = position
+
+    def allowed(region_index, national_lengths):
+        masks = np.where(region_index >= 0, length_masks[np.maximum(region_index, 0)], 0)
+        return ((masks >> np.clip(national_lengths, 0, 62)) & 1).astype(bool)
+
+    # Region: longest listed calling code for international numbers, the row's country otherwise
+    region_index = np.full(n, -1, dtype=np.int64)
+    for width in (3, 2, 1):
+        prefix = values // pow10[np.maximum(lengths_capped - width, 0)]
+        found = np.where((lengths_capped > width) & (prefix < 1000), code_table[np.minimum(prefix, 999)], -1)
+        take = international & (region_index < 0) & (found >= 0)
+        region_index[take] = found[take]
+    default_index = regions.index(default_country) if default_country in regions else -1
+    national_index = np.full(n, default_index, dtype=np.int64)
+    if countries is not None:
+        row_countries = lookup_values(
+            pd.Series(phone_country_codes(countries), dtype='string'), {iso: i for i, iso in enumerate(regions)}, -1
+        ).astype(np.int64)
+        national_index = np.where(row_countries >= 0, row_countries, default_index)
+    region_index = np.where(international, region_index, national_index)
+    known = region_index >= 0
+    safe_index = np.maximum(region_index, 0)
+
+    # National significant number: drop the calling code (international) or the trunk prefix (national)
+    first_digit = values // pow10[np.maximum(lengths_capped - 1, 0)]
+    trunked = (
+        ~international & known & (trunk_digits[safe_index] == first_digit)
+        & allowed(region_index, lengths_capped - 1)
+    )
+    national_lengths = np.where(
+        international, lengths_capped - np.where(known, code_lengths[safe_index], 0), lengths_capped - trunked
+    )
+    national_values = values % pow10[np.clip(national_lengths, 0, 18)]
+
+    national_first = national_values // pow10[np.clip(national_lengths - 1, 0, 18)]
+    leading_ok = ((leading_masks[safe_index] >> np.clip(national_first, 0, 9)) & 1).astype(bool)
+
+    filled = (raw.str.strip().fillna('') != '').to_numpy(dtype=bool)
+    repunit = (pow10[np.clip(national_lengths, 1, 18)] - 1) // 9
+    placeholder = filled & (
+        ((national_lengths > 0) & (national_values % repunit == 0) & (national_values // repunit < 10))
+        | digits.str.match(PHONE_PLACEHOLDER_PATTERN).fillna(False).to_numpy(dtype=bool)
+    )
+    # Unlisted calling codes only get the generic E.164 length check
+    valid = filled & ~placeholder & (lengths <= 15) & np.where(
+        known, allowed(region_index, national_lengths) & leading_ok, international & (lengths >= 8)
+    )
+
+    status = np.select([~filled, placeholder, valid], ['missing', 'placeholder', 'valid'], 'invalid')
+    # International digits already start with the calling code; national ones get it prepended
+    calling_codes, code_positions = np.unique([plan[0] for plan in PHONE_NUMBERING_PLANS.values()], return_inverse=True)
+    code_text = pd.Series(pd.Categorical.from_codes(code_positions[safe_index], calling_codes)).astype('string')
+    national_text = digits.mask(pd.Series(trunked), digits.str.slice(1))
+    e164 = ('+' + digits).where(pd.Series(international), '+' + code_text + national_text)
+    e164 = e164.where(pd.Series(valid))
+    return pd.DataFrame({
+        'phone_e164': e164.to_numpy(),
+        'phone_status': pd.Categorical(status, categories=PHONE_STATUSES),
+        'phone_region': np.where(known, np.array(regions, dtype=object)[safe_index], None)
+    }, index=index)
+
+
+def phone_column(df):
+    """Phone column of a contacts frame (None when absent)"""
+    return breakdown_column(df, PHONE_COLS) or next(
+        (col for col in df.columns if 'phone' in col.lower() or 'mobile' in col.lower()), None
+    )
+
+
+def phone_default_country(countries):
+    """Region for national numbers without a country: the portal's dominant country"""
+    known = pd.Series(phone_country_codes(countries)).dropna() if countries is not None else pd.Series(dtype=object)
+    return known.value_counts().index[0] if len(known) else PHONE_DEFAULT_COUNTRY
+
+
+def analyze_phone_numbers(df, default_country=None):
+    """Validation et normalisation E.164 des numéros de téléphone"""
+    if df is None or df.empty:
+        return {'total': 0}
+    phone_col = phone_column(df)
+    if not phone_col:
+        return {'total': 0, 'no_phone_column': True}
+
+    country_col = breakdown_column(df, CATEGORY_BREAKDOWNS['Country'][1])
+    countries = df[country_col] if country_col else None
+    if default_country is None:
+        default_country = phone_default_country(countries)
+
+    normalized = normalize_phone_numbers(df[phone_col], countries, default_country)
+    status_counts = normalized['phone_status'].value_counts()
+    filled = len(df) - int(status_counts.get('missing', 0))
+    valid = int(status_counts.get('valid', 0))
+    keys = normalized['phone_e164']
+    shared = keys.value_counts()
+    shared = shared[shared > 1]
+    formatted = df[phone_col].astype('string').str.match(E164_PATTERN).fillna(False)
+
+    by_region = normalized[normalized['phone_status'] != 'missing'].assign(
+        valid=lambda frame: frame['phone_status'] == 'valid'
+    ).groupby(normalized['phone_region'].fillna('Other'), observed=True)['valid'].agg(['size', 'mean'])
+    problems = normalized['phone_status'].isin(['invalid', 'placeholder']).to_numpy()
+
+    return {
+        'column': phone_col,
+        'default_country': default_country,
+        'total': len(df),
+        'filled': filled,
+        'valid': valid,
+        'invalid': int(status_counts.get('invalid', 0)),
+        'placeholder': int(status_counts.get('placeholder', 0)),
+        'valid_pct': round(valid / filled * 100, 1) if filled else 0,
+        'formatted_pct': round(float(formatted.sum()) / filled * 100, 1) if filled else 0,
+        'duplicate_count': int((keys.duplicated() & keys.notna()).sum()),
+        'shared_numbers': pd.DataFrame({'Phone (E.164)': shared.index[:20], 'Contacts': shared.to_numpy()[:20]}),
+        'by_region': pd.DataFrame({
+            'Country': by_region.index,
+            'Numbers': by_region['size'].to_numpy(),
+            'Valid %': (by_region['mean'].to_numpy() * 100).round(1)
+        }).sort_values('Numbers', ascending=False),
+        'samples': pd.DataFrame({
+            phone_col: df[phone_col].to_numpy()[problems][:20],
+            'Status': normalized['phone_status'].to_numpy()[problems][:20]
+        })
+    }
+
+
+def normalize_keys(values):
+    """Canonical ID keys so 42, 42.0, '42' and ' 42 ' compare equal (missing/blank -> NA)
+
+    Integer keys come back as nullable Int64 (fast hashing), anything else as strings.
+    """
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype('string')
+    if pd.api.types.is_numeric_dtype(values):
+        finite = values.notna() & np.isfinite(values.astype(float))
+        if (values[finite] % 1 == 0).all():
+            return values.where(finite).astype('Int64')
+        keys = values.where(finite).astype('string')
+    else:
+        keys = values.astype('string').str.strip()
+    keys = keys.str.replace(r'^(-?\d+)\.0*$', r'\1', regex=True)
+    keys = keys.where(keys != '')
+    if keys.dropna().str.fullmatch(r'-?\d{1,18}').all():
+        return keys.astype('Int64')
+    return keys
+
+
+def comparable_keys(*keys):
+    """Bring normalized key series to one dtype: Int64 when all of them are, strings otherwise"""
+    if all(key.dtype == 'Int64' for key in keys):
+        return keys
+    return tuple(key.astype('string') for key in keys)
+
+
+def orphan_contact_mask(contacts_df):
+    """Contacts with an empty company field (None when there is no company column)"""
+    company_cols = [c for c in contacts_df.columns if 'company' in c.lower()]
+    if not company_cols:
+        return None
+    company_col = company_cols[0]
+    return contacts_df[company_col].isna() | (contacts_df[company_col] == '')
+
+
 def analyze_orphan_contacts(contacts_df):
     """Détecte contacts orphelins (sans company)"""
     if contacts_df is None or contacts_df.empty:
         return {'orphan_count': 0, 'orphan_pct': 0, 'total': 0}
     
-    company_cols = [c for c in contacts_df.columns if 'company' in c.lower()]
+    orphan_mask = orphan_contact_mask(contacts_df)
     
-    if not company_cols:
+    if orphan_mask is None:
         return {'orphan_count': 0, 'orphan_pct': 0, 'total': len(contacts_df), 'no_company_column': True}
     
-    company_col = company_cols[0]
-    orphan_mask = contacts_df[company_col].isna() | (contacts_df[company_col] == '')
     orphan_count = orphan_mask.sum()
     
     return {
@@ -573,14 +1968,8 @@ def analyze_orphan_contacts(contacts_df):
     }
 
 
-def analyze_companies_without_contacts(companies_df, contacts_df):
-    """Détecte companies fantômes (sans contacts)"""
-    if companies_df is None or companies_df.empty:
-        return {'ghost_count': 0, 'ghost_pct': 0, 'total': 0}
-    
-    if contacts_df is None or contacts_df.empty:
-        return {'ghost_count': len(companies_df), 'ghost_pct': 100, 'total': len(companies_df)}
-    
+def ghost_company_mask(companies_df, contacts_df):
+    """Companies that no contact points to (None when the ID columns are missing)"""
     company_id_col = None
     for col in ['id', 'company_id', 'companyid']:
         if col in companies_df.columns:
@@ -594,10 +1983,30 @@ def analyze_companies_without_contacts(companies_df, contacts_df):
             break
     
     if not company_id_col or not contact_company_col:
+        return None
+    
+    # Compare normalized keys: int IDs on one side and float/str IDs on the other must still match
+    references, company_keys = comparable_keys(
+        normalize_keys(contacts_df[contact_company_col]),
+        normalize_keys(companies_df[company_id_col])
+    )
+    companies_with_contacts = pd.Index(references.dropna().unique())
+    return pd.Series(companies_with_contacts.get_indexer(company_keys) < 0, index=companies_df.index)
+
+
+def analyze_companies_without_contacts(companies_df, contacts_df):
+    """Détecte companies fantômes (sans contacts)"""
+    if companies_df is None or companies_df.empty:
+        return {'ghost_count': 0, 'ghost_pct': 0, 'total': 0}
+    
+    if contacts_df is None or contacts_df.empty:
+        return {'ghost_count': len(companies_df), 'ghost_pct': 100, 'total': len(companies_df)}
+    
+    ghost_mask = ghost_company_mask(companies_df, contacts_df)
+    
+    if ghost_mask is None:
         return {'ghost_count': 0, 'ghost_pct': 0, 'total': len(companies_df), 'no_id_columns': True}
     
-    companies_with_contacts = contacts_df[contact_company_col].dropna().unique()
-    ghost_mask = ~companies_df[company_id_col].isin(companies_with_contacts)
     ghost_count = ghost_mask.sum()
     
     return {
@@ -607,115 +2016,641 @@ def analyze_companies_without_contacts(companies_df, contacts_df):
     }
 
 
-def analyze_critical_tickets(tickets_df, hours_threshold=48):
-    """Analyse tickets critiques ouverts >Xh"""
-    if tickets_df is None or tickets_df.empty:
-        return {'critical_count': 0, 'avg_resolution': 0, 'total': 0}
-    
+INTEGRITY_SAMPLE_ROWS = 100
+
+
+class KeyIndex:
+    """Normalized primary keys of one object in a hash index (duplicates and blanks counted once)"""
+
+    def __init__(self, df, candidates):
+        self.column = next((col for col in candidates if df is not None and col in df.columns), None)
+        self.index = pd.Index([], dtype=object)
+        self.blank = 0
+        self.duplicates = 0
+        if self.column:
+            keys = normalize_keys(df[self.column])
+            present = keys.dropna()
+            self.blank = len(keys) - len(present)
+            self.index = pd.Index(present.unique())
+            self.duplicates = len(present) - len(self.index)
+
+    def positions(self, references):
+        """Index position of each normalized reference (-1: dangling or blank)"""
+        references, keys = comparable_keys(references, pd.Series(self.index))
+        if keys.dtype != self.index.dtype:
+            self.index = pd.Index(keys)
+        return self.index.get_indexer(references)
+
+    def referenced(self, positions):
+        """Boolean mask over the unique keys: referenced at least once"""
+        hits = np.zeros(len(self.index), dtype=bool)
+        hits[positions[positions >= 0]] = True
+        return hits
+
+
+def check_referential_integrity(contacts_df, companies_df, tickets_df):
+    """Intégrité référentielle : références pendantes contact→company et ticket→contact, companies fantômes, contacts sans ticket"""
+    contacts = KeyIndex(contacts_df, ['id', 'contact_id', 'vid', 'hs_object_id'])
+    companies = KeyIndex(companies_df, ['id', 'company_id', 'companyid'])
+    result = {'checks': {}}
+
+    def reference_check(name, df, ref_col, target, source_label):
+        references = normalize_keys(df[ref_col])
+        positions = target.positions(references)
+        blank = references.isna().to_numpy()
+        dangling = (positions < 0) & ~blank
+        result['checks'][name] = {
+            'reference_column': ref_col,
+            'total': len(df),
+            'blank': int(blank.sum()),
+            'dangling': int(dangling.sum()),
+            'dangling_pct': round(dangling.sum() / len(df) * 100, 1) if len(df) else 0,
+            'dangling_keys': int(references[dangling].nunique()),
+            'sample': df[dangling][[c for c in [source_label, ref_col] if c]].head(INTEGRITY_SAMPLE_ROWS)
+        }
+        return positions
+
+    # Contact -> company
+    company_positions = None
+    if contacts_df is not None and companies.column:
+        ref_col = next((col for col in ['company_id', 'companyid', 'associatedcompanyid'] if col in contacts_df.columns), None)
+        if ref_col:
+            company_positions = reference_check('contact_company', contacts_df, ref_col, companies, contacts.column)
+
+    # Ticket -> contact
+    ticket_positions = None
+    if tickets_df is not None and contacts.column:
+        ref_col = next((col for col in tickets_df.columns if 'contact' in col.lower() and 'id' in col.lower()), None)
+        if ref_col:
+            ticket_id_col = next((col for col in ['id', 'ticket_id', 'hs_object_id'] if col in tickets_df.columns), None)
+            ticket_positions = reference_check('ticket_contact', tickets_df, ref_col, contacts, ticket_id_col)
+
+    # Unreferenced parents: a single scatter over the unique-key array
+    if company_positions is not None:
+        unreferenced = ~companies.referenced(company_positions)
+        result['ghost_companies'] = {
+            'count': int(unreferenced.sum()),
+            'pct': round(unreferenced.sum() / len(companies.index) * 100, 1) if len(companies.index) else 0,
+            'sample': companies.index[unreferenced][:INTEGRITY_SAMPLE_ROWS].tolist()
+        }
+    if ticket_positions is not None:
+        without_tickets = ~contacts.referenced(ticket_positions)
+        result['contacts_without_tickets'] = {
+            'count': int(without_tickets.sum()),
+            'pct': round(without_tickets.sum() / len(contacts.index) * 100, 1) if len(contacts.index) else 0
+        }
+
+    result['keys'] = {
+        label: {'column': index.column, 'unique': len(index.index), 'blank': index.blank, 'duplicates': index.duplicates}
+        for label, index in [('contacts', contacts), ('companies', companies)]
+        if index.column
+    }
+    return result
+
+
+# Personal mailbox providers: an email on these domains says nothing about the employer
+B2C_EMAIL_DOMAINS = frozenset([
+    'gmail.com', 'googlemail.com', 'yahoo.com', 'yahoo.fr', 'hotmail.com', 'hotmail.fr',
+    'outlook.com', 'outlook.fr', 'live.com', 'live.fr', 'msn.com', 'icloud.com', 'me.com',
+    'aol.com', 'protonmail.com', 'proton.me', 'gmx.com', 'gmx.fr', 'yandex.com', 'mail.ru',
+    'orange.fr', 'wanadoo.fr', 'free.fr', 'sfr.fr', 'laposte.net', 'bbox.fr'
+])
+
+
+def normalize_domains(values):
+    """Lowercase host names: strips scheme, www., port, path and email local parts"""
+    # Element-wise regex replaces stay on the string dtype (no per-row lists)
+    domains = values.astype('string').str.strip().str.lower()
+    domains = domains.str.replace(r'^.*@', '', regex=True)
+    domains = domains.str.replace(r'^[a-z][a-z0-9+.-]*://', '', regex=True)
+    domains = domains.str.replace(r'[/:?#].*$', '', regex=True)
+    domains = domains.str.replace(r'^www\.', '', regex=True).str.rstrip('.')
+    return domains.where(domains.str.contains('.', regex=False, na=False))
+
+
+def parent_domains(domains):
+    """Drop the left-most label (mail.acme.com -> acme.com); None when only two labels remain"""
+    parents = domains.str.replace(r'^[^.]*\.', '', regex=True)
+    return parents.where(parents.str.contains('.', regex=False, na=False))
+
+
+class CompanyDomainIndex:
+    """Hash index from normalized company domains to company IDs, built once per companies file"""
+
+    DOMAIN_COLS = ['domain', 'website', 'company_domain', 'domain_name', 'hs_domain']
+
+    def __init__(self, companies_df):
+        self.domains = pd.Index([], dtype='string')
+        self.company_ids = np.array([], dtype=object)
+        self.company_names = np.array([], dtype=object)
+        self.ambiguous = 0
+        if companies_df is None or companies_df.empty:
+            return
+
+        id_col = next((col for col in ['id', 'company_id', 'companyid'] if col in companies_df.columns), None)
+        domain_col = next((col for col in self.DOMAIN_COLS if col in companies_df.columns), None)
+        if not id_col or not domain_col:
+            return
+        name_col = next((col for col in ['name', 'company_name', 'company'] if col in companies_df.columns), None)
+
+        domains = normalize_domains(companies_df[domain_col])
+        usable = domains.notna() & ~domains.isin(B2C_EMAIL_DOMAINS)
+        # Several companies on one domain: keep the first, report the rest as ambiguous
+        first = usable & ~(domains.duplicated() & usable)
+        self.ambiguous = int(domains[usable].duplicated(keep=False).sum())
+        self.domains = pd.Index(domains[first].to_numpy(dtype=object))
+        self.company_ids = companies_df[id_col][first].to_numpy()
+        self.company_names = (
+            companies_df[name_col][first].to_numpy() if name_col else np.full(int(first.sum()), None, dtype=object)
+        )
+
+    def __len__(self):
+        return len(self.domains)
+
+    def lookup(self, domains):
+        """Position of each domain in the index (-1 when unknown); falls back to the parent domain"""
+        # Many contacts share a domain: resolve each distinct domain once
+        codes, uniques = pd.factorize(domains)
+        uniques = pd.Series(uniques, dtype='string')
+        positions = self.domains.get_indexer(uniques.to_numpy(dtype=object, na_value=None))
+        missing = positions < 0
+        if missing.any():
+            parents = parent_domains(uniques[missing])
+            positions[missing] = self.domains.get_indexer(parents.to_numpy(dtype=object, na_value=None))
+        return np.where(codes >= 0, positions[codes], -1)
+
+
+def suggest_company_links(contacts_df, companies_df, domain_index=None):
+    """Propose a company for each orphan contact from its email domain, with orphan/ghost counts after linking"""
+    if contacts_df is None or contacts_df.empty or companies_df is None or companies_df.empty:
+        return None
+
+    orphan_mask = orphan_contact_mask(contacts_df)
+    email_col = next((col for col in contacts_df.columns if 'email' in col.lower()), None)
+    if orphan_mask is None or not email_col:
+        return None
+
+    if domain_index is None:
+        domain_index = CompanyDomainIndex(companies_df)
+    if not len(domain_index):
+        return {'linked_count': 0, 'no_domain_column': True}
+
+    orphans = contacts_df[orphan_mask.to_numpy(dtype=bool)]
+    email_domains = normalize_domains(orphans[email_col])
+    b2c = email_domains.isin(B2C_EMAIL_DOMAINS).to_numpy(dtype=bool)
+    domains = email_domains.where(~b2c)
+    positions = domain_index.lookup(domains)
+    matched = positions >= 0
+    linked_ids = domain_index.company_ids[positions[matched]]
+
+    contact_id_col = next((col for col in ['id', 'contact_id', 'vid', 'hs_object_id'] if col in contacts_df.columns), None)
+    suggestions = pd.DataFrame({
+        'contact_id': orphans[contact_id_col].to_numpy()[matched] if contact_id_col else orphans.index[matched],
+        'email': orphans[email_col].to_numpy()[matched],
+        'email_domain': domains.to_numpy()[matched],
+        'company_id': linked_ids,
+        'company_name': domain_index.company_names[positions[matched]],
+        'company_domain': domain_index.domains[positions[matched]]
+    })
+    suggestions['match'] = np.where(suggestions['email_domain'] == suggestions['company_domain'], 'exact', 'parent domain')
+
+    orphan_before = int(orphan_mask.sum())
+    orphan_after = orphan_before - int(matched.sum())
+    ghost_mask = ghost_company_mask(companies_df, contacts_df)
+    ghost_before = ghost_after = None
+    if ghost_mask is not None:
+        company_id_col = next(col for col in ['id', 'company_id', 'companyid'] if col in companies_df.columns)
+        ghost_before = int(ghost_mask.sum())
+        ghost_after = int((ghost_mask & ~companies_df[company_id_col].isin(pd.unique(linked_ids))).sum())
+
+    total_companies = len(companies_df)
+    return {
+        'suggestions': suggestions,
+        'linked_count': len(suggestions),
+        'b2c_skipped': int(b2c.sum()),
+        'ambiguous_domains': domain_index.ambiguous,
+        'orphan_before': orphan_before,
+        'orphan_after': orphan_after,
+        'orphan_pct_after': round(orphan_after / len(contacts_df) * 100, 1),
+        'ghost_before': ghost_before,
+        'ghost_after': ghost_after,
+        'ghost_pct_after': round(ghost_after / total_companies * 100, 1) if ghost_after is not None else None
+    }
+
+
+def critical_ticket_masks(tickets_df, hours_threshold=48):
+    """Open tickets and open tickets older than hours_threshold (None when status/date columns are missing)"""
     date_col = None
     for col in ['created_date', 'createdate', 'created_at']:
         if col in tickets_df.columns:
             date_col = col
             break
     
-    status_col = None
-    for col in ['status', 'state', 'ticket_status']:
-        if col in tickets_df.columns:
-            status_col = col
-            break
+    states = ticket_states(tickets_df)
+    
+    if not date_col or states is None:
+        return None
     
-    if not date_col or not status_col:
-        return {'critical_count': 0, 'avg_resolution': 0, 'total': len(tickets_df), 'no_required_columns': True}
+    created = pd.to_datetime(tickets_df[date_col], errors='coerce')
+    
+    open_mask = pd.Series(np.isin(states, TICKET_OPEN_STATES), index=tickets_df.index)
+    
+    threshold_date = datetime.now() - timedelta(hours=hours_threshold)
+    critical_mask = open_mask & (created < threshold_date)
+    return open_mask, critical_mask
+
+
+def analyze_critical_tickets(tickets_df, hours_threshold=48, resolution_stats=None):
+    """Analyse tickets critiques ouverts >Xh (médiane de résolution reprise de analyze_resolution_distribution)"""
+    if tickets_df is None or tickets_df.empty:
+        return {'critical_count': 0, 'median_resolution': 0, 'total': 0}
     
     try:
-        tickets_df[date_col] = pd.to_datetime(tickets_df[date_col], errors='coerce')
-        
-        open_statuses = ['open', 'new', 'pending', 'in progress', 'waiting']
-        open_mask = tickets_df[status_col].str.lower().isin(open_statuses)
+        masks = critical_ticket_masks(tickets_df, hours_threshold)
+        if masks is None:
+            return {'critical_count': 0, 'median_resolution': 0, 'total': len(tickets_df), 'no_required_columns': True}
         
-        threshold_date = datetime.now() - timedelta(hours=hours_threshold)
-        critical_mask = open_mask & (tickets_df[date_col] < threshold_date)
+        open_mask, critical_mask = masks
         critical_count = critical_mask.sum()
         
-        closed_col = None
-        for col in ['closed_date', 'closedate', 'resolved_date']:
-            if col in tickets_df.columns:
-                closed_col = col
-                break
-        
-        avg_resolution = 0
-        if closed_col:
-            tickets_df[closed_col] = pd.to_datetime(tickets_df[closed_col], errors='coerce')
-            resolved = tickets_df[tickets_df[closed_col].notna()]
-            if not resolved.empty:
-                resolution_time = (resolved[closed_col] - resolved[date_col]).dt.total_seconds() / 3600
-                avg_resolution = resolution_time.mean()
+        # Median: a few tickets left open for months do not skew it
+        median_resolution = resolution_stats['p50'] if resolution_stats and resolution_stats.get('count') else 0
         
         return {
             'critical_count': int(critical_count),
             'total_open': int(open_mask.sum()),
             'total': len(tickets_df),
-            'avg_resolution': round(avg_resolution, 1) if avg_resolution > 0 else 0,
+            'median_resolution': round(median_resolution, 1) if median_resolution > 0 else 0,
             'threshold_hours': hours_threshold
         }
     except:
-        return {'critical_count': 0, 'avg_resolution': 0, 'total': len(tickets_df), 'error': True}
+        return {'critical_count': 0, 'median_resolution': 0, 'total': len(tickets_df), 'error': True}
+
+
+class ThresholdIndex:
+    """Presorted activity dates and open-ticket ages: cold/critical counts for any threshold via binary search"""
+
+    def __init__(self, contacts_df, tickets_df):
+        self.contacts_total = len(contacts_df) if contacts_df is not None else 0
+        self.tickets_total = len(tickets_df) if tickets_df is not None else 0
+        self.activity = None
+        self.activity_missing = 0
+        self.open_created = None
+        self.open_total = 0
+
+        if contacts_df is not None and not contacts_df.empty:
+            date_cols = [c for c in contacts_df.columns if 'last_activity' in c.lower() or 'last_contact' in c.lower()]
+            if date_cols:
+                activity = self._sorted_timestamps(contacts_df[date_cols[0]])
+                self.activity_missing = self.contacts_total - len(activity)
+                self.activity = activity
+
+        if tickets_df is not None and not tickets_df.empty:
+            masks = critical_ticket_masks(tickets_df)
+            if masks is not None:
+                date_col = next(col for col in ['created_date', 'createdate', 'created_at'] if col in tickets_df.columns)
+                open_mask = masks[0].to_numpy(dtype=bool)
+                self.open_total = int(open_mask.sum())
+                self.open_created = self._sorted_timestamps(tickets_df[date_col][open_mask])
+
+    @staticmethod
+    def _sorted_timestamps(values):
+        """Non-null timestamps as a sorted naive datetime64[ns] array"""
+        stamps = pd.to_datetime(values, errors='coerce')
+        if getattr(stamps.dt, 'tz', None) is not None:
+            stamps = stamps.dt.tz_convert(None)
+        stamps = stamps.dropna().to_numpy(dtype='datetime64[ns]')
+        stamps.sort()
+        return stamps
+
+    def cold_analysis(self, days_threshold=90):
+        """Same result as analyze_cold_contacts, in O(log n)"""
+        if self.contacts_total == 0:
+            return {'cold_count': 0, 'cold_pct': 0, 'total': 0}
+        if self.activity is None:
+            return {'cold_count': 0, 'cold_pct': 0, 'total': self.contacts_total, 'no_date_column': True}
+
+        threshold_date = np.datetime64(datetime.now() - timedelta(days=days_threshold), 'ns')
+        cold_count = self.activity_missing + int(np.searchsorted(self.activity, threshold_date, side='left'))
+        return {
+            'cold_count': cold_count,
+            'cold_pct': round(cold_count / self.contacts_total * 100, 1),
+            'total': self.contacts_total,
+            'threshold_days': days_threshold
+        }
+
+    def critical_tickets(self, hours_threshold=48, base=None):
+        """analyze_critical_tickets result (base) with the critical count recomputed for a new threshold"""
+        if self.open_created is None or (base and (base.get('error') or base.get('no_required_columns'))):
+            return base
+        threshold_date = np.datetime64(datetime.now() - timedelta(hours=hours_threshold), 'ns')
+        critical_count = int(np.searchsorted(self.open_created, threshold_date, side='left'))
+        return {
+            **(base or {'median_resolution': 0}),
+            'critical_count': critical_count,
+            'total_open': self.open_total,
+            'total': self.tickets_total,
+            'threshold_hours': hours_threshold
+        }
 
 
-def analyze_churn_risk(contacts_df, tickets_df=None):
-    """Calcule score de risque churn par contact"""
+# Churn risk signals: points added to a contact's 0-100 risk score
+CHURN_SIGNAL_WEIGHTS = {
+    'inactive_90d': 40,
+    'inactive_60d': 20,
+    'inactive_30d': 10,
+    'invalid_email': 15,
+    'incomplete_profile': 15,
+    'recent_ticket_volume': 10,
+    'open_critical_tickets': 20,
+    'slow_resolution': 10
+}
+CHURN_AT_RISK_THRESHOLD = 70
+CHURN_RECENT_TICKET_DAYS = 30
+CHURN_RECENT_TICKET_VOLUME = 3
+CHURN_SLOW_RESOLUTION_HOURS = 72
+
+
+def top_n_indices(values, n):
+    """Positions of the n largest values, highest first, via partial sort (argpartition)"""
+    values = np.asarray(values)
+    n = min(n, len(values))
+    if n <= 0:
+        return np.array([], dtype=np.intp)
+    candidates = np.argpartition(values, len(values) - n)[len(values) - n:]
+    return candidates[np.argsort(values[candidates], kind='stable')[::-1]]
+
+
+def contact_ticket_signals(contact_keys, tickets_df, recent_days=CHURN_RECENT_TICKET_DAYS, hours_threshold=48):
+    """Per-contact ticket features aligned with contact_keys (see ticket_features)"""
+    if tickets_df is None or tickets_df.empty:
+        return {}
+    
+    ticket_contact_col = reference_column(tickets_df, 'contacts')
+    if not ticket_contact_col:
+        return {}
+    
+    # Factorize contact keys once, then join tickets by position instead of merging frames
+    contact_keys, ticket_keys = comparable_keys(normalize_keys(pd.Series(contact_keys)), normalize_keys(tickets_df[ticket_contact_col]))
+    contact_codes, contact_uniques = pd.factorize(contact_keys)
+    ticket_codes = pd.Index(contact_uniques).get_indexer(ticket_keys)
+    features = ticket_features(tickets_df, ticket_codes, len(contact_uniques), hours_threshold, recent_days)
+    
+    # Contacts without an ID never match a ticket
+    missing = contact_codes < 0
+    signals = {}
+    for name, values in features.items():
+        if not len(values):
+            values = np.zeros(1, dtype=values.dtype)
+        aligned = values[np.maximum(contact_codes, 0)]
+        aligned[missing] = 0 if name.endswith('_count') else np.nan if values.dtype.kind == 'f' else np.datetime64('NaT')
+        signals[name] = aligned
+    return signals
+
+
+def aligned_ticket_signals(contacts_df, feature_df, key_col=None):
+    """Per-contact ticket columns of feature_df realigned to contacts_df by contact key, else by index (None when neither is unique)"""
+    if key_col and key_col in feature_df.columns and feature_df[key_col].is_unique:
+        positions = pd.Index(feature_df[key_col]).get_indexer(contacts_df[key_col])
+    elif feature_df.index.is_unique:
+        positions = feature_df.index.get_indexer(contacts_df.index)
+    else:
+        return None
+    unmatched = positions < 0
+    signals = {}
+    for col in TICKET_FEATURE_COLUMNS:
+        if col in feature_df.columns and col != 'last_ticket_date':
+            aligned = feature_df[col].to_numpy(dtype=float, na_value=np.nan)[positions]
+            aligned[unmatched] = np.nan
+            signals[col] = aligned
+    return signals
+
+
+def analyze_churn_risk(contacts_df, tickets_df=None, weights=None, top_n=50, ticket_feature_df=None):
+    """Calcule score de risque churn par contact (vectorisé, signaux contacts + tickets)
+
+    ticket_feature_df: frame carrying the per-contact ticket columns built during aggregation,
+    matched to contacts_df by contact ID (or index); when given, tickets_df is not scanned again.
+    """
     if contacts_df is None or contacts_df.empty:
         return {'at_risk_count': 0, 'at_risk_pct': 0, 'avg_score': 0, 'total': 0, 'arr_at_risk': 0}
     
-    contacts_df = contacts_df.copy()
-    contacts_df['churn_risk_score'] = 0
+    weights = {**CHURN_SIGNAL_WEIGHTS, **(weights or {})}
+    n = len(contacts_df)
     
-    # Signal 1: Inactivité
+    # Inactivité
+    days_since = np.full(n, np.nan)
     date_cols = [c for c in contacts_df.columns if 'last_activity' in c.lower() or 'last_contact' in c.lower()]
     if date_cols:
-        date_col = date_cols[0]
         try:
-            contacts_df[date_col] = pd.to_datetime(contacts_df[date_col], errors='coerce')
-            days_since = (datetime.now() - contacts_df[date_col]).dt.days
-            contacts_df.loc[days_since > 90, 'churn_risk_score'] += 40
-            contacts_df.loc[(days_since > 60) & (days_since <= 90), 'churn_risk_score'] += 20
-            contacts_df.loc[(days_since > 30) & (days_since <= 60), 'churn_risk_score'] += 10
+            last_activity = pd.to_datetime(contacts_df[date_cols[0]], errors='coerce')
+            days_since = (datetime.now() - last_activity).dt.days.to_numpy(dtype=float, na_value=np.nan)
         except:
             pass
     
-    # Signal 2: Email invalide
+    # Email invalide
+    invalid_email = np.zeros(n, dtype=bool)
     email_col = next((col for col in contacts_df.columns if 'email' in col.lower()), None)
     if email_col:
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        invalid_email = ~contacts_df[email_col].str.match(email_pattern, na=False)
-        contacts_df.loc[invalid_email, 'churn_risk_score'] += 15
+        invalid_email = ~contacts_df[email_col].str.match(EMAIL_PATTERN, na=False).to_numpy(dtype=bool)
+    
+    # Tickets joined by contact ID (precomputed per contact during aggregation when available)
+    contact_id_col = next((col for col in contacts_df.columns if 'id' in col.lower()), None)
+    ticket_signals = None
+    if ticket_feature_df is not None:
+        ticket_signals = aligned_ticket_signals(contacts_df, ticket_feature_df, contact_id_col)
+    if ticket_signals is None:
+        ticket_signals = contact_ticket_signals(contacts_df[contact_id_col], tickets_df) if contact_id_col else {}
+    
+    def signal(name):
+        return np.nan_to_num(ticket_signals.get(name, np.zeros(n)).astype(float))
     
-    # Signal 3: Données incomplètes
-    completeness = contacts_df.notna().sum(axis=1) / len(contacts_df.columns)
-    contacts_df.loc[completeness < 0.5, 'churn_risk_score'] += 15
+    # Urgent open tickets when a priority column exists, otherwise open tickets past the critical age
+    open_critical = signal('ticket_urgent_open_count') if 'ticket_urgent_open_count' in ticket_signals else signal('ticket_critical_count')
     
-    at_risk_mask = contacts_df['churn_risk_score'] >= 70
+    flags = {
+        'invalid_email': invalid_email,
+        'incomplete_profile': (contacts_df.notna().sum(axis=1) / len(contacts_df.columns)).to_numpy() < 0.5,
+        'recent_ticket_volume': signal('ticket_recent_count') >= CHURN_RECENT_TICKET_VOLUME,
+        'open_critical_tickets': open_critical > 0,
+        'slow_resolution': signal('ticket_resolution_hours_mean') > CHURN_SLOW_RESOLUTION_HOURS
+    }
+    
+    # All signals in one pass: inactivity tiers via np.select, boolean flags via a weighted dot product
+    inactivity_tiers = ['inactive_90d', 'inactive_60d', 'inactive_30d']
+    inactivity_points = np.select(
+        [days_since > 90, days_since > 60, days_since > 30],
+        [weights[tier] for tier in inactivity_tiers],
+        default=0
+    )
+    flag_matrix = np.column_stack(list(flags.values()))
+    flag_weights = np.array([weights[name] for name in flags])
+    scores = np.minimum(inactivity_points + flag_matrix @ flag_weights, 100).astype(np.int16)
+    
+    at_risk_mask = scores >= CHURN_AT_RISK_THRESHOLD
     at_risk_count = at_risk_mask.sum()
-    avg_score = contacts_df['churn_risk_score'].mean()
+    avg_score = scores.mean()
     
     arr_at_risk = 0
     arr_cols = [c for c in contacts_df.columns if c.lower() in ['arr', 'mrr', 'annual_revenue']]
     if arr_cols:
         arr_col = arr_cols[0]
         try:
-            arr_at_risk = contacts_df.loc[at_risk_mask, arr_col].sum()
+            arr_at_risk = np.nansum(pd.to_numeric(contacts_df[arr_col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)[at_risk_mask])
         except:
             pass
     
+    # Top-N list from a partial sort: only the selected rows are materialized
+    top_idx = top_n_indices(scores, top_n)
+    top_idx = top_idx[scores[top_idx] > 0]
+    display_cols = [c for c in [contact_id_col, email_col] if c] + [
+        c for c in contacts_df.columns if c.lower() in ['firstname', 'first_name', 'lastname', 'last_name']
+    ]
+    top_at_risk = contacts_df.iloc[top_idx][display_cols].reset_index(drop=True)
+    top_at_risk['churn_risk_score'] = scores[top_idx]
+    top_days = days_since[top_idx]
+    top_tiers = np.select([top_days > 90, top_days > 60, top_days > 30], inactivity_tiers, default='')
+    top_at_risk['risk_signals'] = [
+        ', '.join([tier] * bool(tier) + [name for name, mask in flags.items() if mask[i]])
+        for tier, i in zip(top_tiers, top_idx)
+    ]
+    
     return {
         'at_risk_count': int(at_risk_count),
-        'at_risk_pct': round(at_risk_count / len(contacts_df) * 100, 1) if len(contacts_df) > 0 else 0,
+        'at_risk_pct': round(at_risk_count / n * 100, 1) if n > 0 else 0,
         'avg_score': round(avg_score, 1),
-        'total': len(contacts_df),
-        'arr_at_risk': round(arr_at_risk, 0) if arr_at_risk > 0 else 0
+        'total': n,
+        'arr_at_risk': round(arr_at_risk, 0) if arr_at_risk > 0 else 0,
+        'threshold': CHURN_AT_RISK_THRESHOLD,
+        'scores': scores,
+        'signal_counts': {name: int(mask.sum()) for name, mask in flags.items()},
+        'top_at_risk': top_at_risk
     }
 
 
+# ==================== DELTA AUDIT ====================
+DELTA_ROW_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)  # Odd 64-bit constant: column order matters in a row fingerprint
+DELTA_EXAMPLES = 20
+DELTA_WHOLE_ROWS = '(whole rows)'
+
+
+def joint_codes(old, new):
+    """Codes of two series from one shared hash table: equal values get equal codes across both (missing -> -1)"""
+    codes, _ = pd.factorize(pd.concat([old, new], ignore_index=True))
+    return codes[:len(old)], codes[len(old):]
+
+
+def delta_value_codes(old, new):
+    """Joint codes of one column of both exports: numbers compared as floats (5 == 5.0), anything else as text"""
+    def numeric(values):
+        return pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+
+    if numeric(old) and numeric(new):
+        return joint_codes(old.astype('float64'), new.astype('float64'))
+    return joint_codes(old.astype('string'), new.astype('string'))
+
+
+def mix64(codes):
+    """splitmix64 finalizer: spread int64 codes over all 64 bits"""
+    x = codes.astype(np.uint64)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def delta_audit(old_df, new_df, data_type='contacts', key=None):
+    """Added/removed/modified records between two exports of one object, matched on a key column (or whole rows)"""
+    old_df = user_columns(old_df)
+    new_df = user_columns(new_df)
+    columns = [col for col in old_df.columns if col in new_df.columns]
+    if not columns:
+        raise ValueError("The two exports share no column")
+    if key is not None and key not in columns:
+        raise ValueError(f"Key column '{key}' is not in both exports")
+    n_old, n_new = len(old_df), len(new_df)
+
+    # 64-bit row fingerprints over the shared columns, one column at a time
+    old_fp = np.zeros(n_old, dtype=np.uint64)
+    new_fp = np.zeros(n_new, dtype=np.uint64)
+    for col in columns:
+        old_codes, new_codes = delta_value_codes(old_df[col], new_df[col])
+        old_fp = old_fp * DELTA_ROW_MULTIPLIER + mix64(old_codes)
+        new_fp = new_fp * DELTA_ROW_MULTIPLIER + mix64(new_codes)
+
+    # Hash join on the key: each new row probes the first old row with the same key
+    old_keyed = np.zeros(n_old, dtype=bool)
+    new_keyed = np.zeros(n_new, dtype=bool)
+    old_pos = np.full(n_new, -1, dtype=np.int64)
+    if key is not None:
+        old_keys, new_keys = joint_codes(*comparable_keys(normalize_keys(old_df[key]), normalize_keys(new_df[key])))
+        old_keyed = (old_keys >= 0) & ~pd.Series(old_keys).duplicated().to_numpy()
+        new_keyed = (new_keys >= 0) & ~pd.Series(new_keys).duplicated().to_numpy()
+        first_old = np.full(max(old_keys.max(initial=-1), new_keys.max(initial=-1)) + 1, -1, dtype=np.int64)
+        first_old[old_keys[old_keyed]] = np.flatnonzero(old_keyed)
+        old_pos[new_keyed] = first_old[new_keys[new_keyed]]
+
+    matched = old_pos >= 0
+    matched_old = np.zeros(n_old, dtype=bool)
+    matched_old[old_pos[matched]] = True
+    modified = np.zeros(n_new, dtype=bool)
+    modified[matched] = new_fp[matched] != old_fp[old_pos[matched]]
+    added = new_keyed & ~matched
+    removed = old_keyed & ~matched_old
+
+    # Blank or repeated keys (every row without a key) can only be matched as identical rows
+    old_rest = pd.Series(old_fp[~old_keyed]).value_counts()
+    new_rest = pd.Series(new_fp[~new_keyed]).value_counts()
+    old_rest, new_rest = old_rest.align(new_rest, fill_value=0)
+    same = np.minimum(old_rest.to_numpy(), new_rest.to_numpy())
+
+    # Per-column breakdown, only over the modified pairs
+    new_rows = np.flatnonzero(modified)
+    old_rows = old_pos[new_rows]
+    column_changes = {}
+    example_changes = []
+    for col in columns:
+        old_codes, new_codes = delta_value_codes(old_df[col].iloc[old_rows], new_df[col].iloc[new_rows])
+        differs = old_codes != new_codes
+        column_changes[col] = int(differs.sum())
+        example_changes.append(differs[:DELTA_EXAMPLES])
+
+    n_modified = len(new_rows)
+    breakdown = pd.DataFrame({'Column': list(column_changes), 'Modified records': list(column_changes.values())})
+    breakdown = breakdown[breakdown['Modified records'] > 0].sort_values('Modified records', ascending=False, kind='stable')
+    breakdown['% of modified'] = (breakdown['Modified records'] / max(n_modified, 1) * 100).round(1)
+
+    examples = []
+    if key is not None:
+        changed = np.array(example_changes, dtype=bool).reshape(len(columns), min(n_modified, DELTA_EXAMPLES))
+        examples += [
+            {'Key': new_df[key].iloc[row], 'Change': 'modified', 'Columns': ', '.join(np.array(columns, dtype=object)[changed[:, i]])}
+            for i, row in enumerate(new_rows[:DELTA_EXAMPLES])
+        ]
+        examples += [{'Key': value, 'Change': 'added', 'Columns': ''} for value in new_df[key].to_numpy()[added][:DELTA_EXAMPLES]]
+        examples += [{'Key': value, 'Change': 'removed', 'Columns': ''} for value in old_df[key].to_numpy()[removed][:DELTA_EXAMPLES]]
+
+    old_score = calculate_health_score(old_df, data_type)[0]
+    new_score = calculate_health_score(new_df, data_type)[0]
+    return {
+        'object': data_type,
+        'key': key,
+        'old_rows': n_old,
+        'new_rows': n_new,
+        'added': int(added.sum() + (new_rest.to_numpy() - same).sum()),
+        'removed': int(removed.sum() + (old_rest.to_numpy() - same).sum()),
+        'modified': n_modified,
+        'unchanged': int(matched.sum() - n_modified + same.sum()),
+        'unkeyed': {'old': int((~old_keyed).sum()), 'new': int((~new_keyed).sum())},
+        'columns_added': [col for col in new_df.columns if col not in old_df.columns],
+        'columns_removed': [col for col in old_df.columns if col not in new_df.columns],
+        'column_changes': breakdown.reset_index(drop=True),
+        'examples': pd.DataFrame(examples, columns=['Key', 'Change', 'Columns']),
+        'health': {'old': old_score, 'new': new_score, 'delta': round(new_score - old_score, 1)}
+    }
+
 
 # Jupiter CRM Audit V6-TEST
 
@@ -736,11 +2671,14 @@ def add_chart_legend(legend_text):
     
     # Afficher avec st.info (natif Streamlit)
     st.info(full_text)
+
+
 def analyze_tickets_completeness(tickets_df):
     """Calcule le taux de complétude des tickets"""
     if tickets_df is None or tickets_df.empty:
         return {'completeness_pct': 0, 'total_fields': 0, 'filled_fields': 0}
     
+    tickets_df = user_columns(tickets_df)
     total_cells = tickets_df.shape[0] * tickets_df.shape[1]
     filled_cells = total_cells - tickets_df.isnull().sum().sum()
     completeness_pct = (filled_cells / total_cells * 100) if total_cells > 0 else 0
@@ -758,6 +2696,7 @@ def analyze_companies_completeness(companies_df):
     if companies_df is None or companies_df.empty:
         return {'completeness_pct': 0, 'total_fields': 0, 'filled_fields': 0}
     
+    companies_df = user_columns(companies_df)
     total_cells = companies_df.shape[0] * companies_df.shape[1]
     filled_cells = total_cells - companies_df.isnull().sum().sum()
     completeness_pct = (filled_cells / total_cells * 100) if total_cells > 0 else 0
@@ -817,6 +2756,398 @@ def analyze_quality_improvement(pre_scores, post_score):
     }
 
 
+# ==================== COLUMN PROFILING ====================
+
+PROFILE_HLL_PRECISION = 12     # 4096 registers, ~1.6% distinct-count error
+PROFILE_TOP_VALUES = 10
+PROFILE_TOP_CAPACITY = 200     # values tracked per column across chunks
+PROFILE_PATTERN_SAMPLE = 2000  # distinct values shaped per chunk
+PROFILE_SHAPE_LENGTH = 40
+
+
+class HyperLogLog:
+    """Distinct-count sketch over 64-bit hashes; registers merge by element-wise max"""
+
+    def __init__(self, precision=PROFILE_HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return self
+        buckets = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        remainder = hashes << np.uint64(self.precision)
+        # rank = leading zeros of the remaining bits + 1 (bit length read from the float exponent)
+        bit_length = np.frexp(remainder.astype(np.float64))[1]
+        ranks = np.minimum(65 - bit_length, 64 - self.precision + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+
+def value_shapes(values):
+    """Character-shape of each value: 'John Smith' -> 'Aa+ Aa+', '75001' -> '9{5}'"""
+    masked = (
+        pd.Series(values, dtype='string')
+        .str.slice(0, PROFILE_SHAPE_LENGTH)
+        .str.replace(r'[A-Z]', 'A', regex=True)
+        .str.replace(r'[a-z]', 'a', regex=True)
+        .str.replace(r'[0-9]', '9', regex=True)
+    )
+    codes, uniques = pd.factorize(masked)
+
+    def collapse(run):
+        text = run.group(0)
+        if text[0] == '9':
+            return f'9{{{len(text)}}}'
+        return text[0] + '+'
+
+    shapes = np.array([re.sub(r'a{2,}|A{2,}|9{2,}', collapse, shape) for shape in uniques], dtype=object)
+    return shapes[codes] if len(shapes) else np.array([], dtype=object)
+
+
+class ColumnProfile:
+    """Streaming profile of one column: fill, approximate distinct count, top values, min/max, shapes"""
+
+    def __init__(self, name):
+        self.name = name
+        self.kind = None
+        self.rows = 0
+        self.filled = 0
+        self.hll = HyperLogLog()
+        self.top = {}
+        self.shapes = {}
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def column_kind(values):
+        if pd.api.types.is_bool_dtype(values):
+            return 'boolean'
+        if pd.api.types.is_numeric_dtype(values):
+            return 'number'
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return 'date'
+        return 'text'
+
+    def update(self, values):
+        """Add one chunk of the column"""
+        self.kind = self.kind or self.column_kind(values)
+        self.rows += len(values)
+        codes, uniques = pd.factorize(values)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        if self.kind == 'text':
+            # Blank strings count as missing
+            keep = pd.Series(uniques, dtype='string').str.strip().ne('').fillna(False).to_numpy(dtype=bool)
+            uniques, counts = uniques[keep], counts[keep]
+        if not len(uniques):
+            return self
+        self.filled += int(counts.sum())
+
+        if self.kind == 'date':
+            hashes = pd.util.hash_array(np.asarray(uniques).view('int64'))
+        else:
+            hashes = pd.util.hash_array(np.asarray(uniques, dtype=object if self.kind == 'text' else None))
+        self.hll.update(hashes)
+
+        # Only the chunk's heaviest values reach the Python-level counter
+        for position in top_n_indices(counts, PROFILE_TOP_CAPACITY):
+            value = uniques[position]
+            self.top[value] = self.top.get(value, 0) + int(counts[position])
+        if len(self.top) > PROFILE_TOP_CAPACITY:
+            self.top = dict(sorted(self.top.items(), key=lambda item: -item[1])[:PROFILE_TOP_CAPACITY])
+
+        try:
+            bounds = np.asarray(uniques) if self.kind == 'number' else uniques
+            low, high = bounds.min(), bounds.max()
+        except TypeError:
+            as_text = pd.Index(uniques.astype(str))
+            low, high = as_text.min(), as_text.max()
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+        if self.kind == 'text':
+            step = max(len(uniques) // PROFILE_PATTERN_SAMPLE, 1)
+            sample = np.arange(0, len(uniques), step)[:PROFILE_PATTERN_SAMPLE]
+            weights = counts[sample] * (counts.sum() / max(counts[sample].sum(), 1))
+            shapes = value_shapes(np.asarray(uniques[sample], dtype=object))
+            for shape, weight in pd.Series(weights).groupby(shapes).sum().items():
+                self.shapes[shape] = self.shapes.get(shape, 0) + weight
+        return self
+
+    def merge(self, other):
+        """Fold the profile of another chunk/partition of the same column into this one"""
+        self.kind = self.kind or other.kind
+        self.rows += other.rows
+        self.filled += other.filled
+        self.hll.merge(other.hll)
+        for value, count in other.top.items():
+            self.top[value] = self.top.get(value, 0) + count
+        self.top = dict(sorted(self.top.items(), key=lambda item: -item[1])[:PROFILE_TOP_CAPACITY])
+        for shape, weight in other.shapes.items():
+            self.shapes[shape] = self.shapes.get(shape, 0) + weight
+        for bound, pick in (('min', min), ('max', max)):
+            mine, theirs = getattr(self, bound), getattr(other, bound)
+            setattr(self, bound, theirs if mine is None else mine if theirs is None else pick(mine, theirs))
+        return self
+
+    def summary(self, top_values=PROFILE_TOP_VALUES):
+        distinct = min(self.hll.count(), self.filled) if self.filled else 0
+        if len(self.top) < PROFILE_TOP_CAPACITY:
+            distinct = len(self.top)  # every value was tracked: the count is exact
+        top = sorted(self.top.items(), key=lambda item: -item[1])[:top_values]
+        total_shape = sum(self.shapes.values())
+        patterns = sorted(self.shapes.items(), key=lambda item: -item[1])[:5]
+        return {
+            'column': self.name,
+            'type': self.kind,
+            'rows': self.rows,
+            'filled': self.filled,
+            'fill_pct': round(self.filled / self.rows * 100, 1) if self.rows else 0,
+            'distinct': distinct,
+            'top_values': [{'value': value, 'count': count, 'pct': round(count / self.rows * 100, 1)} for value, count in top],
+            'min': self.min,
+            'max': self.max,
+            'patterns': [{'pattern': shape, 'pct': round(weight / total_shape * 100, 1)} for shape, weight in patterns]
+        }
+
+
+def analyze_column_profiles(data):
+    """Per-column profiles in one streaming pass; data may be a frame or an iterable of chunks"""
+    profiles = {}
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+    for chunk in chunks:
+        if chunk is None or chunk.empty:
+            continue
+        for col in user_columns(chunk).columns:
+            profiles.setdefault(col, ColumnProfile(col)).update(chunk[col])
+
+    details = {col: profile.summary() for col, profile in profiles.items()}
+    columns = pd.DataFrame([
+        {
+            'Column': col,
+            'Type': detail['type'],
+            'Fill %': detail['fill_pct'],
+            'Distinct (≈)': detail['distinct'],
+            'Top value': str(detail['top_values'][0]['value']) if detail['top_values'] else '',
+            'Min': str(detail['min']) if detail['min'] is not None else '',
+            'Max': str(detail['max']) if detail['max'] is not None else '',
+            'Main pattern': detail['patterns'][0]['pattern'] if detail['patterns'] else ''
+        }
+        for col, detail in details.items()
+    ])
+    return {'columns': columns, 'details': details, 'rows': next(iter(details.values()))['rows'] if details else 0}
+
+
+class QuantileSketch:
+    """Mergeable relative-error quantile sketch (DDSketch): log-spaced buckets, vectorized updates"""
+
+    MIN_VALUE = 1e-9  # Values at or below this (incl. negative durations) land in the zero bucket
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.buckets = {}  # bucket index -> count
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def bucket_indices(self, values):
+        return np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+
+    def add_buckets(self, indices, counts):
+        for index, count in zip(np.asarray(indices).tolist(), np.asarray(counts).tolist()):
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def update(self, values):
+        """Add a batch of values (NaN ignored)"""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        positive = values > self.MIN_VALUE
+        self.zero_count += int((~positive).sum())
+        self.add_buckets(*np.unique(self.bucket_indices(values[positive]), return_counts=True))
+        return self
+
+    def merge(self, other):
+        """Fold another sketch with the same accuracy into this one"""
+        self.add_buckets(list(other.buckets), list(other.buckets.values()))
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        """Value at quantile q (0-1), within relative_accuracy of the exact answer"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        cumulative = self.zero_count
+        if rank < cumulative:
+            return min(max(self.min, 0.0), self.max)
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            if cumulative > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def histogram(self, bins=20):
+        """Approximate histogram (bin edges, counts) rebuilt from the bucket representatives"""
+        if self.count == 0:
+            return [], []
+        indices = np.array(sorted(self.buckets), dtype=np.int64)
+        values = np.concatenate([[0.0], 2 * self.gamma ** indices / (self.gamma + 1)])
+        weights = np.concatenate([[self.zero_count], [self.buckets[i] for i in indices]])
+        low, high = max(self.min, 0.0), max(self.max, self.min, 0.0)
+        counts, edges = np.histogram(np.clip(values, low, high), bins=bins, range=(low, high if high > low else low + 1), weights=weights)
+        return edges.round(2).tolist(), counts.astype(int).tolist()
+
+
+def grouped_quantile_sketches(values, codes, n_groups, relative_accuracy=0.01):
+    """One QuantileSketch per group code, from a single vectorized pass over values"""
+    sketches = [QuantileSketch(relative_accuracy) for _ in range(n_groups)]
+    valid = ~np.isnan(values) & (codes >= 0)
+    values, codes = values[valid], codes[valid]
+    if not len(values):
+        return sketches
+
+    stats = pd.Series(values).groupby(codes).agg(['count', 'sum', 'min', 'max'])
+    positive = values > QuantileSketch.MIN_VALUE
+    zero_counts = np.bincount(codes[~positive], minlength=n_groups)
+
+    # Bucket every value once, then count (group, bucket) pairs through a combined integer key
+    buckets = sketches[0].bucket_indices(values[positive])
+    if len(buckets):
+        offset = buckets.min()
+        span = int(buckets.max() - offset + 1)
+        pairs, pair_counts = np.unique(codes[positive].astype(np.int64) * span + (buckets - offset), return_counts=True)
+        pair_groups = pairs // span
+        for group in np.unique(pair_groups):
+            selected = pair_groups == group
+            sketches[group].add_buckets(pairs[selected] % span + offset, pair_counts[selected])
+
+    for group, row in stats.iterrows():
+        sketch = sketches[group]
+        sketch.count = int(row['count'])
+        sketch.total = float(row['sum'])
+        sketch.min = float(row['min'])
+        sketch.max = float(row['max'])
+        sketch.zero_count = int(zero_counts[group])
+    return sketches
+
+
+class ResolutionTimeStats:
+    """Streaming resolution-time distribution, overall and per status/priority/owner; chunks merge freely"""
+
+    DIMENSIONS = {
+        'status': ['status', 'state', 'ticket_status', 'hs_ticket_status'],
+        'priority': ['priority', 'ticket_priority', 'hs_ticket_priority'],
+        'owner': ['owner', 'ticket_owner', 'hubspot_owner_id', 'hs_owner', 'assigned_to', 'agent']
+    }
+    CREATED_COLS = ['created_date', 'createdate', 'created_at', 'hs_createdate']
+    CLOSED_COLS = ['closed_date', 'closedate', 'resolved_date', 'hs_closed_date']
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.overall = QuantileSketch(relative_accuracy)
+        self.groups = {dimension: {} for dimension in self.DIMENSIONS}
+
+    def update(self, chunk):
+        """Add one chunk of tickets"""
+        created_col = next((col for col in self.CREATED_COLS if col in chunk.columns), None)
+        closed_col = next((col for col in self.CLOSED_COLS if col in chunk.columns), None)
+        if not created_col or not closed_col:
+            return self
+
+        created = pd.to_datetime(chunk[created_col], errors='coerce')
+        closed = pd.to_datetime(chunk[closed_col], errors='coerce')
+        hours = ((closed - created).dt.total_seconds() / 3600).to_numpy(dtype=float, na_value=np.nan)
+        self.overall.update(hours)
+
+        for dimension, candidates in self.DIMENSIONS.items():
+            col = next((c for c in candidates if c in chunk.columns), None)
+            if not col:
+                continue
+            codes, uniques = pd.factorize(chunk[col].astype(str).where(chunk[col].notna(), '(none)'))
+            sketches = grouped_quantile_sketches(hours, codes, len(uniques), self.relative_accuracy)
+            groups = self.groups[dimension]
+            for value, sketch in zip(uniques, sketches):
+                if sketch.count:
+                    if value in groups:
+                        groups[value].merge(sketch)
+                    else:
+                        groups[value] = sketch
+        return self
+
+    def merge(self, other):
+        """Fold the statistics of another chunk/partition into this one"""
+        self.overall.merge(other.overall)
+        for dimension, groups in other.groups.items():
+            for value, sketch in groups.items():
+                if value in self.groups[dimension]:
+                    self.groups[dimension][value].merge(sketch)
+                else:
+                    self.groups[dimension][value] = sketch
+        return self
+
+    @staticmethod
+    def describe(sketch):
+        return {
+            'count': sketch.count,
+            'mean': round(sketch.mean, 1) if sketch.count else 0,
+            'p50': round(sketch.quantile(0.5), 1) if sketch.count else 0,
+            'p90': round(sketch.quantile(0.9), 1) if sketch.count else 0,
+            'p99': round(sketch.quantile(0.99), 1) if sketch.count else 0
+        }
+
+    def summary(self, bins=20, max_groups=20):
+        """Overall percentiles, histogram and per-dimension breakdowns (largest groups first)"""
+        edges, counts = self.overall.histogram(bins)
+        result = {**self.describe(self.overall), 'histogram': {'edges': edges, 'counts': counts}, 'breakdown': {}}
+        for dimension, groups in self.groups.items():
+            if groups:
+                largest = sorted(groups.items(), key=lambda item: -item[1].count)[:max_groups]
+                result['breakdown'][dimension] = [{dimension: value, **self.describe(sketch)} for value, sketch in largest]
+        return result
+
+
+def analyze_resolution_distribution(tickets):
+    """Resolution-time percentiles (p50/p90/p99), histogram and breakdowns; tickets may be a frame or an iterable of chunks"""
+    stats = ResolutionTimeStats()
+    chunks = [tickets] if isinstance(tickets, pd.DataFrame) else tickets
+    for chunk in chunks:
+        if chunk is not None and not chunk.empty:
+            stats.update(chunk)
+    return stats.summary()
+
+
 def analyze_tickets_performance(tickets_df):
     """Analyse performance complète des tickets"""
     if tickets_df is None or tickets_df.empty:
@@ -830,21 +3161,15 @@ def analyze_tickets_performance(tickets_df):
             'nps_score': None
         }
     
-    status_col = None
-    for col in ['status', 'state', 'ticket_status', 'hs_ticket_status']:
-        if col in tickets_df.columns:
-            status_col = col
-            break
-    
     open_count = 0
     closed_count = 0
     
-    if status_col:
-        open_statuses = ['open', 'new', 'pending', 'in progress', 'waiting']
-        closed_statuses = ['closed', 'resolved', 'solved', 'completed']
-        
-        open_count = tickets_df[status_col].str.lower().isin(open_statuses).sum()
-        closed_count = tickets_df[status_col].str.lower().isin(closed_statuses).sum()
+    # Canonical int8 states: one bincount instead of lowercasing every status string
+    states = ticket_states(tickets_df)
+    if states is not None:
+        state_counts = np.bincount(states, minlength=len(TICKET_STATES))
+        open_count = state_counts[TICKET_OPEN_STATES].sum()
+        closed_count = state_counts[TICKET_STATE_CODES['closed']]
     
     avg_resolution = 0
     created_col = None
@@ -860,15 +3185,12 @@ def analyze_tickets_performance(tickets_df):
             closed_col = col
             break
     
+    resolution_stats = None
     if created_col and closed_col:
         try:
-            tickets_df[created_col] = pd.to_datetime(tickets_df[created_col], errors='coerce')
-            tickets_df[closed_col] = pd.to_datetime(tickets_df[closed_col], errors='coerce')
-            
-            resolved = tickets_df[tickets_df[closed_col].notna()].copy()
-            if not resolved.empty:
-                resolution_time = (resolved[closed_col] - resolved[created_col]).dt.total_seconds() / 3600
-                avg_resolution = resolution_time.mean()
+            # One pass: exact mean plus sketch-based percentiles and breakdowns
+            resolution_stats = analyze_resolution_distribution(tickets_df)
+            avg_resolution = resolution_stats['mean']
         except:
             pass
     
@@ -911,40 +3233,302 @@ def analyze_tickets_performance(tickets_df):
         'avg_resolution_hours': round(avg_resolution, 1) if avg_resolution > 0 else 0,
         'sla_compliance': sla_compliance,
         'csat_score': csat_score,
-        'nps_score': nps_score
+        'nps_score': nps_score,
+        'resolution_stats': resolution_stats
     }
 
 
+# Ticket trend bins and anomaly detection on opened-ticket volume
+TREND_FREQUENCIES = {'Day': 'D', 'Week': 'W', 'Month': 'M'}
+TREND_ANOMALY_WINDOW = 8
+TREND_ANOMALY_Z = 3.0
+TREND_ANOMALY_MIN_STD = 1.0  # tickets per bin: floor of the baseline spread, so a flat history still flags a spike
+
+
+class TicketTrendIndex:
+    """Daily opened/closed ticket counts, rolled up to day/week/month bins with backlog and anomaly flags"""
+
+    NAT_DAY = np.iinfo(np.int64).min
+
+    def __init__(self, tickets_df):
+        self.start = None
+        self.opened = np.zeros(0, dtype=np.int64)
+        self.closed = np.zeros(0, dtype=np.int64)
+
+        if tickets_df is None or tickets_df.empty:
+            return
+        created_col = next((col for col in ResolutionTimeStats.CREATED_COLS if col in tickets_df.columns), None)
+        if not created_col:
+            return
+        closed_col = next((col for col in ResolutionTimeStats.CLOSED_COLS if col in tickets_df.columns), None)
+
+        created = self._day_numbers(tickets_df[created_col])
+        valid = created != self.NAT_DAY
+        if not valid.any():
+            return
+        created = created[valid]
+        closed = np.zeros(0, dtype=np.int64)
+        if closed_col:
+            closed = self._day_numbers(tickets_df[closed_col])[valid]
+            resolved = closed != self.NAT_DAY
+            # A ticket leaves the backlog no earlier than the day it was opened
+            closed = np.maximum(closed[resolved], created[resolved])
+
+        first = int(created.min())
+        last = int(max(created.max(), closed.max() if len(closed) else first))
+        self.start = np.datetime64(first, 'D')
+        self.opened = np.bincount(created - first, minlength=last - first + 1)
+        self.closed = np.bincount(closed - first, minlength=last - first + 1)
+
+    @classmethod
+    def _day_numbers(cls, values):
+        """Dates as int64 days since 1970-01-01 (NaT -> NAT_DAY)"""
+        stamps = pd.to_datetime(values, errors='coerce')
+        if getattr(stamps.dt, 'tz', None) is not None:
+            stamps = stamps.dt.tz_convert(None)
+        return stamps.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').view(np.int64)
+
+    @property
+    def total_days(self):
+        return len(self.opened)
+
+    def _bin_codes(self, freq):
+        """Bin number of every day in range, plus the start date of each bin"""
+        days = np.arange(self.total_days) + self.start.astype(np.int64)
+        if freq == 'D':
+            starts = days.astype('datetime64[D]')
+            return np.arange(self.total_days), starts
+        if freq == 'W':
+            # 1970-01-01 is a Thursday: shift so weeks start on Monday
+            weeks = (days + 3) // 7
+            codes = weeks - weeks[0]
+            starts = (np.unique(weeks) * 7 - 3).astype('datetime64[D]')
+            return codes, starts
+        months = days.astype('datetime64[D]').astype('datetime64[M]').view(np.int64)
+        codes = months - months[0]
+        starts = np.unique(months).astype('datetime64[M]').astype('datetime64[D]')
+        return codes, starts
+
+    def trends(self, freq='W', window=TREND_ANOMALY_WINDOW, z_threshold=TREND_ANOMALY_Z):
+        """Opened, closed and backlog per bin; bins whose opened volume deviates from the trailing window are anomalies"""
+        if self.start is None:
+            return None
+
+        codes, starts = self._bin_codes(freq)
+        n_bins = len(starts)
+        opened = np.bincount(codes, weights=self.opened, minlength=n_bins).astype(np.int64)
+        closed = np.bincount(codes, weights=self.closed, minlength=n_bins).astype(np.int64)
+        backlog = np.cumsum(opened - closed)
+
+        # Rolling z-score against the previous `window` bins (the bin itself is excluded from its baseline)
+        volume = pd.Series(opened, dtype=float)
+        baseline = volume.shift(1).rolling(window, min_periods=max(3, window // 2))
+        mean = baseline.mean()
+        # Counts vary at least by their Poisson noise (sqrt of the mean): a flat baseline does not hide a jump
+        std = np.maximum(baseline.std(), np.sqrt(mean)).clip(lower=TREND_ANOMALY_MIN_STD)
+        zscore = ((volume - mean) / std).to_numpy()
+        flagged = np.flatnonzero(np.abs(np.nan_to_num(zscore)) >= z_threshold)
+
+        periods = pd.DatetimeIndex(starts)
+        return {
+            'freq': freq,
+            'periods': periods,
+            'opened': opened,
+            'closed': closed,
+            'backlog': backlog,
+            'zscore': zscore,
+            'anomalies': [
+                {
+                    'period': periods[i],
+                    'opened': int(opened[i]),
+                    'zscore': round(float(zscore[i]), 1),
+                    'direction': 'spike' if zscore[i] > 0 else 'drop'
+                }
+                for i in flagged
+            ],
+            'total_opened': int(opened.sum()),
+            'total_closed': int(closed.sum()),
+            'current_backlog': int(backlog[-1]) if n_bins else 0,
+            'peak_backlog': int(backlog.max()) if n_bins else 0
+        }
+
+
+# ==================== TOP-K FREQUENCIES ====================
+
+TOP_K_CAPACITY = 256  # counters kept per column; counts are exact while distinct values fit
+
+# Standard breakdowns: label -> (dataset, candidate columns)
+CATEGORY_BREAKDOWNS = {
+    'Industry': ('companies', ['industry', 'sector', 'vertical', 'hs_industry', 'industry_type']),
+    'Country': ('contacts', ['country', 'hs_country', 'country_code', 'country_region']),
+    'Lifecycle Stage': ('contacts', ['lifecyclestage', 'lifecycle_stage', 'hs_lifecyclestage', 'stage']),
+    'Lead Source': ('contacts', ['lead_source', 'leadsource', 'hs_analytics_source', 'original_source', 'source']),
+    'Ticket Category': ('tickets', ['category', 'ticket_category', 'hs_ticket_category', 'ticket_type', 'type'])
+}
+
+
+class SpaceSavingSketch:
+    """Mergeable Space-Saving top-K summary: each tracked count over-estimates by at most its error"""
+
+    def __init__(self, capacity=TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0  # upper bound on the count of any value that is not tracked
+        self.total = 0
+        self.missing = 0
+
+    def update(self, values):
+        """Add one chunk: exact chunk counts, trimmed to capacity, merged as a summary"""
+        values = pd.Series(values)
+        codes, uniques = pd.factorize(values.astype('string').str.strip())
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        blank = np.asarray(uniques == '', dtype=bool)
+
+        chunk = SpaceSavingSketch(self.capacity)
+        chunk.total = len(values)
+        chunk.missing = int((codes < 0).sum() + counts[blank].sum())
+        counts[blank] = 0
+        kept = top_n_indices(counts, self.capacity + 1)
+        kept = kept[counts[kept] > 0]
+        if len(kept) > self.capacity:
+            chunk.floor = int(counts[kept[-1]])
+            kept = kept[:-1]
+        chunk.counts = {uniques[position]: int(counts[position]) for position in kept}
+        chunk.errors = dict.fromkeys(chunk.counts, 0)
+        return self.merge(chunk)
+
+    def merge(self, other):
+        """Fold another summary in; untracked values are assumed to sit at each side's floor"""
+        combined = {}
+        for value in self.counts.keys() | other.counts.keys():
+            combined[value] = (
+                self.counts.get(value, self.floor) + other.counts.get(value, other.floor),
+                self.errors.get(value, self.floor) + other.errors.get(value, other.floor)
+            )
+        ranked = sorted(combined.items(), key=lambda item: -item[1][0])
+        floor = self.floor + other.floor
+        if len(ranked) > self.capacity:
+            floor = max(floor, ranked[self.capacity][1][0])
+            ranked = ranked[:self.capacity]
+        self.counts = {value: count for value, (count, _) in ranked}
+        self.errors = {value: error for value, (_, error) in ranked}
+        self.floor = floor
+        self.total += other.total
+        self.missing += other.missing
+        return self
+
+    def top(self, n):
+        """n most frequent values as (value, estimated count, max over-estimate), highest first"""
+        ranked = sorted(self.counts.items(), key=lambda item: -item[1])[:n]
+        return [(value, count, self.errors.get(value, 0)) for value, count in ranked]
+
+
+def breakdown_column(df, candidates):
+    """First candidate column present in df (case-insensitive)"""
+    if df is None:
+        return None
+    lowered = {col.lower(): col for col in df.columns}
+    return next((lowered[col] for col in candidates if col in lowered), None)
+
+
+def analyze_top_values(data, column, top_n=10, capacity=TOP_K_CAPACITY):
+    """Approximate top-K of one categorical column; data may be a frame or an iterable of chunks"""
+    sketch = SpaceSavingSketch(capacity)
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+    for chunk in chunks:
+        if chunk is not None and column in chunk.columns:
+            sketch.update(chunk[column])
+
+    return {
+        'column': column,
+        'top_values': [
+            {
+                'name': str(value),
+                'count': int(count),
+                'percentage': round(count / sketch.total * 100, 1) if sketch.total else 0,
+                'max_error': int(error)
+            }
+            for value, count, error in sketch.top(top_n)
+        ],
+        'total': sketch.total,
+        'missing': sketch.missing,
+        'max_error': int(sketch.floor),
+        'exact': sketch.floor == 0
+    }
+
+
+def analyze_category_breakdowns(datasets, top_n=10):
+    """Top values for every standard breakdown whose column exists"""
+    breakdowns = {}
+    for label, (dataset, candidates) in CATEGORY_BREAKDOWNS.items():
+        column = breakdown_column(datasets.get(dataset), candidates)
+        if column:
+            breakdowns[label] = {'dataset': dataset, **analyze_top_values(datasets[dataset], column, top_n)}
+    return breakdowns
+
+
+def render_breakdown_widget(datasets, fingerprints, key):
+    """Top-K breakdown of any categorical column: dataset + column pickers, chart and table"""
+    available = [name for name, df in datasets.items() if df is not None and not df.empty]
+    if not available:
+        return None
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        dataset = st.selectbox("Dataset", available, format_func=str.capitalize, key=f'{key}_dataset')
+    df = datasets[dataset]
+    standard = [
+        breakdown_column(df, candidates)
+        for label, (name, candidates) in CATEGORY_BREAKDOWNS.items() if name == dataset
+    ]
+    categorical = [
+        col for col in df.columns
+        if not pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_datetime64_any_dtype(df[col])
+    ]
+    columns = list(dict.fromkeys([col for col in standard if col] + categorical))
+    if not columns:
+        st.info("ℹ️ No categorical column in this dataset")
+        return None
+    with col2:
+        column = st.selectbox("Column", columns, key=f'{key}_column')
+    with col3:
+        top_n = st.slider("Top", min_value=3, max_value=25, value=10, key=f'{key}_top_n')
+
+    breakdown = cached_result(
+        'top_values', [fingerprints.get(dataset), column, str(top_n)],
+        lambda: analyze_top_values(df, column, top_n)
+    )
+    if not breakdown['top_values']:
+        st.info(f"ℹ️ No values in {column}")
+        return breakdown
+
+    st.plotly_chart(build_top_values_chart(breakdown['top_values'], column, column), use_container_width=True)
+    st.dataframe(pd.DataFrame(breakdown['top_values']).rename(columns={
+        'name': column, 'count': 'Count', 'percentage': '%', 'max_error': 'Max over-count'
+    }), hide_index=True, use_container_width=True)
+    if breakdown['exact']:
+        st.caption(f"Exact counts · {breakdown['missing']:,} of {breakdown['total']:,} rows empty")
+    else:
+        st.caption(
+            f"Space-Saving estimate ({TOP_K_CAPACITY} counters): each count is at most its 'Max over-count' above the truth; "
+            f"untracked values have at most {breakdown['max_error']:,} rows · {breakdown['missing']:,} empty"
+        )
+    return breakdown
+
+
 def analyze_top_industries(companies_df, top_n=3):
     """Analyse les top industries"""
     if companies_df is None or companies_df.empty:
         return {'top_industries': [], 'total_companies': 0}
-    
-    industry_col = None
-    for col in ['industry', 'sector', 'vertical', 'hs_industry']:
-        if col in companies_df.columns:
-            industry_col = col
-            break
-    
+
+    industry_col = breakdown_column(companies_df, CATEGORY_BREAKDOWNS['Industry'][1])
     if not industry_col:
         return {'top_industries': [], 'total_companies': len(companies_df), 'no_industry_column': True}
-    
-    industry_counts = companies_df[industry_col].value_counts().head(top_n)
-    total = len(companies_df)
-    
-    top_industries = []
-    for industry, count in industry_counts.items():
-        if pd.notna(industry):
-            percentage = round(count / total * 100, 1)
-            top_industries.append({
-                'name': str(industry),
-                'count': int(count),
-                'percentage': percentage
-            })
-    
+
+    top_values = analyze_top_values(companies_df, industry_col, top_n)
     return {
-        'top_industries': top_industries,
-        'total_companies': total
+        'top_industries': top_values['top_values'],
+        'total_companies': top_values['total']
     }
 
 
@@ -978,24 +3562,433 @@ def create_powerbi_chart(fig, title):
     return fig
 
 
-def plotly_fig_to_base64(fig, width=600, height=400):
-    """Convert plotly figure to base64 for PDF embedding (requires kaleido)"""
+def build_score_comparison_chart(pre_scores, post_score):
+    """Pre vs post aggregation health score bar chart"""
+    pre_values = [pre_scores[key][0] for key in ['contacts', 'companies', 'tickets']]
+    avg_pre_score = sum(pre_values) / len(pre_values)
+
+    comparison_data = pd.DataFrame({
+        'Stage': ['Pre-Aggregation (Avg)', 'Post-Aggregation'],
+        'Score': [avg_pre_score, post_score]
+    })
+
+    fig = px.bar(
+        comparison_data,
+        x='Stage',
+        y='Score',
+        title='Health Score Comparison',
+        color='Score',
+        color_continuous_scale=['#8B0000', '#CD7F32', '#DAA520'],
+        text='Score'
+    )
+    fig.update_traces(texttemplate='%{text:.1f}', textposition='outside')
+    return create_powerbi_chart(fig, 'Health Score Comparison')
+
+
+def build_records_chart(results):
+    """Record counts per object type"""
+    records_data = pd.DataFrame({
+        'Type': ['Contacts', 'Companies', 'Tickets'],
+        'Count': [results['total_contacts'], results['total_companies'], results['total_tickets']]
+    })
+
+    fig = px.bar(
+        records_data,
+        x='Type',
+        y='Count',
+        title='Records by Type',
+        color='Count',
+        color_continuous_scale=['#DAA520', '#CD7F32', '#8B4513'],
+        text='Count'
+    )
+    fig.update_traces(texttemplate='%{text:,}', textposition='outside')
+    return create_powerbi_chart(fig, 'Records by Type')
+
+
+def build_missing_data_chart(results):
+    """Missing values share per object type"""
+    missing_data = pd.DataFrame({
+        'Type': list(results['missing_data'].keys()),
+        'Missing Values': list(results['missing_data'].values())
+    })
+
+    fig = px.pie(
+        missing_data,
+        values='Missing Values',
+        names='Type',
+        title='Missing Data Distribution',
+        color_discrete_sequence=['#CD7F32', '#B8860B', '#DAA520']
+    )
+    return create_powerbi_chart(fig, 'Missing Data Distribution')
+
+
+def build_duplicates_chart(results):
+    """Duplicate counts per object type"""
+    dup_data = pd.DataFrame({
+        'Type': list(results['duplicates'].keys()),
+        'Duplicates': list(results['duplicates'].values())
+    })
+
+    fig = px.bar(
+        dup_data,
+        x='Type',
+        y='Duplicates',
+        title='Duplicates by Type',
+        color='Duplicates',
+        color_continuous_scale=['#DAA520', '#CD7F32', '#8B0000'],
+        text='Duplicates'
+    )
+    fig.update_traces(texttemplate='%{text:,}', textposition='outside')
+    return create_powerbi_chart(fig, 'Duplicates by Type')
+
+
+def build_top_values_chart(top_values, label='Values', axis_title='Value'):
+    """Share of the most frequent values of a categorical column"""
+    values_data = pd.DataFrame(top_values)
+
+    fig = px.bar(
+        values_data,
+        x='name',
+        y='percentage',
+        title=f"Top {len(values_data)} {label}",
+        text='percentage',
+        color='percentage',
+        color_continuous_scale=['#DAA520', '#CD7F32', '#8B4513']
+    )
+    fig.update_traces(texttemplate='%{text:.1f}%', textposition='outside')
+    fig.update_xaxes(title=axis_title)
+    fig.update_yaxes(title='Percentage (%)')
+    return create_powerbi_chart(fig, f"Top {len(values_data)} {label} Distribution")
+
+
+def build_delta_columns_chart(delta, top_n=20):
+    """Columns with the most modified records between two exports"""
+    changes = delta['column_changes'].head(top_n)
+    fig = px.bar(
+        changes,
+        x='Modified records',
+        y='Column',
+        orientation='h',
+        text='Modified records',
+        color='Modified records',
+        color_continuous_scale=['#DAA520', '#CD7F32', '#8B4513']
+    )
+    fig.update_traces(texttemplate='%{text:,}', textposition='outside')
+    fig.update_yaxes(autorange='reversed', title='')
+    return create_powerbi_chart(fig, 'Changed Columns (Modified Records)')
+
+
+def build_top_industries_chart(industries):
+    """Top industries share among companies"""
+    return build_top_values_chart(industries['top_industries'], 'Industries', 'Industry')
+
+
+def build_resolution_histogram_chart(resolution_stats):
+    """Resolution time histogram with p50/p90/p99 markers"""
+    edges = resolution_stats['histogram']['edges']
+    histogram_data = pd.DataFrame({
+        'Resolution Time': [f"{low:.0f}-{high:.0f}h" for low, high in zip(edges[:-1], edges[1:])],
+        'Tickets': resolution_stats['histogram']['counts']
+    })
+
+    fig = px.bar(
+        histogram_data,
+        x='Resolution Time',
+        y='Tickets',
+        title='Resolution Time Distribution',
+        color='Tickets',
+        color_continuous_scale=['#DAA520', '#CD7F32', '#8B4513'],
+        text='Tickets'
+    )
+    fig.update_traces(texttemplate='%{text:,}', textposition='outside')
+    fig.update_xaxes(title=(
+        f"Hours (p50 {resolution_stats['p50']:.1f}h · p90 {resolution_stats['p90']:.1f}h · "
+        f"p99 {resolution_stats['p99']:.1f}h)"
+    ))
+    return create_powerbi_chart(fig, 'Resolution Time Distribution')
+
+
+def build_row_quality_chart(row_quality, label):
+    """Distribution of row-level quality scores"""
+    edges, counts = row_quality.histogram()
+    histogram_data = pd.DataFrame({
+        'Quality Score': [f"{low:.0f}-{high:.0f}" for low, high in zip(edges[:-1], edges[1:])],
+        'Records': counts
+    })
+
+    fig = px.bar(
+        histogram_data,
+        x='Quality Score',
+        y='Records',
+        title=f'{label} Row Quality Distribution',
+        color='Records',
+        color_continuous_scale=['#DAA520', '#CD7F32', '#8B4513'],
+        text='Records'
+    )
+    fig.update_traces(texttemplate='%{text:,}', textposition='outside')
+    fig.update_xaxes(title=f"Score per record (dataset score {row_quality.score:.1f})")
+    return create_powerbi_chart(fig, f'{label} Row Quality Distribution')
+
+
+def build_ticket_trend_chart(trends):
+    """Opened/closed volume bars with the backlog line and anomalous periods marked"""
+    periods = trends['periods']
+    fig = make_subplots(specs=[[{'secondary_y': True}]])
+    fig.add_trace(go.Bar(x=periods, y=trends['opened'], name='Opened', marker_color='#CD7F32'), secondary_y=False)
+    fig.add_trace(go.Bar(x=periods, y=trends['closed'], name='Closed', marker_color='#DAA520'), secondary_y=False)
+    fig.add_trace(go.Scatter(
+        x=periods, y=trends['backlog'], name='Backlog', mode='lines',
+        line={'color': '#8B4513', 'width': 3}
+    ), secondary_y=True)
+
+    if trends['anomalies']:
+        fig.add_trace(go.Scatter(
+            x=[anomaly['period'] for anomaly in trends['anomalies']],
+            y=[anomaly['opened'] for anomaly in trends['anomalies']],
+            name='Anomaly', mode='markers',
+            marker={'color': '#FF3B30', 'size': 12, 'symbol': 'diamond'}
+        ), secondary_y=False)
+
+    fig.update_layout(barmode='group')
+    fig = create_powerbi_chart(fig, 'Ticket Volume & Backlog Trend')
+    fig.update_yaxes(title_text='Tickets', secondary_y=False)
+    fig.update_yaxes(title_text='Open backlog', secondary_y=True, showgrid=False)
+    return fig
+
+
+def build_history_trend_chart(trend, label):
+    """One metric across the stored audit runs of a portal"""
+    fig = go.Figure(go.Scatter(
+        x=trend['created_at'], y=trend['value'], name=label, mode='lines+markers',
+        line={'color': '#CD7F32', 'width': 3},
+        marker={'color': '#8B4513', 'size': 9},
+        hovertemplate='%{x|%Y-%m-%d %H:%M}<br>%{y:,.1f}<extra></extra>'
+    ))
+    fig = create_powerbi_chart(fig, f'{label} Across Audits')
+    fig.update_xaxes(title_text='Audit date')
+    fig.update_yaxes(title_text=label)
+    return fig
+
+
+def build_cohort_heatmap_chart(cohorts):
+    """Cohort x months-since-creation heatmap of the share of contacts still active"""
+    fig = go.Figure(go.Heatmap(
+        z=cohorts['retention'],
+        x=[f"M{offset}" for offset in cohorts['offsets']],
+        y=[f"{month} ({size:,})" for month, size in zip(cohorts['cohorts'], cohorts['sizes'])],
+        colorscale=[[0, '#FFF8E7'], [0.5, '#DAA520'], [1, '#8B4513']],
+        zmin=0,
+        zmax=100,
+        colorbar={'title': '% active'},
+        hovertemplate='Cohort %{y}<br>%{x}: %{z:.1f}% active<extra></extra>'
+    ))
+    fig = create_powerbi_chart(fig, 'Contact Cohorts: Share Still Active by Months Since Creation')
+    fig.update_yaxes(autorange='reversed', title_text='Creation month (contacts)')
+    fig.update_xaxes(title_text='Months since creation')
+    return fig
+
+
+def build_report_charts(audit_results, pre_scores=None, post_score=None, top_industries=None,
+                        tickets_performance=None, ticket_trends=None, contact_cohorts=None):
+    """Dashboard charts to embed in reports, keyed by caption"""
+    charts = {}
+    if pre_scores and post_score is not None:
+        charts['Health Score Comparison'] = build_score_comparison_chart(pre_scores, post_score)
+    charts['Records by Type'] = build_records_chart(audit_results)
+    if audit_results['missing_data']:
+        charts['Missing Data Distribution'] = build_missing_data_chart(audit_results)
+    if audit_results['duplicates']:
+        charts['Duplicates by Type'] = build_duplicates_chart(audit_results)
+    if top_industries and top_industries.get('top_industries'):
+        charts['Top Industries'] = build_top_industries_chart(top_industries)
+    resolution_stats = (tickets_performance or {}).get('resolution_stats')
+    if resolution_stats and resolution_stats.get('count'):
+        charts['Resolution Time Distribution'] = build_resolution_histogram_chart(resolution_stats)
+    if ticket_trends and len(ticket_trends['periods']):
+        charts['Ticket Volume & Backlog Trend'] = build_ticket_trend_chart(ticket_trends)
+    if contact_cohorts and len(contact_cohorts['cohorts']):
+        charts['Contact Cohorts'] = build_cohort_heatmap_chart(contact_cohorts)
+    return charts
+
+
+def figure_fingerprint(fig, width, height):
+    """Hash of a figure's full JSON spec and output size"""
+    spec = f"{fig.to_json()}|{width}x{height}"
+    return hashlib.blake2b(spec.encode(), digest_size=16).hexdigest()
+
+
+@st.cache_resource
+def chart_rendering_error():
+    """Why figures cannot be rendered to PNG on this server (None when they can), probed once per process"""
     try:
         import plotly.io as pio
-        img_bytes = fig.to_image(format="png", width=width, height=height)
-        return base64.b64encode(img_bytes).decode()
-    except ImportError:
-        return None
+        pio.to_image({'data': [], 'layout': {}}, format='png', width=10, height=10)
     except Exception as e:
-        return None
+        return next((line.strip() for line in str(e).splitlines() if line.strip()), type(e).__name__)
+    return None
+
+
+def rasterize_figures(figures, width=600, height=400):
+    """Render figures to PNG once per spec (requires kaleido), in parallel worker processes"""
+    if chart_rendering_error():
+        return {}
+    import plotly.io as pio
+
+    cache = get_shared_cache()
+    images = {}
+    pending = {}
+    for name, fig in figures.items():
+        key = ('chart_png', figure_fingerprint(fig, width, height))
+        png = cache.get(key)
+        if png is not None:
+            images[name] = png
+        else:
+            pending[name] = (key, fig.to_plotly_json())
+
+    if not pending:
+        return images
+
+    rendered = {}
+    try:
+        # Spawned workers only import plotly/kaleido, never the Streamlit script
+        with ProcessPoolExecutor(
+            max_workers=min(len(pending), os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context('spawn')
+        ) as pool:
+            futures = {
+                name: pool.submit(pio.to_image, spec, format='png', width=width, height=height)
+                for name, (_, spec) in pending.items()
+            }
+            for name, future in futures.items():
+                try:
+                    rendered[name] = future.result()
+                except Exception:
+                    pass
+    except Exception:
+        # No process pool available: render in this process instead
+        for name, (_, spec) in pending.items():
+            try:
+                rendered[name] = pio.to_image(spec, format='png', width=width, height=height)
+            except Exception:
+                pass
+
+    for name, png in rendered.items():
+        cache.put(pending[name][0], png)
+        images[name] = png
+
+    return images
+
+
+# ==================== REPORT APPENDICES ====================
+APPENDIX_CHUNK_ROWS = 1000  # Rows per LongTable: keeps table splitting cheap on huge appendices
+APPENDIX_CELL_CHARS = 40
+
+
+def appendix_columns(df, preferred, limit=5):
+    """Columns to list in an appendix, preferred names first"""
+    cols = [col for key in preferred for col in df.columns if col.lower() == key]
+    return cols[:limit] if cols else list(df.columns[:limit])
+
+
+def build_report_appendices(contacts_df, companies_df, tickets_df, hours_threshold=48):
+    """Per-record listings behind the audit findings, keyed by appendix title"""
+    appendices = {}
+    contact_cols = ['id', 'contact_id', 'email', 'firstname', 'first_name', 'lastname', 'last_name', 'company', 'company_id']
+
+    if contacts_df is not None and not contacts_df.empty:
+        clusters = duplicate_email_clusters(contacts_df)
+        if clusters is not None:
+            positions, cluster = clusters
+            dups = contacts_df[appendix_columns(contacts_df, contact_cols)].iloc[positions]
+            dups.insert(0, 'cluster', cluster)
+            appendices['Duplicate Contact Clusters'] = dups
+
+        orphan_mask = orphan_contact_mask(contacts_df)
+        if orphan_mask is not None and orphan_mask.any():
+            appendices['Orphan Contacts'] = contacts_df.loc[orphan_mask, appendix_columns(contacts_df, contact_cols)]
+
+    if companies_df is not None and not companies_df.empty and contacts_df is not None and not contacts_df.empty:
+        ghost_mask = ghost_company_mask(companies_df, contacts_df)
+        if ghost_mask is not None and ghost_mask.any():
+            company_cols = ['id', 'company_id', 'name', 'company_name', 'domain', 'website', 'industry']
+            appendices['Ghost Companies'] = companies_df.loc[ghost_mask, appendix_columns(companies_df, company_cols)]
+
+    if tickets_df is not None and not tickets_df.empty:
+        masks = critical_ticket_masks(tickets_df, hours_threshold)
+        if masks is not None and masks[1].any():
+            ticket_cols = ['id', 'ticket_id', 'subject', 'status', 'priority', 'created_date', 'createdate', 'created_at', 'contact_id']
+            appendices[f"Critical Tickets (open >{hours_threshold}h)"] = tickets_df.loc[masks[1], appendix_columns(tickets_df, ticket_cols, limit=6)]
+
+    return appendices
+
+
+def appendix_flowables(appendices, heading_style, available_width, progress=None):
+    """Yield appendix headings and paginated LongTable chunks one at a time"""
+    total_rows = sum(len(df) for df in appendices.values())
+    done_rows = 0
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#CD7F32')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#CD7F32')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige]),
+        ('TOPPADDING', (0, 0), (-1, -1), 1),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 1)
+    ])
+
+    for title, df in appendices.items():
+        yield PageBreak()
+        yield Paragraph(f"Appendix: {title} ({len(df):,} records)", heading_style)
+
+        header = [str(col)[:APPENDIX_CELL_CHARS] for col in df.columns]
+        col_widths = [available_width / len(header)] * len(header)
+
+        for start in range(0, len(df), APPENDIX_CHUNK_ROWS):
+            chunk = df.iloc[start:start + APPENDIX_CHUNK_ROWS]
+            cells = [chunk[col].astype(str).where(chunk[col].notna(), '').str.slice(0, APPENDIX_CELL_CHARS) for col in chunk.columns]
+            rows = [header] + [list(row) for row in zip(*cells)]
+
+            # Fixed row heights spare reportlab from measuring every cell; header repeats on each page
+            yield LongTable(rows, colWidths=col_widths, rowHeights=11, repeatRows=1, style=table_style)
+
+            done_rows += len(chunk)
+            if progress:
+                progress(done_rows / total_rows, f"Appendix {title}: {done_rows:,}/{total_rows:,} rows")
+
+
+class StreamingStory(list):
+    """Story list that pulls flowables from a generator as the document build consumes it
+
+    Relies on BaseDocTemplate.build looping on `while len(flowables)` and popping from the front
+    (reportlab 4.x-5.x, pinned in requirements.txt).
+    """
+
+    def __init__(self, flowables, pending):
+        super().__init__(flowables)
+        self._pending = iter(pending)
+
+    def __len__(self):
+        # reportlab loops on len(story) and pops from the front: keep a couple of flowables buffered
+        while self._pending is not None and list.__len__(self) < 2:
+            flowable = next(self._pending, None)
+            if flowable is None:
+                self._pending = None
+            else:
+                self.append(flowable)
+        return list.__len__(self)
 
 
 def generate_pdf_report(audit_results, pre_scores, post_score, 
                        cold_analysis=None, churn_analysis=None, 
                        critical_tickets=None, email_analysis=None,
-                       orphan_analysis=None, ghost_companies=None):
-    """Generate comprehensive PDF report with V6 Advanced Metrics"""
-    buffer = io.BytesIO()
+                       orphan_analysis=None, ghost_companies=None, charts=None,
+                       appendices=None, progress=None, tickets_performance=None,
+                       ticket_trends=None, contact_cohorts=None, company_links=None,
+                       referential_integrity=None, category_breakdowns=None, phone_analysis=None):
+    """Generate comprehensive PDF report with V6 Advanced Metrics, dashboard charts and optional appendices"""
+    # Appendix reports can run to thousands of pages: write them to disk, the session only keeps the file handle
+    buffer = tempfile.TemporaryFile(suffix='.pdf') if appendices else io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     story = []
     styles = getSampleStyleSheet()
@@ -1027,27 +4020,171 @@ def generate_pdf_report(audit_results, pre_scores, post_score,
     # Executive Summary
     story.append(Paragraph("Executive Summary", heading_style))
 
-    summary_data = [
-        ['Metric', 'Value'],
-        ['Total Contacts', f"{audit_results['total_contacts']:,}"],
-        ['Total Companies', f"{audit_results['total_companies']:,}"],
-        ['Total Tickets', f"{audit_results['total_tickets']:,}"],
-        ['Post-Aggregation Score', f"{post_score:.1f}/100"]
-    ]
+    summary_data = [
+        ['Metric', 'Value'],
+        ['Total Contacts', f"{audit_results['total_contacts']:,}"],
+        ['Total Companies', f"{audit_results['total_companies']:,}"],
+        ['Total Tickets', f"{audit_results['total_tickets']:,}"],
+        ['Post-Aggregation Score', f"{post_score:.1f}/100"]
+    ]
+
+    summary_table = Table(summary_data, colWidths=[3*inch, 3*inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#CD7F32')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#CD7F32'))
+    ]))
+    story.append(summary_table)
+    story.append(Spacer(1, 0.3*inch))
+
+    # Dashboard charts (rendered once per figure spec, reused across reports)
+    chart_images = rasterize_figures(charts) if charts else {}
+    if charts and chart_rendering_error():
+        story.append(Paragraph(f"Charts omitted: chart rendering is unavailable on this server ({chart_rendering_error()}).", styles['Normal']))
+        story.append(Spacer(1, 0.2*inch))
+    if chart_images:
+        story.append(PageBreak())
+        story.append(Paragraph("Visual Overview", heading_style))
+        for caption in charts:
+            if caption in chart_images:
+                story.append(Image(io.BytesIO(chart_images[caption]), width=6*inch, height=4*inch))
+                story.append(Spacer(1, 0.2*inch))
+
+    # Resolution time distribution
+    resolution_stats = (tickets_performance or {}).get('resolution_stats')
+    if resolution_stats and resolution_stats.get('count'):
+        story.append(Paragraph("Ticket Resolution Time Distribution", heading_style))
+        resolution_data = [['Group', 'Resolved', 'Mean', 'p50', 'p90', 'p99']]
+        rows = [('All tickets', resolution_stats)] + [
+            (f"{dimension.capitalize()}: {group[dimension]}", group)
+            for dimension in ['priority', 'status']
+            for group in resolution_stats['breakdown'].get(dimension, [])[:8]
+        ]
+        for label, group in rows:
+            resolution_data.append([
+                label[:40], f"{group['count']:,}", f"{group['mean']:.1f}h",
+                f"{group['p50']:.1f}h", f"{group['p90']:.1f}h", f"{group['p99']:.1f}h"
+            ])
+        resolution_table = Table(resolution_data, colWidths=[2.2*inch] + [0.85*inch] * 5)
+        resolution_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#CD7F32')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#CD7F32')),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige])
+        ]))
+        story.append(resolution_table)
+        story.append(Spacer(1, 0.3*inch))
+
+    # Referential integrity
+    if referential_integrity and referential_integrity['checks']:
+        story.append(Paragraph("Referential Integrity", heading_style))
+        integrity_data = [['Check', 'Issues', 'Share']]
+        labels = {'contact_company': 'Contacts -> unknown company', 'ticket_contact': 'Tickets -> unknown contact'}
+        for name, check in referential_integrity['checks'].items():
+            integrity_data.append([labels[name], f"{check['dangling']:,}", f"{check['dangling_pct']:.1f}%"])
+        if 'ghost_companies' in referential_integrity:
+            ghosts = referential_integrity['ghost_companies']
+            integrity_data.append(['Companies without contacts', f"{ghosts['count']:,}", f"{ghosts['pct']:.1f}%"])
+        if 'contacts_without_tickets' in referential_integrity:
+            idle = referential_integrity['contacts_without_tickets']
+            integrity_data.append(['Contacts without tickets', f"{idle['count']:,}", f"{idle['pct']:.1f}%"])
+        integrity_table = Table(integrity_data, colWidths=[3*inch, 1.2*inch, 1.2*inch])
+        integrity_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#CD7F32')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#CD7F32')),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige])
+        ]))
+        story.append(integrity_table)
+        story.append(Spacer(1, 0.3*inch))
+
+    # Ticket volume trend
+    if ticket_trends and len(ticket_trends['periods']):
+        story.append(Paragraph("Ticket Volume & Backlog Trend", heading_style))
+        period_label = {'D': 'day', 'W': 'week', 'M': 'month'}[ticket_trends['freq']]
+        trend_data = [
+            ['Metric', 'Value'],
+            ['Periods analysed', f"{len(ticket_trends['periods']):,} ({period_label}s)"],
+            ['Tickets opened', f"{ticket_trends['total_opened']:,}"],
+            ['Tickets closed', f"{ticket_trends['total_closed']:,}"],
+            ['Current backlog', f"{ticket_trends['current_backlog']:,}"],
+            ['Peak backlog', f"{ticket_trends['peak_backlog']:,}"],
+            ['Anomalous periods', f"{len(ticket_trends['anomalies']):,}"]
+        ]
+        for anomaly in ticket_trends['anomalies'][-5:]:
+            trend_data.append([
+                f"  {period_label.capitalize()} of {anomaly['period']:%Y-%m-%d}",
+                f"{anomaly['opened']:,} opened ({anomaly['direction']}, z={anomaly['zscore']:+.1f})"
+            ])
+        trend_table = Table(trend_data, colWidths=[2.5*inch, 3*inch])
+        trend_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#CD7F32')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#CD7F32')),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige])
+        ]))
+        story.append(trend_table)
+        story.append(Spacer(1, 0.3*inch))
+
+    # Contact cohorts
+    if contact_cohorts and len(contact_cohorts['cohorts']):
+        story.append(Paragraph("Contact Cohorts (share still active)", heading_style))
+        cohort_offsets = [offset for offset in [0, 1, 3, 6, 12] if offset < len(contact_cohorts['offsets'])]
+        cohort_data = [['Created', 'Contacts'] + [f"Month {offset}" for offset in cohort_offsets]]
+        for month, size, row in list(zip(contact_cohorts['cohorts'], contact_cohorts['sizes'], contact_cohorts['retention']))[-12:]:
+            cohort_data.append([month, f"{size:,}"] + [
+                '-' if np.isnan(row[offset]) else f"{row[offset]:.0f}%" for offset in cohort_offsets
+            ])
+        cohort_table = Table(cohort_data)
+        cohort_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#CD7F32')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#CD7F32')),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige])
+        ]))
+        story.append(cohort_table)
+        story.append(Spacer(1, 0.3*inch))
 
-    summary_table = Table(summary_data, colWidths=[3*inch, 3*inch])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#CD7F32')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#CD7F32'))
-    ]))
-    story.append(summary_table)
-    story.append(Spacer(1, 0.3*inch))
+    # Categorical breakdowns
+    if category_breakdowns:
+        story.append(Paragraph("Categorical Breakdowns", heading_style))
+        breakdown_data = [['Breakdown', 'Value', 'Count', 'Share']]
+        for label, breakdown in category_breakdowns.items():
+            for rank, value in enumerate(breakdown['top_values'][:5]):
+                breakdown_data.append([
+                    f"{label} ({breakdown['column']})" if rank == 0 else '',
+                    value['name'][:40],
+                    f"{value['count']:,}" if not value['max_error'] else f"{value['count']:,} (±{value['max_error']:,})",
+                    f"{value['percentage']}%"
+                ])
+        breakdown_table = Table(breakdown_data, colWidths=[2*inch, 2.2*inch, 1.3*inch, 0.8*inch])
+        breakdown_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#CD7F32')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#CD7F32')),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige])
+        ]))
+        story.append(breakdown_table)
+        story.append(Spacer(1, 0.3*inch))
 
     # Advanced Metrics Analysis (V6)
     if any([cold_analysis, churn_analysis, critical_tickets, email_analysis, orphan_analysis, ghost_companies]):
@@ -1060,7 +4197,7 @@ def generate_pdf_report(audit_results, pre_scores, post_score,
         if cold_analysis and cold_analysis.get('cold_count', 0) > 0:
             status = '⚠️ Action Required' if cold_analysis['cold_pct'] > 30 else '✓ Acceptable'
             advanced_data.append([
-                'Cold Contacts (>90d)',
+                f"Cold Contacts (>{cold_analysis.get('threshold_days', 90)}d)",
                 f"{cold_analysis['cold_pct']:.1f}% ({cold_analysis['cold_count']:,})",
                 status,
                 'Re-engagement needed'
@@ -1074,6 +4211,15 @@ def generate_pdf_report(audit_results, pre_scores, post_score,
                 status,
                 f"{email_analysis['b2c_pct']:.1f}% B2C emails"
             ])
+
+        if phone_analysis and phone_analysis.get('filled', 0) > 0:
+            status = '✓ Good' if phone_analysis['valid_pct'] > 90 else '⚠️ Needs Review'
+            advanced_data.append([
+                'Phone Validity',
+                f"{phone_analysis['valid_pct']:.1f}% valid",
+                status,
+                f"{phone_analysis['placeholder']:,} placeholders, {phone_analysis['duplicate_count']:,} duplicates"
+            ])
         
         if churn_analysis and churn_analysis.get('at_risk_count', 0) > 0:
             arr_text = f"${churn_analysis['arr_at_risk']:,.0f} ARR" if churn_analysis.get('arr_at_risk') else 'N/A'
@@ -1085,12 +4231,12 @@ def generate_pdf_report(audit_results, pre_scores, post_score,
             ])
         
         if critical_tickets and critical_tickets.get('critical_count', 0) > 0:
-            avg_text = f"{critical_tickets['avg_resolution']:.1f}h avg" if critical_tickets.get('avg_resolution') else 'N/A'
+            median_text = f"{critical_tickets['median_resolution']:.1f}h median" if critical_tickets.get('median_resolution') else 'N/A'
             advanced_data.append([
-                'Critical Tickets (>48h)',
+                f"Critical Tickets (>{critical_tickets.get('threshold_hours', 48)}h)",
                 f"{critical_tickets['critical_count']} open",
                 '⚠️ Urgent',
-                avg_text
+                median_text
             ])
         
         if orphan_analysis and orphan_analysis.get('orphan_count', 0) > 0:
@@ -1100,6 +4246,13 @@ def generate_pdf_report(audit_results, pre_scores, post_score,
                 '⚠️ Data Quality',
                 'No company association'
             ])
+            if company_links and company_links.get('linked_count'):
+                advanced_data.append([
+                    'Orphans After Domain Linking',
+                    f"{company_links['orphan_pct_after']:.1f}% ({company_links['orphan_after']:,})",
+                    '✅ Quick Win',
+                    f"{company_links['linked_count']:,} matched by email domain"
+                ])
         
         if ghost_companies and ghost_companies.get('ghost_count', 0) > 0:
             advanced_data.append([
@@ -1108,6 +4261,13 @@ def generate_pdf_report(audit_results, pre_scores, post_score,
                 '⚠️ Cleanup Needed',
                 'No contacts linked'
             ])
+            if company_links and company_links.get('ghost_after') is not None and company_links.get('linked_count'):
+                advanced_data.append([
+                    'Ghosts After Domain Linking',
+                    f"{company_links['ghost_pct_after']:.1f}% ({company_links['ghost_after']:,})",
+                    '✅ Quick Win',
+                    'Orphans linked by email domain'
+                ])
         
         advanced_table = Table(advanced_data, colWidths=[2*inch, 1.5*inch, 1.5*inch, 1.5*inch])
         advanced_table.setStyle(TableStyle([
@@ -1140,9 +4300,20 @@ def generate_pdf_report(audit_results, pre_scores, post_score,
         
         if email_analysis and email_analysis.get('b2c_pct', 0) > 20:
             actions.append(f"Audit {email_analysis['b2c_pct']:.1f}% B2C emails (may need company emails)")
+
+        if phone_analysis and phone_analysis.get('filled', 0) and phone_analysis['valid_pct'] < 90:
+            actions.append(
+                f"Normalize phone numbers to E.164 ({phone_analysis['invalid'] + phone_analysis['placeholder']:,} invalid or placeholder)"
+            )
         
         if orphan_analysis and orphan_analysis.get('orphan_count', 0) > 0:
-            actions.append(f"Link {orphan_analysis['orphan_count']:,} orphan contacts to companies")
+            if company_links and company_links.get('linked_count'):
+                actions.append(
+                    f"Link {orphan_analysis['orphan_count']:,} orphan contacts to companies "
+                    f"({company_links['linked_count']:,} can be matched automatically by email domain)"
+                )
+            else:
+                actions.append(f"Link {orphan_analysis['orphan_count']:,} orphan contacts to companies")
         
         for action in actions:
             story.append(Paragraph(action, styles['Normal']))
@@ -1170,7 +4341,13 @@ def generate_pdf_report(audit_results, pre_scores, post_score,
     )
     story.append(Paragraph("CRM Data Quality Analysis Report by Stephanie Jupiter Jacca from WBSE", footer_style))
 
+    # Appendices are generated chunk by chunk while the document is being laid out
+    if appendices:
+        story = StreamingStory(story, appendix_flowables(appendices, heading_style, doc.width, progress))
+
     doc.build(story)
+    if progress:
+        progress(1.0, "PDF report ready")
     buffer.seek(0)
     return buffer
 
@@ -1178,10 +4355,9 @@ def generate_pdf_report(audit_results, pre_scores, post_score,
 
 # Jupiter CRM Audit V6-TEST
 
-def generate_recommendations_document(audit_results, pre_scores, post_score,
-                                     cold_analysis=None, churn_analysis=None,
-                                     email_analysis=None, critical_tickets=None):
-    """Generate detailed recommendations document (DOCX) saved to Desktop"""
+@st.cache_resource
+def get_docx_template():
+    """Styled blank DOCX, built once per process and cloned for every document"""
     doc = Document()
 
     # Set document styling
@@ -1190,11 +4366,22 @@ def generate_recommendations_document(audit_results, pre_scores, post_score,
     font.name = 'Calibri'
     font.size = Pt(11)
 
+    doc.styles['Title'].font.color.rgb = RGBColor(205, 127, 50)
+
+    template = io.BytesIO()
+    doc.save(template)
+    return template.getvalue()
+
+
+def generate_recommendations_document(audit_results, pre_scores, post_score,
+                                     cold_analysis=None, churn_analysis=None,
+                                     email_analysis=None, critical_tickets=None):
+    """Generate detailed recommendations document (DOCX) into an in-memory buffer"""
+    doc = Document(io.BytesIO(get_docx_template()))
+
     # Title
     title = doc.add_heading('Jupiter CRM Audit - Strategic Recommendations & Consulting Guide', 0)
     title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    title_run = title.runs[0]
-    title_run.font.color.rgb = RGBColor(205, 127, 50)
 
     # Metadata
     doc.add_paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -1246,9 +4433,9 @@ def generate_recommendations_document(audit_results, pre_scores, post_score,
                 f"{critical_tickets['critical_count']} critical tickets have been open for more than "
                 f"{critical_tickets.get('threshold_hours', 48)} hours. "
             )
-            if critical_tickets.get('avg_resolution', 0) > 0:
+            if critical_tickets.get('median_resolution', 0) > 0:
                 doc.add_paragraph(
-                    f"Average resolution time: {critical_tickets['avg_resolution']:.1f} hours.",
+                    f"Median resolution time: {critical_tickets['median_resolution']:.1f} hours.",
                     style='List Bullet'
                 )
 
@@ -1297,18 +4484,363 @@ def generate_recommendations_document(audit_results, pre_scores, post_score,
     footer.add_run(f'Portfolio: https://stephaniejj.github.io/#home').italic = True
     footer.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
-    # Save to Desktop
-    desktop_path = os.path.join(os.path.expanduser('~'), 'Desktop')
-    filename = f'Jupiter_CRM_Recommendations_{datetime.now().strftime("%Y%m%d_%H%M%S")}.docx'
-    filepath = os.path.join(desktop_path, filename)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def recommendations_document_bytes(audit_results, pre_scores, post_score,
+                                   cold_analysis=None, churn_analysis=None,
+                                   email_analysis=None, critical_tickets=None):
+    """Recommendations DOCX, generated once per distinct set of audit results"""
+    inputs = [audit_results, pre_scores, post_score, cold_analysis, churn_analysis, email_analysis, critical_tickets]
+    return cached_result(
+        'recommendations_docx',
+        [result_fingerprint(inputs)],
+        lambda: generate_recommendations_document(*inputs).getvalue()
+    )
 
-    try:
-        doc.save(filepath)
-        return filepath, True
-    except Exception as e:
-        return str(e), False
 
 
+# ==================== EXCEL EXPORT ====================
+EXCEL_MAX_ROWS = 1_048_576  # Hard row limit of an Excel worksheet (header included)
+EXCEL_CHUNK_ROWS = 50_000
+
+
+def build_export_findings(contacts_df, companies_df, aggregated_df=None, churn_analysis=None):
+    """Row-level findings to hand to the client, keyed by sheet name"""
+    findings = {}
+
+    if aggregated_df is not None and not aggregated_df.empty:
+        findings['Aggregated Data'] = aggregated_df
+
+    if contacts_df is not None and not contacts_df.empty:
+        if churn_analysis and churn_analysis.get('scores') is not None and len(churn_analysis['scores']) == len(contacts_df):
+            scores = churn_analysis['scores']
+            at_risk = scores >= churn_analysis.get('threshold', CHURN_AT_RISK_THRESHOLD)
+            if at_risk.any():
+                findings['At-Risk Contacts'] = contacts_df[at_risk].assign(churn_risk_score=scores[at_risk])
+
+        clusters = duplicate_email_clusters(contacts_df)
+        if clusters is not None:
+            positions, cluster = clusters
+            findings['Duplicate Clusters'] = contacts_df.iloc[positions].assign(duplicate_cluster=cluster)
+
+        invalid_mask = invalid_email_mask(contacts_df)
+        if invalid_mask is not None and invalid_mask.any():
+            findings['Invalid Emails'] = contacts_df[invalid_mask]
+
+        if companies_df is not None and not companies_df.empty:
+            ghost_mask = ghost_company_mask(companies_df, contacts_df)
+            if ghost_mask is not None and ghost_mask.any():
+                findings['Ghost Companies'] = companies_df[ghost_mask]
+
+    return findings
+
+
+def excel_sheet_title(name, part=None):
+    """Valid worksheet title (31 chars max, no []:*?/\\), numbered when a finding spans several sheets"""
+    title = ''.join('_' if ch in '[]:*?/\\' else ch for ch in str(name))
+    if part is None:
+        return title[:31]
+    suffix = f" ({part})"
+    return title[:31 - len(suffix)] + suffix
+
+
+def excel_rows(chunk):
+    """Worksheet-ready rows for a frame chunk: NaN/NaT as empty cells, illegal characters stripped"""
+    cells = {}
+    for col in chunk.columns:
+        values = chunk[col]
+        if isinstance(values.dtype, pd.DatetimeTZDtype):
+            values = values.dt.tz_localize(None)
+        if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+            values = values.astype(object).where(values.isna(), values.astype(str).str.replace(ILLEGAL_CHARACTERS_RE, '', regex=True))
+        cells[col] = values.astype(object).where(values.notna(), None)
+    return zip(*cells.values())
+
+
+def write_findings_workbook(findings, target, progress=None):
+    """Stream findings into an xlsx (openpyxl write-only mode), one sheet per finding, split at Excel's row limit"""
+    workbook = Workbook(write_only=True)
+    rows_per_sheet = EXCEL_MAX_ROWS - 1
+    total_rows = sum(len(df) for df in findings.values()) or 1
+    done_rows = 0
+
+    for name, df in findings.items():
+        n_parts = max(1, math.ceil(len(df) / rows_per_sheet))
+        for part in range(n_parts):
+            sheet = workbook.create_sheet(title=excel_sheet_title(name, part + 1 if n_parts > 1 else None))
+            sheet.append([str(col) for col in df.columns])
+
+            stop = min((part + 1) * rows_per_sheet, len(df))
+            for start in range(part * rows_per_sheet, stop, EXCEL_CHUNK_ROWS):
+                chunk = df.iloc[start:min(start + EXCEL_CHUNK_ROWS, stop)]
+                for row in excel_rows(chunk):
+                    sheet.append(row)
+                done_rows += len(chunk)
+                if progress:
+                    progress(done_rows / total_rows, f"{name}: {done_rows:,}/{total_rows:,} rows written")
+
+    if not findings:
+        workbook.create_sheet(title='No Findings').append(['No row-level findings for this audit'])
+
+    workbook.save(target)
+    return target
+
+
+# ==================== CLEANED DATA EXPORT ====================
+CLEAN_EXPORT_CHUNK_ROWS = 100_000
+CLEAN_EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet')
+}
+
+
+def cleaned_export_formats():
+    """Export formats available here (Parquet needs pyarrow)"""
+    return [fmt for fmt in CLEAN_EXPORT_FORMATS if fmt != 'Parquet' or pq is not None]
+
+
+def clean_export_chunks(df, name=None, contacts_df=None, default_country=PHONE_DEFAULT_COUNTRY, chunk_rows=CLEAN_EXPORT_CHUNK_ROWS):
+    """Cleaned frame chunk by chunk: exact duplicates dropped, emails/phones normalized, problem rows flagged"""
+    df = user_columns(df)
+    # Whole-frame masks are computed once; only one chunk of rows is ever copied at a time
+    keep = ~df.duplicated().to_numpy()
+    flags = {}
+
+    email_col = next((col for col in df.columns if 'email' in col.lower()), None)
+    if email_col:
+        emails = df[email_col].astype('string').str.strip().str.lower().replace('', pd.NA)
+        flags['flag_invalid_email'] = (emails.notna() & ~emails.str.match(EMAIL_PATTERN).fillna(False)).to_numpy()
+        kept_emails = emails.where(keep)
+        flags['flag_duplicate_email'] = (kept_emails.notna() & kept_emails.duplicated(keep=False)).to_numpy()
+
+    if name == 'contacts':
+        orphan_mask = orphan_contact_mask(df)
+        if orphan_mask is not None:
+            flags['flag_orphan'] = orphan_mask.to_numpy(dtype=bool)
+    elif name == 'companies' and contacts_df is not None and not contacts_df.empty:
+        ghost_mask = ghost_company_mask(df, contacts_df)
+        if ghost_mask is not None:
+            flags['flag_ghost_company'] = ghost_mask.to_numpy(dtype=bool)
+
+    phone_col = phone_column(df)
+    country_col = breakdown_column(df, CATEGORY_BREAKDOWNS['Country'][1]) if phone_col else None
+
+    for start in range(0, len(df), chunk_rows):
+        rows = start + np.flatnonzero(keep[start:start + chunk_rows])
+        if not len(rows):
+            continue
+        chunk = df.iloc[rows]
+        if email_col:
+            chunk[email_col] = emails.iloc[rows].to_numpy()
+        if phone_col:
+            phones = normalize_phone_numbers(
+                chunk[phone_col], chunk[country_col] if country_col else None, default_country
+            )
+            chunk['phone_e164'] = phones['phone_e164'].astype('string').to_numpy()
+            chunk['flag_invalid_phone'] = phones['phone_status'].isin(['invalid', 'placeholder']).to_numpy()
+        for flag, mask in flags.items():
+            chunk[flag] = mask[rows]
+        yield chunk
+
+
+def write_cleaned_export(df, target, fmt='CSV', name=None, contacts_df=None, default_country=PHONE_DEFAULT_COUNTRY, progress=None):
+    """Stream the cleaned frame into a CSV or Parquet file object and return what was done to it"""
+    if fmt not in cleaned_export_formats():
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    summary = {'rows': len(df), 'exported': 0, 'duplicates_removed': 0, 'flagged': {}}
+    writer = None
+    schema = None
+
+    for chunk in clean_export_chunks(df, name, contacts_df, default_country):
+        if fmt == 'Parquet':
+            # Object columns can infer a different Arrow type per chunk: pin them to strings
+            mixed = [col for col in chunk.columns if chunk[col].dtype == object]
+            if mixed:
+                chunk = chunk.astype({col: 'string' for col in mixed})
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = pq.ParquetWriter(target, schema)
+            writer.write_table(table)
+        else:
+            text = chunk.to_csv(index=False, header=summary['exported'] == 0)
+            target.write(text.encode('utf-8'))
+
+        summary['exported'] += len(chunk)
+        for flag in [col for col in chunk.columns if col.startswith('flag_')]:
+            summary['flagged'][flag] = summary['flagged'].get(flag, 0) + int(chunk[flag].sum())
+        if progress:
+            progress(summary['exported'] / max(len(df), 1), f"{summary['exported']:,} cleaned rows written")
+
+    if fmt == 'Parquet':
+        if writer is None:
+            writer = pq.ParquetWriter(target, pa.Schema.from_pandas(df.head(0), preserve_index=False))
+        writer.close()
+    elif summary['exported'] == 0:
+        target.write(df.head(0).to_csv(index=False).encode('utf-8'))
+    summary['duplicates_removed'] = summary['rows'] - summary['exported']
+    return summary
+
+
+# ==================== AUDIT HISTORY ====================
+AUDIT_HISTORY_PATH = os.environ.get('JUPITER_AUDIT_HISTORY', 'jupiter_audit_history.db')
+AUDIT_HISTORY_DEFAULT_PORTAL = 'Default Portal'
+AUDIT_HISTORY_DEFAULT_METRIC = 'health.post_aggregation'
+
+# audit_metrics holds one row per numeric leaf of a stored audit, clustered on (portal, metric, time):
+# a trend query is a single index range scan however many audits are stored
+AUDIT_HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audits (
+    id INTEGER PRIMARY KEY,
+    portal TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    fingerprints TEXT NOT NULL,
+    results TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS audits_portal_time ON audits (portal, created_at);
+CREATE TABLE IF NOT EXISTS audit_metrics (
+    portal TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    audit_id INTEGER NOT NULL REFERENCES audits (id),
+    value REAL,
+    PRIMARY KEY (portal, metric, created_at, audit_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS audit_metric_names (
+    portal TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    PRIMARY KEY (portal, metric)
+) WITHOUT ROWID;
+"""
+
+
+def history_payload(value):
+    """JSON-safe copy of analysis results: scalars, dicts and lists kept, row-level frames and arrays dropped"""
+    if isinstance(value, dict):
+        return {
+            str(key): history_payload(item) for key, item in value.items()
+            if not isinstance(item, (pd.DataFrame, pd.Series, np.ndarray))
+        }
+    if isinstance(value, (list, tuple)):
+        return [history_payload(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def history_metrics(payload, prefix=''):
+    """Numeric leaves of a stored payload keyed by dotted path (e.g. churn.at_risk_pct)"""
+    metrics = {}
+    for key, value in payload.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(history_metrics(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = float(value)
+    return metrics
+
+
+def history_metric_label(metric):
+    """Readable name of a dotted metric path"""
+    return ' › '.join(part.replace('_', ' ').title() for part in metric.split('.'))
+
+
+def history_time_bounds(start=None, end=None):
+    """ISO bounds of a [start, end] date range (open ends when None)"""
+    return (
+        pd.Timestamp(start).isoformat() if start is not None else '',
+        (pd.Timestamp(end) + pd.Timedelta(days=1)).isoformat() if end is not None else '9999'
+    )
+
+
+class AuditHistoryStore:
+    """SQLite store of past audits per portal: full result payloads plus an indexed table of their metrics"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(AUDIT_HISTORY_SCHEMA)
+
+    def record(self, portal, analyses, fingerprints, created_at=None):
+        """Store one audit run (dict of analysis name -> result dict) and return its id"""
+        created_at = (created_at or datetime.now()).isoformat(timespec='seconds')
+        payload = history_payload(analyses)
+        metrics = history_metrics(payload)
+        with self._lock, self._conn:
+            audit_id = self._conn.execute(
+                'INSERT INTO audits (portal, created_at, fingerprints, results) VALUES (?, ?, ?, ?)',
+                (portal, created_at, json.dumps(fingerprints, sort_keys=True), json.dumps(payload))
+            ).lastrowid
+            self._conn.executemany(
+                'INSERT INTO audit_metrics (portal, metric, created_at, audit_id, value) VALUES (?, ?, ?, ?, ?)',
+                [(portal, metric, created_at, audit_id, value) for metric, value in metrics.items()]
+            )
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO audit_metric_names (portal, metric) VALUES (?, ?)',
+                [(portal, metric) for metric in metrics]
+            )
+        return audit_id
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def portals(self):
+        """Portals with at least one stored audit"""
+        return [row[0] for row in self._query('SELECT DISTINCT portal FROM audits ORDER BY portal')]
+
+    def metric_names(self, portal):
+        """Metrics recorded for a portal"""
+        return [row[0] for row in self._query('SELECT metric FROM audit_metric_names WHERE portal = ? ORDER BY metric', (portal,))]
+
+    def trend(self, portal, metric, start=None, end=None):
+        """One metric of a portal's audits over a date range, oldest first"""
+        rows = self._query(
+            'SELECT created_at, audit_id, value FROM audit_metrics '
+            'WHERE portal = ? AND metric = ? AND created_at >= ? AND created_at < ? ORDER BY created_at, audit_id',
+            (portal, metric, *history_time_bounds(start, end))
+        )
+        trend = pd.DataFrame(rows, columns=['created_at', 'audit_id', 'value'])
+        trend['created_at'] = pd.to_datetime(trend['created_at'])
+        return trend
+
+    def audits(self, portal, start=None, end=None):
+        """Audit runs of a portal over a date range, newest first"""
+        rows = self._query(
+            'SELECT id, created_at, fingerprints FROM audits '
+            'WHERE portal = ? AND created_at >= ? AND created_at < ? ORDER BY created_at DESC, id DESC',
+            (portal, *history_time_bounds(start, end))
+        )
+        return pd.DataFrame(
+            [(audit_id, created_at, json.loads(fingerprints)) for audit_id, created_at, fingerprints in rows],
+            columns=['audit_id', 'created_at', 'fingerprints']
+        )
+
+    def load(self, audit_id):
+        """Stored result payload of one audit (None when unknown)"""
+        rows = self._query('SELECT results FROM audits WHERE id = ?', (audit_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+
+@st.cache_resource
+def get_audit_history():
+    """Single history store shared by every session of this server process"""
+    return AuditHistoryStore(AUDIT_HISTORY_PATH)
+
 
 # Jupiter CRM Audit V6-TEST  
 
@@ -1323,6 +4855,13 @@ with st.sidebar:
     st.markdown("---")
     st.title("📂 Upload CRM Exports")
 
+    st.text_input(
+        "🏷️ Portal / Client",
+        value=AUDIT_HISTORY_DEFAULT_PORTAL,
+        key='portal_name',
+        help="Each audit is saved to the history under this name, for the Trends tab"
+    )
+
     st.markdown("### Step 1: Upload Required Files")
 
     contacts_file = st.file_uploader(
@@ -1345,8 +4884,9 @@ with st.sidebar:
 
     # Load files into session state with DEMO mode handling
     if contacts_file:
-        df, total_rows, is_limited = load_data(contacts_file, 'contacts')
+        df, total_rows, is_limited, fingerprint = load_data(contacts_file, 'contacts')
         st.session_state.contacts_df = df
+        st.session_state.dataset_fingerprints['contacts'] = fingerprint
         
         if df is not None:
             if is_limited:
@@ -1355,8 +4895,9 @@ with st.sidebar:
             st.success(f"✅ Contacts: {len(df):,} rows loaded")
 
     if companies_file:
-        df, total_rows, is_limited = load_data(companies_file, 'companies')
+        df, total_rows, is_limited, fingerprint = load_data(companies_file, 'companies')
         st.session_state.companies_df = df
+        st.session_state.dataset_fingerprints['companies'] = fingerprint
         
         if df is not None:
             if is_limited:
@@ -1365,8 +4906,9 @@ with st.sidebar:
             st.success(f"✅ Companies: {len(df):,} rows loaded")
 
     if tickets_file:
-        df, total_rows, is_limited = load_data(tickets_file, 'tickets')
+        df, total_rows, is_limited, fingerprint = load_data(tickets_file, 'tickets')
         st.session_state.tickets_df = df
+        st.session_state.dataset_fingerprints['tickets'] = fingerprint
         
         if df is not None:
             if is_limited:
@@ -1374,6 +4916,67 @@ with st.sidebar:
                 st.info(f"📊 Analyzing first {MAX_ROWS_DEMO} rows (out of {total_rows:,})")
             st.success(f"✅ Tickets: {len(df):,} rows loaded")
 
+            # Canonical status model: each distinct status is mapped once, tickets get an int8 state
+            status_col = ticket_status_column(df)
+            if status_col:
+                with st.expander("🎫 Ticket status mapping"):
+                    st.caption("Map each status (or pipeline stage ID) of your portal to a canonical state.")
+                    edited = st.data_editor(
+                        TicketStatusModel().categories(df[status_col]),
+                        column_config={
+                            'state': st.column_config.SelectboxColumn('state', options=TICKET_STATES, required=True)
+                        },
+                        disabled=['status', 'tickets'],
+                        hide_index=True,
+                        key='ticket_status_editor'
+                    )
+                    st.session_state.ticket_status_mapping = dict(zip(edited['status'], edited['state']))
+                    unknown = edited.loc[edited['state'] == 'unknown', 'tickets'].sum()
+                    if unknown:
+                        st.warning(f"⚠️ {unknown:,} tickets have a status mapped to 'unknown'")
+
+                mapping = st.session_state.ticket_status_mapping
+                states = cached_result(
+                    'ticket_states', [fingerprint, result_fingerprint(mapping)],
+                    lambda: TicketStatusModel(mapping).states(df[status_col])
+                )
+                st.session_state.tickets_df = with_ticket_states(df, states)
+                # Downstream results depend on the mapped states, not only on the file
+                st.session_state.dataset_fingerprints['tickets'] = result_fingerprint([fingerprint, mapping])
+
+    st.markdown("### Optional: More CRM Objects")
+    st.caption("Pre-aggregated per contact (or company) before joining, so row counts never multiply")
+
+    optional_uploads = {
+        'deals': "💼 Deals CSV",
+        'engagements': "📞 Calls / Engagements CSV",
+        'line_items': "🧾 Line Items CSV"
+    }
+    for object_name, label in optional_uploads.items():
+        object_file = st.file_uploader(label, type=['csv'], key=f'{object_name}_file')
+        if object_file:
+            df, total_rows, is_limited, fingerprint = load_data(object_file, object_name)
+            st.session_state[f'{object_name}_df'] = df
+            st.session_state.dataset_fingerprints[object_name] = fingerprint
+
+            if df is not None:
+                if is_limited:
+                    st.warning(get_upgrade_message(total_rows, object_name))
+                    st.info(f"📊 Analyzing first {MAX_ROWS_DEMO} rows (out of {total_rows:,})")
+                st.success(f"✅ {object_name.replace('_', ' ').capitalize()}: {len(df):,} rows loaded")
+        else:
+            st.session_state[f'{object_name}_df'] = None
+            st.session_state.dataset_fingerprints.pop(object_name, None)
+
+    # Shared cache usage across all sessions of this server
+    cache_stats = get_shared_cache().stats()
+    if cache_stats['entries']:
+        st.caption(
+            f"🗄️ Shared cache: {cache_stats['entries']} entries, "
+            f"{cache_stats['used_mb']:,.1f}/{cache_stats['budget_mb']:,.0f} MB, "
+            f"{cache_stats['hit_rate']:.0f}% hit rate"
+        )
+
 # ==================== HERO SECTION ====================
 st.markdown("""
 <div class="hero-section">
@@ -1413,13 +5016,33 @@ else:
         with st.spinner("Calculating health scores..."):
             progress_bar = st.progress(0)
 
-            contacts_score, contacts_issues = calculate_health_score(st.session_state.contacts_df, 'contacts')
+            fingerprints = st.session_state.dataset_fingerprints
+
+            st.session_state.row_quality['contacts'] = cached_result(
+                'row_quality', [fingerprints.get('contacts')],
+                lambda: RowQualityScores(st.session_state.contacts_df)
+            )
+            contacts_score, contacts_issues = calculate_health_score(
+                st.session_state.contacts_df, 'contacts', row_quality=st.session_state.row_quality['contacts']
+            )
             progress_bar.progress(33)
 
-            companies_score, companies_issues = calculate_health_score(st.session_state.companies_df, 'companies')
+            st.session_state.row_quality['companies'] = cached_result(
+                'row_quality', [fingerprints.get('companies')],
+                lambda: RowQualityScores(st.session_state.companies_df)
+            )
+            companies_score, companies_issues = calculate_health_score(
+                st.session_state.companies_df, 'companies', row_quality=st.session_state.row_quality['companies']
+            )
             progress_bar.progress(66)
 
-            tickets_score, tickets_issues = calculate_health_score(st.session_state.tickets_df, 'tickets')
+            st.session_state.row_quality['tickets'] = cached_result(
+                'row_quality', [fingerprints.get('tickets')],
+                lambda: RowQualityScores(st.session_state.tickets_df)
+            )
+            tickets_score, tickets_issues = calculate_health_score(
+                st.session_state.tickets_df, 'tickets', row_quality=st.session_state.row_quality['tickets']
+            )
             progress_bar.progress(100)
 
             st.session_state.pre_agg_scores = {
@@ -1454,19 +5077,66 @@ else:
                 for issue in issues:
                     st.write(f"{issue}")
 
+    if st.session_state.row_quality:
+        with st.expander("🔬 Row-Level Quality"):
+            row_quality_labels = {
+                'contacts': 'Contacts', 'companies': 'Companies', 'tickets': 'Tickets', 'aggregated': 'Aggregated'
+            }
+            quality_dataset = st.selectbox(
+                "Dataset",
+                [
+                    name for name in row_quality_labels
+                    if name in st.session_state.row_quality and st.session_state.get(f'{name}_df') is not None
+                    and st.session_state.row_quality[name].rows == len(st.session_state[f'{name}_df'])
+                ],
+                format_func=row_quality_labels.get,
+                key='row_quality_dataset'
+            )
+            if quality_dataset:
+                row_quality = st.session_state.row_quality[quality_dataset]
+                st.plotly_chart(build_row_quality_chart(row_quality, row_quality_labels[quality_dataset]), use_container_width=True)
+
+                add_chart_legend("""
+                Each record gets its own score out of 100; the dataset score is their average.
+                <br><br>
+                <span style="color: white;">📉 PENALTIES:</span><br>
+                Empty fields (up to -60)<br>
+                Invalid email (-20)<br>
+                Duplicate email/ID (-40)
+                """)
+
+                worst_n = st.number_input("Worst records to show", min_value=5, max_value=500, value=20, step=5, key='row_quality_worst_n')
+                st.dataframe(
+                    row_quality.worst_records(st.session_state[f'{quality_dataset}_df'], int(worst_n)),
+                    use_container_width=True
+                )
+
     # STEP 3: Data Aggregation
     st.markdown("---")
     st.header("🔗 Step 3: Data Aggregation Tool")
 
+    join_objects = {
+        name: st.session_state[f'{name}_df']
+        for name in CRM_OBJECTS
+        if st.session_state.get(f'{name}_df') is not None
+    }
+    fingerprints = st.session_state.dataset_fingerprints
+    join_fingerprints = [f"{name}:{fingerprints.get(name)}" if fingerprints.get(name) else None for name in join_objects]
+    join_plan = cached_result('join_plan', join_fingerprints, lambda: JoinPlanner(join_objects))
+
+    with st.expander(f"🧭 Join plan ({len(join_plan.steps)} joins)", expanded=bool(join_plan.warnings)):
+        st.dataframe(join_plan.describe(), use_container_width=True)
+        st.caption("Many-side objects are collapsed to one statistics row per key before joining; naive_merge_rows is what a plain merge chain would produce.")
+        for warning in join_plan.warnings:
+            st.warning(f"⚠️ {warning}")
+        if join_plan.unlinked:
+            st.info(f"No key column links {', '.join(join_plan.unlinked)} to contacts; skipped.")
+
     if st.button("🔄 Aggregate Data"):
         with st.spinner("Aggregating data..."):
             progress_bar = st.progress(0)
 
-            st.session_state.aggregated_df = aggregate_data(
-                st.session_state.contacts_df,
-                st.session_state.companies_df,
-                st.session_state.tickets_df
-            )
+            st.session_state.aggregated_df = cached_result('aggregated', join_fingerprints, join_plan.execute)
             progress_bar.progress(100)
 
             if st.session_state.aggregated_df is not None:
@@ -1475,8 +5145,66 @@ else:
                 st.error("❌ Failed to aggregate data")
 
     if st.session_state.aggregated_df is not None:
-        st.subheader("📋 Aggregated Data Preview")
-        st.dataframe(st.session_state.aggregated_df.head(100), use_container_width=True)
+        st.subheader("📋 Aggregated Data Explorer")
+
+        explorer = cached_result(
+            'explorer_index',
+            join_fingerprints,
+            lambda: DataExplorerIndex(st.session_state.aggregated_df)
+        )
+
+        search = st.text_input("🔎 Search name / email", key='explorer_search')
+
+        filters = []
+        with st.expander("Column filters"):
+            for i in range(3):
+                col_a, col_b, col_c = st.columns([2, 1, 2])
+                with col_a:
+                    filter_col = st.selectbox(
+                        f"Column {i + 1}", ['—'] + explorer.filterable_columns, key=f'explorer_col_{i}'
+                    )
+                if filter_col == '—':
+                    continue
+                with col_b:
+                    operators = ['=', '!='] if filter_col in explorer.categorical else DataExplorerIndex.OPERATORS
+                    filter_op = st.selectbox("Operator", operators, key=f'explorer_op_{i}')
+                with col_c:
+                    if filter_col in explorer.categorical:
+                        options = explorer.categories(filter_col)
+                        choice = st.selectbox(
+                            "Value", range(len(options)),
+                            format_func=lambda j, options=options: f"{options[j][0]} ({options[j][1]:,})",
+                            key=f'explorer_val_{i}'
+                        )
+                        filter_value = options[choice][0] if options else None
+                    else:
+                        filter_value = st.number_input("Value", value=0.0, key=f'explorer_val_{i}')
+                if filter_value is not None:
+                    filters.append((filter_col, filter_op, filter_value))
+
+        col_a, col_b, col_c = st.columns([2, 1, 1])
+        with col_a:
+            sort_col = st.selectbox("Sort by", ['—'] + list(explorer.df.columns), key='explorer_sort')
+        with col_b:
+            ascending = st.checkbox("Ascending", value=True, key='explorer_ascending')
+        with col_c:
+            page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1, key='explorer_page_size')
+
+        # One scan of the rows per rerun: the mask serves both the count and the page
+        mask = explorer.filter_mask(filters, search) if (filters or search) else None
+        matches = explorer.match_count(filters, search, mask)
+        page_count = max(1, math.ceil(matches / page_size))
+        page_number = st.number_input(f"Page (of {page_count:,})", min_value=1, max_value=page_count, value=1, key='explorer_page')
+
+        page_rows = explorer.page(
+            mask,
+            sort_col=None if sort_col == '—' else sort_col,
+            ascending=ascending,
+            page=page_number - 1,
+            page_size=page_size
+        )
+        st.caption(f"{matches:,} matching rows out of {explorer.total:,}")
+        st.dataframe(page_rows, use_container_width=True)
 
     # STEP 4: Post-Aggregation Health Score
     st.markdown("---")
@@ -1484,7 +5212,10 @@ else:
 
     if st.session_state.aggregated_df is not None and st.button("📊 Calculate Post-Aggregation Score"):
         with st.spinner("Calculating post-aggregation score..."):
-            score, issues = calculate_health_score(st.session_state.aggregated_df, 'aggregated')
+            st.session_state.row_quality['aggregated'] = RowQualityScores(st.session_state.aggregated_df)
+            score, issues = calculate_health_score(
+                st.session_state.aggregated_df, 'aggregated', row_quality=st.session_state.row_quality['aggregated']
+            )
             st.session_state.post_agg_score = (score, issues)
             st.success("✅ Post-aggregation score calculated!")
 
@@ -1534,29 +5265,7 @@ else:
         if st.session_state.pre_agg_scores:
             st.subheader("📊 Score Comparison: Pre vs Post Aggregation")
 
-            pre_scores = [
-                st.session_state.pre_agg_scores['contacts'][0],
-                st.session_state.pre_agg_scores['companies'][0],
-                st.session_state.pre_agg_scores['tickets'][0]
-            ]
-            avg_pre_score = sum(pre_scores) / len(pre_scores)
-
-            comparison_data = pd.DataFrame({
-                'Stage': ['Pre-Aggregation (Avg)', 'Post-Aggregation'],
-                'Score': [avg_pre_score, score]
-            })
-
-            fig = px.bar(
-                comparison_data,
-                x='Stage',
-                y='Score',
-                title='Health Score Comparison',
-                color='Score',
-                color_continuous_scale=['#8B0000', '#CD7F32', '#DAA520'],
-                text='Score'
-            )
-            fig.update_traces(texttemplate='%{text:.1f}', textposition='outside')
-            fig = create_powerbi_chart(fig, 'Health Score Comparison')
+            fig = build_score_comparison_chart(st.session_state.pre_agg_scores, score)
             st.plotly_chart(fig, use_container_width=True)
             
             # Add legend
@@ -1578,28 +5287,82 @@ else:
     st.markdown("---")
     st.header("🚀 Step 5: Launch Complete Audit")
 
+    with st.expander("📏 Data Quality Rules"):
+        st.caption(
+            "Recommendations come from declarative rules (dataset, column or role, check, threshold in % of rows). "
+            "Upload a JSON" + (" or YAML" if yaml is not None else "") + " file to replace the defaults."
+        )
+        rules_file = st.file_uploader(
+            "Custom rules file", type=['json', 'yaml', 'yml'] if yaml is not None else ['json'], key='rules_file'
+        )
+        if rules_file is not None:
+            try:
+                st.session_state.quality_rules = load_quality_rules(rules_file.getvalue(), rules_file.name)
+                st.success(f"✅ {len(st.session_state.quality_rules)} custom rules loaded")
+            except Exception as e:
+                st.session_state.quality_rules = None
+                st.error(f"Invalid rules file: {e}")
+        else:
+            st.session_state.quality_rules = None
+        st.download_button(
+            "⬇️ Download default rules (JSON)",
+            json.dumps(DEFAULT_QUALITY_RULES, indent=2),
+            file_name="quality_rules.json",
+            mime="application/json"
+        )
+
     if st.session_state.aggregated_df is not None and st.button("🔍 Launch Audit", type="primary"):
         with st.spinner("Performing comprehensive audit..."):
             progress_bar = st.progress(0)
 
+            # Exports built for the previous audit must not be served for this one
+            if st.session_state.cleaned_export:
+                st.session_state.cleaned_export['file'].close()
+            for export in (st.session_state.pdf_report, st.session_state.excel_export):
+                if export:
+                    export.close()
+            st.session_state.pdf_report = None
+            st.session_state.excel_export = None
+            st.session_state.cleaned_export = None
+
             # Perform audit
             st.session_state.audit_results = perform_audit(
                 st.session_state.contacts_df,
                 st.session_state.companies_df,
                 st.session_state.tickets_df,
-                st.session_state.aggregated_df
+                st.session_state.aggregated_df,
+                rules=st.session_state.quality_rules
             )
             progress_bar.progress(50)
             
             # V6 ANALYSES
             st.session_state.cold_analysis = analyze_cold_contacts(
                 st.session_state.contacts_df,
-                days_threshold=90
+                days_threshold=st.session_state.get('cold_days_threshold', 90)
+            )
+            
+            st.session_state.contact_cohorts = cached_result(
+                'contact_cohorts', [st.session_state.dataset_fingerprints.get('contacts')],
+                lambda: analyze_contact_cohorts(st.session_state.contacts_df)
             )
             
+            st.session_state.column_profiles = {
+                name: cached_result(
+                    'column_profiles', [st.session_state.dataset_fingerprints.get(name)],
+                    lambda df=st.session_state[f'{name}_df']: analyze_column_profiles(df)
+                )
+                for name in ['contacts', 'companies', 'tickets']
+                if st.session_state.get(f'{name}_df') is not None
+            }
+
             st.session_state.email_analysis = analyze_email_validity(
                 st.session_state.contacts_df
             )
+
+            st.session_state.phone_analysis = cached_result(
+                'phone_analysis', [st.session_state.dataset_fingerprints.get('contacts')],
+                lambda: analyze_phone_numbers(st.session_state.contacts_df)
+            )
             
             st.session_state.orphan_analysis = analyze_orphan_contacts(
                 st.session_state.contacts_df
@@ -1610,16 +5373,54 @@ else:
                 st.session_state.contacts_df
             )
             
+            fingerprints = st.session_state.dataset_fingerprints
+            st.session_state.referential_integrity = cached_result(
+                'referential_integrity',
+                [fingerprints.get('contacts'), fingerprints.get('companies'), fingerprints.get('tickets')],
+                lambda: check_referential_integrity(
+                    st.session_state.contacts_df,
+                    st.session_state.companies_df,
+                    st.session_state.tickets_df
+                )
+            )
+            
+            domain_index = cached_result(
+                'company_domain_index', [fingerprints.get('companies')],
+                lambda: CompanyDomainIndex(st.session_state.companies_df)
+            )
+            st.session_state.company_links = cached_result(
+                'company_links', [fingerprints.get('contacts'), fingerprints.get('companies')],
+                lambda: suggest_company_links(
+                    st.session_state.contacts_df,
+                    st.session_state.companies_df,
+                    domain_index
+                )
+            )
+            
+            st.session_state.tickets_performance = analyze_tickets_performance(
+                st.session_state.tickets_df
+            )
+            
+            # Resolution time comes from the single pass in analyze_tickets_performance
             st.session_state.critical_tickets = analyze_critical_tickets(
                 st.session_state.tickets_df,
-                hours_threshold=48
+                hours_threshold=st.session_state.get('critical_hours_threshold', 48),
+                resolution_stats=st.session_state.tickets_performance.get('resolution_stats')
             )
             
-            st.session_state.churn_analysis = analyze_churn_risk(
+            # Presorted dates so the threshold sliders answer without re-scanning the frames
+            st.session_state.threshold_index = ThresholdIndex(
                 st.session_state.contacts_df,
                 st.session_state.tickets_df
             )
             
+            # Ticket signals come from the per-contact columns built during aggregation
+            st.session_state.churn_analysis = analyze_churn_risk(
+                st.session_state.contacts_df,
+                st.session_state.tickets_df,
+                ticket_feature_df=st.session_state.aggregated_df
+            )
+            
             
             
             # PERFORMANCE METRICS ANALYSES
@@ -1642,7 +5443,7 @@ else:
                 st.session_state.post_agg_score[0] if st.session_state.post_agg_score else None
             )
             
-            st.session_state.tickets_performance = analyze_tickets_performance(
+            st.session_state.ticket_trend_index = TicketTrendIndex(
                 st.session_state.tickets_df
             )
             
@@ -1651,8 +5452,51 @@ else:
                 top_n=3
             )
 
+            st.session_state.category_breakdowns = cached_result(
+                'category_breakdowns',
+                [fingerprints.get('contacts'), fingerprints.get('companies'), fingerprints.get('tickets')],
+                lambda: analyze_category_breakdowns({
+                    'contacts': st.session_state.contacts_df,
+                    'companies': st.session_state.companies_df,
+                    'tickets': st.session_state.tickets_df
+                })
+            )
+
             progress_bar.progress(100)
 
+            # Keep a summary of this run so later audits of the same portal can be compared with it
+            results = st.session_state.audit_results
+            pre_scores = st.session_state.pre_agg_scores or {}
+            history_analyses = {
+                'audit': {key: value for key, value in results.items() if key != 'rule_results'},
+                'rules': {
+                    result['rule'].get('id', 'rule'): result['pct']
+                    for result in results.get('rule_results', []) if not result.get('skipped')
+                },
+                'health': {
+                    **{f'{name}_pre_aggregation': score for name, (score, _) in pre_scores.items()},
+                    'post_aggregation': st.session_state.post_agg_score[0] if st.session_state.post_agg_score else None
+                },
+                'cold': st.session_state.cold_analysis,
+                'email': st.session_state.email_analysis,
+                'phone': st.session_state.phone_analysis,
+                'orphans': st.session_state.orphan_analysis,
+                'ghost_companies': st.session_state.ghost_companies,
+                'referential_integrity': st.session_state.referential_integrity,
+                'critical_tickets': st.session_state.critical_tickets,
+                'churn': st.session_state.churn_analysis,
+                'overall_quality': st.session_state.overall_quality,
+                'tickets_performance': st.session_state.tickets_performance
+            }
+            try:
+                get_audit_history().record(
+                    st.session_state.get('portal_name') or AUDIT_HISTORY_DEFAULT_PORTAL,
+                    {name: analysis for name, analysis in history_analyses.items() if analysis},
+                    fingerprints
+                )
+            except sqlite3.Error as e:
+                st.warning(f"⚠️ Audit not saved to history: {e}")
+
             st.success("✅ Audit completed successfully!")
 
     # STEP 6: Display Results
@@ -1680,13 +5524,26 @@ else:
             st.markdown("---")
             st.subheader("📊 Advanced Business Metrics")
             
+            col1, col2 = st.columns(2)
+            with col1:
+                cold_days = st.slider("❄️ Cold contact threshold (days)", 7, 365, 90, key='cold_days_threshold')
+            with col2:
+                critical_hours = st.slider("⏱️ Critical ticket threshold (hours)", 1, 720, 48, key='critical_hours_threshold')
+            
+            threshold_index = st.session_state.threshold_index
+            if threshold_index is not None:
+                st.session_state.cold_analysis = threshold_index.cold_analysis(cold_days)
+                st.session_state.critical_tickets = threshold_index.critical_tickets(
+                    critical_hours, st.session_state.critical_tickets
+                )
+            
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
                 if st.session_state.cold_analysis:
                     cold = st.session_state.cold_analysis
                     st.metric(
-                        "Cold Contacts (>90d)",
+                        f"Cold Contacts (>{cold.get('threshold_days', 90)}d)",
                         f"{cold.get('cold_pct', 0):.1f}%",
                         delta=f"{cold.get('cold_count', 0)} contacts",
                         delta_color="inverse"
@@ -1716,36 +5573,124 @@ else:
                 if st.session_state.critical_tickets:
                     crit = st.session_state.critical_tickets
                     st.metric(
-                        "Critical Tickets (>48h)",
+                        f"Critical Tickets (>{crit.get('threshold_hours', 48)}h)",
                         crit.get('critical_count', 0),
-                        delta=f"{crit.get('avg_resolution', 0):.1f}h avg" if crit.get('avg_resolution') else None,
+                        delta=f"{crit.get('median_resolution', 0):.1f}h median" if crit.get('median_resolution') else None,
                         delta_color="inverse"
                     )
 
+            churn = st.session_state.churn_analysis
+            if churn and churn.get('top_at_risk') is not None and not churn['top_at_risk'].empty:
+                with st.expander(f"🔥 Highest Churn Risk Contacts (top {len(churn['top_at_risk'])})"):
+                    st.dataframe(churn['top_at_risk'], use_container_width=True)
+                    st.download_button(
+                        "📥 Download at-risk contacts (CSV)",
+                        data=churn['top_at_risk'].to_csv(index=False),
+                        file_name=f"Jupiter_CRM_Churn_Risk_{datetime.now().strftime('%Y%m%d')}.csv",
+                        mime="text/csv"
+                    )
+
+            links = st.session_state.company_links
+            if links and links.get('linked_count'):
+                with st.expander(f"🔗 Suggested Company Links ({links['linked_count']:,} orphan contacts matched by email domain)"):
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric(
+                            "Orphan Contacts After Linking",
+                            f"{links['orphan_after']:,}",
+                            delta=f"-{links['linked_count']:,}",
+                            delta_color="inverse"
+                        )
+                    with col2:
+                        if links['ghost_after'] is not None:
+                            st.metric(
+                                "Ghost Companies After Linking",
+                                f"{links['ghost_after']:,}",
+                                delta=f"-{links['ghost_before'] - links['ghost_after']:,}",
+                                delta_color="inverse"
+                            )
+                    with col3:
+                        st.metric("Personal Domains Skipped", f"{links['b2c_skipped']:,}")
+                    if links['ambiguous_domains']:
+                        st.caption(f"{links['ambiguous_domains']:,} companies share a domain; the first one is suggested.")
+                    st.dataframe(links['suggestions'].head(1000), use_container_width=True)
+                    st.download_button(
+                        "📥 Download suggested links (CSV)",
+                        data=links['suggestions'].to_csv(index=False),
+                        file_name=f"Jupiter_CRM_Company_Links_{datetime.now().strftime('%Y%m%d')}.csv",
+                        mime="text/csv"
+                    )
+
+            phones = st.session_state.phone_analysis
+            if phones and phones.get('filled'):
+                with st.expander(f"📞 Phone Numbers ({phones['valid_pct']:.1f}% valid)"):
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric("Valid (E.164-ready)", f"{phones['valid']:,}")
+                    with col2:
+                        st.metric("Invalid", f"{phones['invalid']:,}")
+                    with col3:
+                        st.metric("Placeholders", f"{phones['placeholder']:,}")
+                    with col4:
+                        st.metric("Duplicate Numbers", f"{phones['duplicate_count']:,}")
+                    st.caption(
+                        f"Column '{phones['column']}' · {phones['formatted_pct']:.1f}% already stored as E.164 · "
+                        f"numbers without a country code are read as {phones['default_country']}"
+                    )
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.markdown("**By country**")
+                        st.dataframe(phones['by_region'], hide_index=True, use_container_width=True)
+                    with col2:
+                        if not phones['shared_numbers'].empty:
+                            st.markdown("**Numbers shared by several contacts**")
+                            st.dataframe(phones['shared_numbers'], hide_index=True, use_container_width=True)
+                    if not phones['samples'].empty:
+                        st.markdown("**Examples to fix**")
+                        st.dataframe(phones['samples'], hide_index=True, use_container_width=True)
+
+            integrity = st.session_state.referential_integrity
+            if integrity and (integrity['checks'] or integrity['keys']):
+                with st.expander("🧩 Referential Integrity"):
+                    col1, col2, col3, col4 = st.columns(4)
+                    contact_company = integrity['checks'].get('contact_company')
+                    ticket_contact = integrity['checks'].get('ticket_contact')
+                    with col1:
+                        if contact_company:
+                            st.metric("Contacts → Missing Company", f"{contact_company['dangling']:,}")
+                    with col2:
+                        if ticket_contact:
+                            st.metric("Tickets → Missing Contact", f"{ticket_contact['dangling']:,}")
+                    with col3:
+                        if 'ghost_companies' in integrity:
+                            st.metric("Ghost Companies", f"{integrity['ghost_companies']['count']:,}")
+                    with col4:
+                        if 'contacts_without_tickets' in integrity:
+                            st.metric("Contacts Without Tickets", f"{integrity['contacts_without_tickets']['count']:,}")
+
+                    key_issues = [
+                        f"{label}: {keys['duplicates']:,} duplicate and {keys['blank']:,} blank IDs in '{keys['column']}'"
+                        for label, keys in integrity['keys'].items()
+                        if keys['duplicates'] or keys['blank']
+                    ]
+                    for issue in key_issues:
+                        st.caption(f"⚠️ {issue.capitalize()}")
+
+                    for label, check in [("Contacts pointing to unknown companies", contact_company),
+                                         ("Tickets pointing to unknown contacts", ticket_contact)]:
+                        if check and check['dangling']:
+                            st.markdown(f"**{label}** ({check['dangling_keys']:,} distinct missing IDs)")
+                            st.dataframe(check['sample'], use_container_width=True)
+
         # Visualizations
         st.markdown("---")
-        tab1, tab2, tab3, tab4 = st.tabs(["📊 Overview", "🔍 Duplicates Analysis", "⚡ Performance Metrics", "📋 Recommendations"])
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Overview", "🔍 Duplicates Analysis", "⚡ Performance Metrics", "📋 Recommendations", "📈 Trends"])
 
         with tab1:
             st.subheader("Data Distribution")
 
             # Records by type
-            records_data = pd.DataFrame({
-                'Type': ['Contacts', 'Companies', 'Tickets'],
-                'Count': [results['total_contacts'], results['total_companies'], results['total_tickets']]
-            })
-
-            fig = px.bar(
-                records_data,
-                x='Type',
-                y='Count',
-                title='Records by Type',
-                color='Count',
-                color_continuous_scale=['#DAA520', '#CD7F32', '#8B4513'],
-                text='Count'
-            )
-            fig.update_traces(texttemplate='%{text:,}', textposition='outside')
-            fig = create_powerbi_chart(fig, 'Records by Type')
+            fig = build_records_chart(results)
             st.plotly_chart(fig, use_container_width=True)
             
             add_chart_legend("""
@@ -1764,19 +5709,7 @@ else:
 
             # Missing data distribution
             if results['missing_data']:
-                missing_data = pd.DataFrame({
-                    'Type': list(results['missing_data'].keys()),
-                    'Missing Values': list(results['missing_data'].values())
-                })
-
-                fig = px.pie(
-                    missing_data,
-                    values='Missing Values',
-                    names='Type',
-                    title='Missing Data Distribution',
-                    color_discrete_sequence=['#CD7F32', '#B8860B', '#DAA520']
-                )
-                fig = create_powerbi_chart(fig, 'Missing Data Distribution')
+                fig = build_missing_data_chart(results)
                 st.plotly_chart(fig, use_container_width=True)
                 
                 add_chart_legend("""
@@ -1795,26 +5728,53 @@ Focus on filling gaps in your most-used objects first
 Aim for less than 5% missing data per object
                 """)
 
+            # Contact cohorts
+            cohorts = st.session_state.contact_cohorts
+            if cohorts and len(cohorts['cohorts']):
+                fig = build_cohort_heatmap_chart(cohorts)
+                st.plotly_chart(fig, use_container_width=True)
+                
+                add_chart_legend(f"""
+                Contacts grouped by the month they were created ({cohorts['created_column']}).
+                <br><br>
+                Each cell: share of the cohort still active N months later, based on {cohorts['activity_column']}
+                <br><br>
+                Fast-fading rows point to onboarding or nurturing gaps
+                <br>
+                Blank cells: months that have not happened yet for that cohort
+                """)
+
+            # Column profiles
+            if st.session_state.column_profiles:
+                st.subheader("Column Profiles")
+                profile_dataset = st.selectbox(
+                    "Dataset", list(st.session_state.column_profiles),
+                    format_func=str.capitalize, key='profile_dataset'
+                )
+                profiles = st.session_state.column_profiles[profile_dataset]
+                st.dataframe(profiles['columns'], hide_index=True, use_container_width=True)
+                st.caption(
+                    f"{profiles['rows']:,} rows · distinct counts are HyperLogLog estimates (±2%) "
+                    "above the tracked-value limit · patterns: A/a = upper/lower-case letters, 9 = digit"
+                )
+
+                profile_column = st.selectbox("Column", list(profiles['details']), key='profile_column')
+                detail = profiles['details'].get(profile_column)
+                if detail:
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.markdown(f"**Top values** · fill {detail['fill_pct']}% · ≈{detail['distinct']:,} distinct")
+                        st.dataframe(pd.DataFrame(detail['top_values']), hide_index=True, use_container_width=True)
+                    with col2:
+                        st.markdown(f"**Range** · {detail['min']} → {detail['max']}")
+                        if detail['patterns']:
+                            st.dataframe(pd.DataFrame(detail['patterns']), hide_index=True, use_container_width=True)
+
         with tab2:
             st.subheader("Duplicate Records Analysis")
 
             if results['duplicates']:
-                dup_data = pd.DataFrame({
-                    'Type': list(results['duplicates'].keys()),
-                    'Duplicates': list(results['duplicates'].values())
-                })
-
-                fig = px.bar(
-                    dup_data,
-                    x='Type',
-                    y='Duplicates',
-                    title='Duplicates by Type',
-                    color='Duplicates',
-                    color_continuous_scale=['#DAA520', '#CD7F32', '#8B0000'],
-                    text='Duplicates'
-                )
-                fig.update_traces(texttemplate='%{text:,}', textposition='outside')
-                fig = create_powerbi_chart(fig, 'Duplicates by Type')
+                fig = build_duplicates_chart(results)
                 st.plotly_chart(fig, use_container_width=True)
                 
                 add_chart_legend("""
@@ -1951,6 +5911,75 @@ Upgrade to PRO for statistically significant analysis on unlimited data.
     </span>
 </div>
 """, unsafe_allow_html=True)
+                
+                # RESOLUTION TIME DISTRIBUTION
+                resolution = perf.get('resolution_stats')
+                if resolution and resolution.get('count'):
+                    st.markdown("---")
+                    st.markdown("#### ⏱️ Resolution Time Distribution")
+                    
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric("Median (p50)", f"{resolution['p50']:.1f}h")
+                    with col2:
+                        st.metric("p90", f"{resolution['p90']:.1f}h")
+                    with col3:
+                        st.metric("p99", f"{resolution['p99']:.1f}h")
+                    with col4:
+                        st.metric("Resolved Tickets", f"{resolution['count']:,}")
+                    
+                    fig = build_resolution_histogram_chart(resolution)
+                    st.plotly_chart(fig, use_container_width=True)
+                    
+                    if resolution['breakdown']:
+                        dimension = st.selectbox(
+                            "Break down by", list(resolution['breakdown']),
+                            format_func=str.capitalize, key='resolution_breakdown'
+                        )
+                        st.dataframe(pd.DataFrame(resolution['breakdown'][dimension]), use_container_width=True)
+                    
+                    add_chart_legend("""
+                    How long tickets take from creation to closure.
+                    <br><br>
+                    p50: half of tickets are resolved faster than this
+                    <br>
+                    p90 / p99: the slow tail that customers remember
+                    <br><br>
+                    A p99 far above p50 points to tickets stuck without an owner
+                    """)
+            
+            # TICKET VOLUME & BACKLOG TREND
+            trend_index = st.session_state.ticket_trend_index
+            if trend_index is not None and trend_index.start is not None:
+                st.markdown("---")
+                st.markdown("#### 📈 Ticket Volume & Backlog Trend")
+                
+                granularity = st.radio(
+                    "Granularity", list(TREND_FREQUENCIES), index=1, horizontal=True, key='trend_granularity'
+                )
+                trends = trend_index.trends(TREND_FREQUENCIES[granularity])
+                
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Current Backlog", f"{trends['current_backlog']:,}")
+                with col2:
+                    st.metric("Peak Backlog", f"{trends['peak_backlog']:,}")
+                with col3:
+                    st.metric("Anomalous Periods", f"{len(trends['anomalies']):,}")
+                
+                fig = build_ticket_trend_chart(trends)
+                st.plotly_chart(fig, use_container_width=True)
+                
+                if trends['anomalies']:
+                    st.dataframe(pd.DataFrame(trends['anomalies']), use_container_width=True)
+                
+                add_chart_legend(f"""
+                Tickets opened and closed per {granularity.lower()}, with the open backlog (right axis).
+                <br><br>
+                Backlog: running total of opened minus closed tickets
+                <br>
+                Anomaly: volume more than {TREND_ANOMALY_Z:.0f} standard deviations away from the previous {TREND_ANOMALY_WINDOW} periods
+                """)
             
             st.markdown("---")
             
@@ -1963,21 +5992,7 @@ Upgrade to PRO for statistically significant analysis on unlimited data.
                 if industries.get('no_industry_column'):
                     st.info("ℹ️ No industry column found in companies data")
                 elif industries.get('top_industries'):
-                    industries_data = pd.DataFrame(industries['top_industries'])
-                    
-                    fig = px.bar(
-                        industries_data,
-                        x='name',
-                        y='percentage',
-                        title='Top 3 Industries',
-                        text='percentage',
-                        color='percentage',
-                        color_continuous_scale=['#DAA520', '#CD7F32', '#8B4513']
-                    )
-                    fig.update_traces(texttemplate='%{text:.1f}%', textposition='outside')
-                    fig.update_xaxes(title='Industry')
-                    fig.update_yaxes(title='Percentage (%)')
-                    fig = create_powerbi_chart(fig, 'Top 3 Industries Distribution')
+                    fig = build_top_industries_chart(industries)
                     st.plotly_chart(fig, use_container_width=True)
                     
                     st.markdown("**Industry Breakdown:**")
@@ -1990,6 +6005,20 @@ Upgrade to PRO for statistically significant analysis on unlimited data.
                 else:
                     st.info("ℹ️ No industry data available")
 
+            st.markdown("---")
+
+            # CATEGORY BREAKDOWNS
+            st.markdown("### 📊 Breakdown by Any Column")
+            render_breakdown_widget(
+                {
+                    'contacts': st.session_state.contacts_df,
+                    'companies': st.session_state.companies_df,
+                    'tickets': st.session_state.tickets_df
+                },
+                st.session_state.dataset_fingerprints,
+                key='breakdown'
+            )
+
 
         with tab4:
             st.subheader("Strategic Recommendations")
@@ -2000,6 +6029,256 @@ Upgrade to PRO for statistically significant analysis on unlimited data.
                     st.write(f"**Recommended Action:** {rec['action']}")
                     st.write(f"**Expected Impact:** {rec['impact']}")
 
+            for error in results.get('rule_errors', []):
+                st.warning(f"⚠️ Rule skipped: {error}")
+            if results.get('rule_results'):
+                with st.expander("📏 Quality rule results"):
+                    st.dataframe(pd.DataFrame([
+                        {
+                            'Rule': r['rule'].get('id', ''),
+                            'Dataset': r['rule'].get('dataset', 'contacts'),
+                            'Column': r['column'] or ('(row)' if not r['skipped'] else '—'),
+                            'Failing rows': r['count'],
+                            '%': r['pct'],
+                            'Threshold %': r['rule'].get('threshold', 0),
+                            'Status': 'n/a' if r['skipped'] else ('⚠️ triggered' if r['triggered'] else '✅ pass')
+                        }
+                        for r in results['rule_results']
+                    ]), hide_index=True, use_container_width=True)
+
+        with tab5:
+            st.subheader("📈 Audit History Trends")
+            try:
+                history = get_audit_history()
+                portals = history.portals()
+            except sqlite3.Error as e:
+                history, portals = None, []
+                st.warning(f"⚠️ Audit history unavailable: {e}")
+
+            if not portals:
+                st.info("No audit stored yet: every launched audit is saved here under its portal name.")
+            else:
+                current_portal = st.session_state.get('portal_name') or AUDIT_HISTORY_DEFAULT_PORTAL
+                col1, col2 = st.columns(2)
+                with col1:
+                    history_portal = st.selectbox(
+                        "Portal", portals,
+                        index=portals.index(current_portal) if current_portal in portals else 0,
+                        key="history_portal"
+                    )
+                metrics = history.metric_names(history_portal)
+                with col2:
+                    history_metric = st.selectbox(
+                        "Metric", metrics,
+                        index=metrics.index(AUDIT_HISTORY_DEFAULT_METRIC) if AUDIT_HISTORY_DEFAULT_METRIC in metrics else 0,
+                        format_func=history_metric_label,
+                        key="history_metric"
+                    )
+                history_range = st.date_input(
+                    "Audit dates", value=(), key="history_range",
+                    help="Leave empty to show every stored audit"
+                )
+                start, end = (tuple(history_range) + (None, None))[:2]
+                end = end or start
+
+                trend = history.trend(history_portal, history_metric, start, end)
+                if trend.empty:
+                    st.info("No audit of this portal in the selected range.")
+                else:
+                    label = history_metric_label(history_metric)
+                    st.plotly_chart(build_history_trend_chart(trend, label), use_container_width=True)
+                    if len(trend) > 1:
+                        first, last = trend['value'].iloc[0], trend['value'].iloc[-1]
+                        st.metric(
+                            f"{label} (latest audit)", f"{last:,.1f}",
+                            delta=f"{last - first:+,.1f} since {trend['created_at'].iloc[0]:%Y-%m-%d}"
+                        )
+
+                    add_chart_legend("""
+                    One point per launched audit of this portal.
+                    <br><br>
+                    <span style="color: white;">📈 TREND:</span><br>
+                    Compare the same metric from one audit to the next<br>
+                    (e.g. health score, duplicates, churn risk)
+                    <br><br>
+                    <span style="color: white;">🗂️ SCOPE:</span><br>
+                    Pick another portal or metric above
+                    """)
+
+                    runs = history.audits(history_portal, start, end)
+                    with st.expander(f"🗂️ Stored audits ({len(runs):,})"):
+                        st.dataframe(pd.DataFrame({
+                            'Audit': runs['audit_id'],
+                            'Date': runs['created_at'],
+                            'Datasets': runs['fingerprints'].map(lambda fps: ', '.join(sorted(fps)))
+                        }), hide_index=True, use_container_width=True)
+
+        # PDF REPORT
+        st.markdown("---")
+        st.subheader("📄 Export Report")
+
+        include_appendices = st.checkbox(
+            "Include per-record appendices (duplicate clusters, orphan contacts, ghost companies, critical tickets)"
+        )
+
+        if chart_rendering_error():
+            st.warning(f"⚠️ Charts will be left out of the PDF report: {chart_rendering_error()}")
+
+        if st.button("📄 Generate PDF Report"):
+            with st.spinner("Building PDF report (charts are rendered once and reused)..."):
+                report_progress = st.progress(0.0, text="Building report...")
+                post_score = st.session_state.post_agg_score[0] if st.session_state.post_agg_score else 0
+                appendices = None
+                if include_appendices:
+                    appendices = build_report_appendices(
+                        st.session_state.contacts_df,
+                        st.session_state.companies_df,
+                        st.session_state.tickets_df,
+                        hours_threshold=st.session_state.critical_tickets.get('threshold_hours', 48)
+                        if st.session_state.critical_tickets else 48
+                    )
+                trend_index = st.session_state.ticket_trend_index
+                ticket_trends = trend_index.trends(
+                    TREND_FREQUENCIES[st.session_state.get('trend_granularity', 'Week')]
+                ) if trend_index is not None else None
+                pdf_buffer = generate_pdf_report(
+                    results,
+                    st.session_state.pre_agg_scores,
+                    post_score,
+                    cold_analysis=st.session_state.cold_analysis,
+                    churn_analysis=st.session_state.churn_analysis,
+                    critical_tickets=st.session_state.critical_tickets,
+                    email_analysis=st.session_state.email_analysis,
+                    orphan_analysis=st.session_state.orphan_analysis,
+                    ghost_companies=st.session_state.ghost_companies,
+                    charts=build_report_charts(
+                        results,
+                        st.session_state.pre_agg_scores,
+                        st.session_state.post_agg_score[0] if st.session_state.post_agg_score else None,
+                        st.session_state.top_industries,
+                        st.session_state.tickets_performance,
+                        ticket_trends,
+                        st.session_state.contact_cohorts
+                    ),
+                    appendices=appendices,
+                    tickets_performance=st.session_state.tickets_performance,
+                    ticket_trends=ticket_trends,
+                    contact_cohorts=st.session_state.contact_cohorts,
+                    company_links=st.session_state.company_links,
+                    referential_integrity=st.session_state.referential_integrity,
+                    category_breakdowns=st.session_state.category_breakdowns,
+                    phone_analysis=st.session_state.phone_analysis,
+                    progress=lambda fraction, message: report_progress.progress(min(fraction, 1.0), text=message)
+                )
+                if st.session_state.pdf_report:
+                    st.session_state.pdf_report.close()
+                st.session_state.pdf_report = pdf_buffer
+
+        if st.session_state.pdf_report:
+            st.download_button(
+                "📥 Download PDF Report",
+                data=deferred_file_download(st.session_state.pdf_report),
+                file_name=f"Jupiter_CRM_Audit_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                mime="application/pdf"
+            )
+
+        if st.button("📊 Generate Excel Findings Workbook"):
+            with st.spinner("Writing findings workbook..."):
+                excel_progress = st.progress(0.0, text="Collecting findings...")
+                findings = build_export_findings(
+                    st.session_state.contacts_df,
+                    st.session_state.companies_df,
+                    st.session_state.aggregated_df,
+                    st.session_state.churn_analysis
+                )
+                workbook_file = tempfile.TemporaryFile(suffix='.xlsx')
+                write_findings_workbook(
+                    findings,
+                    workbook_file,
+                    progress=lambda fraction, message: excel_progress.progress(min(fraction, 1.0), text=message)
+                )
+                if st.session_state.excel_export:
+                    st.session_state.excel_export.close()
+                st.session_state.excel_export = workbook_file
+
+        if st.session_state.excel_export:
+            st.download_button(
+                "📥 Download Excel Findings",
+                data=deferred_file_download(st.session_state.excel_export),
+                file_name=f"Jupiter_CRM_Findings_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+
+        export_sources = {'aggregated': st.session_state.aggregated_df, **{name: st.session_state.get(f'{name}_df') for name in CRM_OBJECTS}}
+        export_sources = {name: df for name, df in export_sources.items() if df is not None and not df.empty}
+        if export_sources:
+            st.markdown("#### 🧹 Download Cleaned Data")
+            export_col1, export_col2 = st.columns(2)
+            with export_col1:
+                export_name = st.selectbox(
+                    "Dataset", list(export_sources), format_func=lambda name: name.replace('_', ' ').title(),
+                    key="cleaned_export_dataset"
+                )
+            with export_col2:
+                export_format = st.selectbox("Format", cleaned_export_formats(), key="cleaned_export_format")
+            st.caption("Exact duplicate rows are collapsed, emails lowercased, phones normalized to E.164 and problem rows flagged in flag_* columns.")
+
+            if st.button("🧹 Generate Cleaned Export"):
+                with st.spinner("Writing cleaned data..."):
+                    clean_progress = st.progress(0.0, text="Cleaning...")
+                    if st.session_state.cleaned_export:
+                        st.session_state.cleaned_export['file'].close()
+                    # Written chunk by chunk to disk: the cleaned copy never sits in memory next to the source frame
+                    export_file = tempfile.TemporaryFile()
+                    phone_analysis = st.session_state.phone_analysis or {}
+                    summary = write_cleaned_export(
+                        export_sources[export_name],
+                        export_file,
+                        export_format,
+                        name=export_name,
+                        contacts_df=st.session_state.contacts_df,
+                        default_country=phone_analysis.get('default_country') or PHONE_DEFAULT_COUNTRY,
+                        progress=lambda fraction, message: clean_progress.progress(min(fraction, 1.0), text=message)
+                    )
+                    extension, mime = CLEAN_EXPORT_FORMATS[export_format]
+                    st.session_state.cleaned_export = {
+                        'file': export_file,
+                        'file_name': f"Jupiter_CRM_{export_name}_cleaned_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                        'mime': mime,
+                        'summary': summary
+                    }
+
+            if st.session_state.cleaned_export:
+                cleaned = st.session_state.cleaned_export
+                summary = cleaned['summary']
+                flagged = ', '.join(f"{flag[5:].replace('_', ' ')}: {count:,}" for flag, count in summary['flagged'].items())
+                st.info(
+                    f"{summary['exported']:,} of {summary['rows']:,} rows exported, "
+                    f"{summary['duplicates_removed']:,} exact duplicates removed" + (f" — flagged {flagged}" if flagged else "")
+                )
+                st.download_button(
+                    "📥 Download Cleaned Data",
+                    data=deferred_file_download(cleaned['file']),
+                    file_name=cleaned['file_name'],
+                    mime=cleaned['mime']
+                )
+
+        docx_bytes = recommendations_document_bytes(
+            results,
+            st.session_state.pre_agg_scores,
+            st.session_state.post_agg_score[0] if st.session_state.post_agg_score else 0,
+            cold_analysis=st.session_state.cold_analysis,
+            churn_analysis=st.session_state.churn_analysis,
+            email_analysis=st.session_state.email_analysis,
+            critical_tickets=st.session_state.critical_tickets
+        )
+        st.download_button(
+            "📝 Download Recommendations (DOCX)",
+            data=docx_bytes,
+            file_name=f"Jupiter_CRM_Recommendations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
+
         # PRO Access Button (centered)
         st.markdown("---")
         st.markdown("""
@@ -2013,6 +6292,94 @@ Upgrade to PRO for statistically significant analysis on unlimited data.
         """, unsafe_allow_html=True)
 
 
+# ==================== COMPARE EXPORTS ====================
+st.markdown("---")
+st.header("🔀 Compare Two Exports (Delta Audit)")
+st.caption("Upload an earlier and a newer export of the same object to see which records were added, removed or modified.")
+
+delta_object = st.selectbox(
+    "Object", list(CRM_OBJECTS), format_func=lambda name: name.replace('_', ' ').title(), key='delta_object'
+)
+col1, col2 = st.columns(2)
+with col1:
+    delta_old_file = st.file_uploader("🕘 Previous export (CSV)", type=['csv'], key='delta_old_file')
+with col2:
+    delta_new_file = st.file_uploader("🆕 New export (CSV)", type=['csv'], key='delta_new_file')
+
+if delta_old_file and delta_new_file:
+    old_df, old_total, old_limited, old_fingerprint = load_data(delta_old_file, delta_object)
+    new_df, new_total, new_limited, new_fingerprint = load_data(delta_new_file, delta_object)
+
+    loaded = old_df is not None and new_df is not None
+    shared_columns = [col for col in user_columns(old_df).columns if col in new_df.columns] if loaded else []
+    if loaded and not shared_columns:
+        st.error("❌ The two exports share no column: check both files are exports of the same object")
+    elif shared_columns:
+        if old_limited or new_limited:
+            st.warning(get_upgrade_message(max(old_total, new_total), delta_object))
+
+        key_guess = next((col for col in CRM_OBJECTS[delta_object]['key'] if col in shared_columns), None)
+        key_options = [DELTA_WHOLE_ROWS] + shared_columns
+        delta_key = st.selectbox(
+            "Match records on", key_options,
+            index=key_options.index(key_guess) if key_guess else 0,
+            help="A unique ID column tells modified records apart from removed + added ones",
+            key='delta_key'
+        )
+        delta_key = None if delta_key == DELTA_WHOLE_ROWS else delta_key
+
+        with st.spinner("Comparing exports..."):
+            delta = cached_result(
+                'delta_audit', [old_fingerprint, new_fingerprint, delta_object, delta_key or DELTA_WHOLE_ROWS],
+                lambda: delta_audit(old_df, new_df, delta_object, delta_key)
+            )
+
+        col1, col2, col3, col4, col5 = st.columns(5)
+        with col1:
+            st.metric("➕ Added", f"{delta['added']:,}")
+        with col2:
+            st.metric("➖ Removed", f"{delta['removed']:,}")
+        with col3:
+            st.metric("✏️ Modified", f"{delta['modified']:,}")
+        with col4:
+            st.metric("✅ Unchanged", f"{delta['unchanged']:,}")
+        with col5:
+            st.metric("🩺 Health Score", f"{delta['health']['new']:.1f}/100", delta=f"{delta['health']['delta']:+.1f}")
+
+        st.caption(
+            f"{delta['old_rows']:,} → {delta['new_rows']:,} rows · "
+            f"health score {delta['health']['old']:.1f} → {delta['health']['new']:.1f}"
+        )
+        if delta['key'] and (delta['unkeyed']['old'] or delta['unkeyed']['new']):
+            st.info(
+                f"ℹ️ {delta['unkeyed']['old']:,} previous and {delta['unkeyed']['new']:,} new rows have a blank or repeated "
+                f"'{delta['key']}': they are matched as whole rows only"
+            )
+        if delta['columns_added'] or delta['columns_removed']:
+            st.warning(
+                "⚠️ Columns differ between exports — "
+                f"added: {', '.join(map(str, delta['columns_added'])) or 'none'}; "
+                f"removed: {', '.join(map(str, delta['columns_removed'])) or 'none'}"
+            )
+
+        if not delta['column_changes'].empty:
+            st.plotly_chart(build_delta_columns_chart(delta), use_container_width=True)
+            add_chart_legend("""
+            Which fields changed between the two exports.
+            <br><br>
+            <span style="color: white;">✏️ MODIFIED RECORDS:</span><br>
+            Records found in both exports (same key)<br>
+            with a different value in this column
+            <br><br>
+            <span style="color: white;">🎯 USE:</span><br>
+            Check the cleanup touched the intended fields only
+            """)
+            st.dataframe(delta['column_changes'], hide_index=True, use_container_width=True)
+
+        if not delta['examples'].empty:
+            with st.expander("🔎 Example records"):
+                st.dataframe(delta['examples'], hide_index=True, use_container_width=True)
+
 
 # ==================== FOOTER ====================
 st.markdown("---")
@@ -0,0 +1,38 @@
+"""JoinPlanner regression tests: missing keys and column name collisions."""
+import runpy
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+APP = Path(__file__).resolve().parent.parent / 'Jupiter-Audit-CRM-V6-TEST_APPLE_STYLE.py'
+
+
+@pytest.fixture(scope='module')
+def app():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return runpy.run_path(str(APP))
+
+
+def test_missing_company_id_links_to_no_company(app):
+    contacts = pd.DataFrame({'id': [1, 2, 3], 'company_id': [10, np.nan, 11]})
+    companies = pd.DataFrame({'id': [10, np.nan, 11], 'name': ['Acme', 'NoIdCo', 'Globex']})
+
+    joined = app['JoinPlanner']({'contacts': contacts, 'companies': companies}).execute()
+
+    assert joined['name'].tolist()[0] == 'Acme'
+    assert pd.isna(joined['name'].iloc[1])
+    assert joined['name'].tolist()[2] == 'Globex'
+
+
+def test_colliding_ticket_stats_keep_the_user_column(app):
+    contacts = pd.DataFrame({'id': [1, 2, 3], 'ticket_count': [np.nan, 5, np.nan]})
+    tickets = pd.DataFrame({'id': [1, 2, 3], 'contact_id': [1, 1, 3], 'status': ['Open', 'Closed', 'Open']})
+
+    joined = app['JoinPlanner']({'contacts': contacts, 'tickets': tickets}).execute()
+
+    assert joined['ticket_count'].isna().tolist() == [True, False, True]
+    assert joined['ticket_count_ticket'].tolist() == [2, 0, 1]
@@ -0,0 +1,77 @@
+"""Memory regression test: aggregation + churn analysis must not copy the uploaded frames."""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+APP = Path(__file__).resolve().parent.parent / 'Jupiter-Audit-CRM-V6-TEST_APPLE_STYLE.py'
+ROWS = 200_000
+# Peak RSS growth allowed while aggregating and scoring, as a multiple of the input frames' size
+# (the previous copy-based pipeline held about 5x the contacts data)
+MAX_PEAK_RATIO = 2.0
+
+# Runs in a fresh interpreter so the peak (VmHWM) only reflects this pipeline
+PIPELINE = """
+import json, logging, runpy, sys, warnings
+import numpy as np
+import pandas as pd
+
+logging.disable(logging.CRITICAL)
+warnings.filterwarnings('ignore')
+app = runpy.run_path(sys.argv[1])
+n = int(sys.argv[2])
+rng = np.random.default_rng(0)
+now = pd.Timestamp.now()
+
+contacts = pd.DataFrame({
+    'id': np.arange(1, n + 1),
+    'email': [f'user{i}@co{i % 5000}.com' for i in range(n)],
+    'first_name': rng.choice(['Ann', 'Bob', None], n),
+    'company_id': rng.integers(1, n // 4 + 1, n).astype(float),
+    'last_activity_date': (now - pd.to_timedelta(rng.integers(0, 400, n), unit='D')).strftime('%Y-%m-%d'),
+    'createdate': (now - pd.to_timedelta(rng.integers(0, 700, n), unit='D')).strftime('%Y-%m-%d'),
+    'arr': rng.integers(0, 10000, n),
+})
+companies = pd.DataFrame({
+    'id': np.arange(1, n // 4 + 1),
+    'name': [f'Company {i}' for i in range(n // 4)],
+    'industry': rng.choice(['Tech', 'Retail', 'Health'], n // 4),
+})
+tickets = pd.DataFrame({
+    'id': np.arange(1, 2 * n + 1),
+    'contact_id': rng.integers(1, n + 1, 2 * n),
+    'status': rng.choice(['Open', 'Closed', 'Pending'], 2 * n),
+    'priority': rng.choice(['HIGH', 'low'], 2 * n),
+    'created_date': (now - pd.to_timedelta(rng.integers(0, 7200, 2 * n), unit='h')).strftime('%Y-%m-%d %H:%M:%S'),
+})
+input_bytes = sum(int(df.memory_usage(deep=True).sum()) for df in (contacts, companies, tickets))
+
+
+def rss_kb(field):
+    with open('/proc/self/status') as status:
+        return next(int(line.split()[1]) for line in status if line.startswith(field))
+
+
+with open('/proc/self/clear_refs', 'w') as refs:
+    refs.write('5')  # reset the peak RSS mark to the current RSS
+before = rss_kb('VmRSS:')
+
+aggregated = app['JoinPlanner']({'contacts': contacts, 'companies': companies, 'tickets': tickets}).execute()
+app['analyze_churn_risk'](contacts, tickets, ticket_feature_df=aggregated)
+
+print(json.dumps({'input_bytes': input_bytes, 'peak_bytes': (rss_kb('VmHWM:') - before) * 1024}))
+"""
+
+
+@pytest.mark.skipif(not Path('/proc/self/clear_refs').exists(), reason="peak RSS reset needs Linux /proc")
+def test_aggregation_and_churn_peak_memory():
+    result = subprocess.run(
+        [sys.executable, '-c', PIPELINE, str(APP), str(ROWS)],
+        capture_output=True, text=True, timeout=600
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    usage = json.loads(result.stdout.strip().splitlines()[-1])
+    ratio = usage['peak_bytes'] / usage['input_bytes']
+    assert ratio < MAX_PEAK_RATIO, f"peak RSS grew {ratio:.2f}x the input size"